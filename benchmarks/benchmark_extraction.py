@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+#
+# This file is part of the JetBrains Manager Tool distribution
+# (https://github.com/diogocaveiro/jetbrains-manager-tool).
+# Copyright (c) 2024 Diogo Caveiro.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Compare the extraction throughput of the system tar command with the sequential and pipelined extraction of
+`extract_tar_stream`.
+
+Usage: python benchmarks/benchmark_extraction.py [--archive PATH] [--files N] [--size MiB] [--workers 4 8 16]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+from stat import S_ISDIR
+
+from common import Timer, generate_archive, load_tool
+
+
+def extract_with_tar(archive_path, destination, sudo=False):
+    subprocess.run((["sudo"] if sudo else []) + ["tar", "-xzf", archive_path, "-C", destination,
+                                                 "--strip-components=1"], check=True)
+
+
+def extract_with_tool(tool, archive_path, destination, workers):
+    with open(archive_path, 'rb') as archive_file:
+        tool.extract_tar_stream(archive_file, destination, workers=workers)
+
+
+def tree_summary(root):
+    """
+    Return the relative path, type, mode and size of every entry below `root`, to check that methods agree.
+    """
+
+    summary = []
+    for directory, directory_names, file_names in os.walk(root):
+        for name in directory_names + file_names:
+            path = os.path.join(directory, name)
+            stat = os.lstat(path)
+            summary.append((os.path.relpath(path, root), stat.st_mode, 0 if S_ISDIR(stat.st_mode) else stat.st_size))
+    return sorted(summary)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--archive", help="Benchmark an existing .tar.gz archive instead of a generated one.")
+    arg_parser.add_argument("--files", type=int, default=20000, help="Number of files of the generated archive.")
+    arg_parser.add_argument("--size", type=int, default=400, help="Uncompressed size in MiB of the generated archive.")
+    arg_parser.add_argument("--workers", type=int, nargs="+", default=[4, 8, 16], help="Writer thread counts to try.")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Runs of each method; the fastest one is kept.")
+    arg_parser.add_argument("--sudo", action="store_true", help="Run tar through sudo, as the tool used to.")
+    arg_parser.add_argument("--directory", help="Directory where archives are extracted (default: a temporary one).")
+    args = arg_parser.parse_args()
+
+    tool = load_tool()
+    work_directory = tempfile.mkdtemp(prefix="jmt-benchmark-", dir=args.directory)
+    try:
+        archive_path = args.archive
+        if not archive_path:
+            archive_path = os.path.join(work_directory, "ide.tar.gz")
+            generate_archive(archive_path, files=args.files, size=args.size)
+
+        methods = [("tar", lambda destination: extract_with_tar(archive_path, destination, sudo=args.sudo)),
+                   ("sequential", lambda destination: extract_with_tool(tool, archive_path, destination, 0))]
+        methods += [(f"pipelined ({workers} workers)",
+                     lambda destination, workers=workers: extract_with_tool(tool, archive_path, destination, workers))
+                    for workers in args.workers]
+
+        reference = None
+        print(f"Archive: {archive_path} ({os.path.getsize(archive_path) / 1024 ** 2:.1f} MiB compressed)")
+        print(f"{'Method':<24} {'Time (s)':>9} {'MiB/s':>9} {'Files/s':>9}")
+        for name, extract in methods:
+            best = None
+            for _ in range(args.repeat):
+                destination = os.path.join(work_directory, "extracted")
+                os.makedirs(destination)
+                with Timer() as timer:
+                    extract(destination)
+                    # Include the time needed to get the files to disk, which the tar command also waits for
+                    os.sync()
+                best = min(best or timer.elapsed, timer.elapsed)
+                summary = tree_summary(destination)
+                shutil.rmtree(destination)
+
+            if reference is None:
+                reference = summary
+            elif summary != reference:
+                print(f"Warning: {name} did not extract the same tree as tar.")
+            files = sum(1 for entry in summary if not S_ISDIR(entry[1]))
+            size = sum(entry[2] for entry in summary)
+            print(f"{name:<24} {best:>9.2f} {size / 1024 ** 2 / best:>9.1f} {files / best:>9.0f}")
+    finally:
+        shutil.rmtree(work_directory)
+
+
+if __name__ == "__main__":
+    main()
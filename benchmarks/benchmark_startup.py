@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+#
+# This file is part of the JetBrains Manager Tool distribution
+# (https://github.com/diogocaveiro/jetbrains-manager-tool).
+# Copyright (c) 2024 Diogo Caveiro.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Measure the startup time of the tool and check it against a time budget.
+
+Every command runs in a fresh interpreter, and its time is reported as the overhead over an interpreter that does
+nothing, which is what the budget applies to:
+  - import: load the tool without running anything
+  - list: run `jetbrains-manager-tool.py --list`, which reads the real install directory and registry of this
+          machine without changing them, and without root permissions
+
+The modules deferred until an operation needs them must not be imported by either command.
+
+Usage: python benchmarks/benchmark_startup.py [--repeat N] [--budget ms]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+from common import TOOL_PATH, Timer
+
+# Modules only the network and extraction code needs, which are imported on first use
+DEFERRED_MODULES = ["requests.adapters", "urllib3.connectionpool", "tarfile", "xml.etree.ElementTree"]
+
+IMPORT_TOOL = f"""
+import importlib.util, sys
+spec = importlib.util.spec_from_file_location("jetbrains_manager_tool", {TOOL_PATH!r})
+module = importlib.util.module_from_spec(spec)
+sys.modules["jetbrains_manager_tool"] = module
+spec.loader.exec_module(module)
+"""
+
+CHECK_DEFERRED = f"""
+import sys
+{IMPORT_TOOL}
+loaded = [name for name in {DEFERRED_MODULES!r}
+          if name in sys.modules and type(sys.modules[name]).__name__ != "_LazyModule"]
+print(" ".join(loaded))
+"""
+
+COMMANDS = {
+    "import": [sys.executable, "-c", IMPORT_TOOL],
+    "list": [sys.executable, TOOL_PATH, "--list"],
+}
+
+
+def measure(command, repeat) -> float:
+    """
+    Return the median wall time of `repeat` runs of `command`, in seconds.
+    """
+
+    times = []
+    for _ in range(repeat):
+        with Timer() as timer:
+            subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           check=True)
+        times.append(timer.elapsed)
+    return statistics.median(times)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=20, help="Number of runs of every command.")
+    arg_parser.add_argument("--budget", type=float, default=150,
+                            help="Maximum overhead in milliseconds of every command over a bare interpreter "
+                                 "(default: 150).")
+    args = arg_parser.parse_args()
+
+    baseline = measure([sys.executable, "-c", "pass"], args.repeat)
+    print(f"{'Command':<10} {'Time (ms)':>10} {'Overhead (ms)':>14}")
+    print(f"{'python':<10} {baseline * 1000:>10.1f} {'':>14}")
+
+    failures = []
+    for name, command in COMMANDS.items():
+        overhead = measure(command, args.repeat) - baseline
+        print(f"{name:<10} {(baseline + overhead) * 1000:>10.1f} {overhead * 1000:>14.1f}")
+        if overhead * 1000 > args.budget:
+            failures.append(f"{name}: {overhead * 1000:.1f} ms over the interpreter, budget is {args.budget:.0f} ms")
+
+    loaded = subprocess.run([sys.executable, "-c", CHECK_DEFERRED], capture_output=True, text=True,
+                            check=True).stdout.split()
+    if loaded:
+        failures.append(f"import: loaded {', '.join(loaded)}, which should only be imported on first use")
+
+    if failures:
+        print("\nOver budget:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print(f"\nWithin the budget of {args.budget:.0f} ms.")
+
+
+if __name__ == "__main__":
+    main()
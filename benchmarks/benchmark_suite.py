@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+#
+# This file is part of the JetBrains Manager Tool distribution
+# (https://github.com/diogocaveiro/jetbrains-manager-tool).
+# Copyright (c) 2024 Diogo Caveiro.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Measure the wall time, download throughput and peak memory of every operation of the tool, end to end.
+
+The tool runs in this process against a local server standing in for the JetBrains and Google servers, which serves
+generated update feeds and application archives, with the Android Studio download links going through a chain of
+redirects. Every path of the tool points into a temporary directory, so nothing is installed on the system.
+
+Each repetition runs the following phases in a fresh sandbox:
+  - install: install the selected applications, with cold feed and download caches
+  - list: list the installed applications
+  - update (no change): check for updates when none is available, revalidating the feeds
+  - update: update every application to a newly published version
+  - remove: remove the applications
+
+Usage: python benchmarks/benchmark_suite.py [--apps KEY ...] [--files N] [--size MiB] [--repeat N]
+                                            [--tool-args "..."] [--json PATH] [--baseline PATH]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import statistics
+import sys
+import tempfile
+
+from common import (StandInServer, Timer, generate_archive, generate_feed, load_tool, peak_rss, reset_peak_rss,
+                    run_tool, sandbox_tool)
+
+PHASES = ["install", "list", "update (no change)", "update", "remove"]
+ANDROID_STUDIO_SUFFIX = 3
+# Slowdowns of phases this short are noise rather than regressions
+MIN_REGRESSION = 0.05
+
+
+def release(version):
+    """
+    Return the version, build number and product-info.json content of the `version`-th generated release.
+    """
+
+    version_name = f"2024.{version}.1"
+    build_number = f"24{version}.100.1"
+    return version_name, build_number, {"version": version_name, "buildNumber": build_number}
+
+
+def publish(tool, files_path, apps, version, archive_path, feed_products):
+    """
+    Publish a release of every application: its archive, checksum and entry in the update feeds.
+    """
+
+    version_name, build_number, _ = release(version)
+    jetbrains_builds = {}
+    android_studio_builds = {}
+    with open(archive_path, 'rb') as archive_file:
+        checksum = hashlib.file_digest(archive_file, "sha256").hexdigest()
+
+    for app_key in apps:
+        app_data = tool.APP_LIST[app_key]
+        if app_key == "android-studio":
+            full_version = f"{version_name}.{ANDROID_STUDIO_SUFFIX}"
+            file_name = app_data["download-link"].rsplit("/", 1)[1].replace("<VERSION>", full_version)
+            file_path = os.path.join(files_path, "ide-zips", full_version, file_name)
+            android_studio_builds[(app_data["name"], app_data["channel_name"])] = {
+                "number": f"AI-{build_number}", "version": f"Android Studio Generated | {version_name}"}
+        else:
+            file_name = app_data["download-link"].rsplit("/", 1)[1].replace("<VERSION>", version_name)
+            file_path = os.path.join(files_path, file_name)
+            with open(file_path + ".sha256", 'w') as checksum_file:
+                checksum_file.write(f"{checksum} *{file_name}\n")
+            jetbrains_builds[(app_data["name"], app_data["channel_name"])] = {
+                "number": build_number.rsplit(".", 1)[0], "version": version_name, "fullNumber": build_number}
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        if os.path.lexists(file_path):
+            os.remove(file_path)
+        os.link(archive_path, file_path)
+
+    generate_feed(os.path.join(files_path, "updates.xml"), jetbrains_builds, products=feed_products)
+    generate_feed(os.path.join(files_path, "android-studio-updates.xml"), android_studio_builds)
+
+
+def run_phase(tool, server, arguments):
+    bytes_sent = server.bytes_sent
+    reset_peak_rss()
+    with Timer() as timer:
+        run_tool(tool, arguments)
+    downloaded = server.bytes_sent - bytes_sent
+    return {"time": timer.elapsed, "bytes": downloaded, "throughput": downloaded / timer.elapsed,
+            "peak_rss": peak_rss()}
+
+
+def run_repetition(tool, work_directory, archives, args):
+    root = tempfile.mkdtemp(prefix="sandbox-", dir=work_directory)
+    files_path = os.path.join(root, "www")
+    os.makedirs(files_path)
+    app_flags = [tool.APP_LIST[app_key]["flag"] for app_key in args.apps]
+    tool_args = shlex.split(args.tool_args) + ["--cache-ttl", "0"]
+    results = {}
+
+    with StandInServer(files_path) as server:
+        install_path = sandbox_tool(tool, root, server.url)
+        publish(tool, files_path, args.apps, 1, archives[0], args.feed_products)
+
+        results["install"] = run_phase(tool, server, ["-i", *app_flags, "-y", *tool_args])
+        results["list"] = run_phase(tool, server, ["-l", *tool_args])
+        results["update (no change)"] = run_phase(tool, server, ["-u", "-y", *tool_args])
+
+        publish(tool, files_path, args.apps, 2, archives[1], args.feed_products)
+        results["update"] = run_phase(tool, server, ["-u", "-y", *tool_args])
+
+        expected_build = release(2)[1]
+        for app_key in args.apps:
+            product_info_path = os.path.join(install_path, tool.APP_LIST[app_key]["folder"], "product-info.json")
+            with open(product_info_path) as product_info_file:
+                if json.load(product_info_file)["buildNumber"] != expected_build:
+                    raise RuntimeError(f"{app_key} was not updated. See {tool.LOG_FILE_PATH}.")
+
+        results["remove"] = run_phase(tool, server, ["-r", *app_flags, "-y", *tool_args])
+
+    shutil.rmtree(root)
+    return results
+
+
+def summarize(repetitions):
+    """
+    Combine the results of all repetitions: the median of times and throughputs, and the highest peak memory.
+    """
+
+    return {phase: {"time": statistics.median(results[phase]["time"] for results in repetitions),
+                    "bytes": max(results[phase]["bytes"] for results in repetitions),
+                    "throughput": statistics.median(results[phase]["throughput"] for results in repetitions),
+                    "peak_rss": max(results[phase]["peak_rss"] for results in repetitions)}
+            for phase in PHASES}
+
+
+def compare(summary, baseline, tolerance) -> list:
+    """
+    Return a message for every phase that got slower than in `baseline` by more than `tolerance`.
+    """
+
+    regressions = []
+    for phase, result in summary.items():
+        previous = baseline.get("phases", {}).get(phase)
+        if (previous and result["time"] > previous["time"] * (1 + tolerance)
+                and result["time"] - previous["time"] > MIN_REGRESSION):
+            regressions.append(f"{phase}: {result['time']:.2f} s, was {previous['time']:.2f} s "
+                               f"(+{(result['time'] / previous['time'] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--apps", nargs="+", default=["pycharm-professional", "goland", "android-studio"],
+                            help="Keys of the applications to install, from apps_data.json.")
+    arg_parser.add_argument("--files", type=int, default=20000, help="Number of files of each application.")
+    arg_parser.add_argument("--size", type=int, default=400, help="Uncompressed size in MiB of each application.")
+    arg_parser.add_argument("--feed-products", type=int, default=300,
+                            help="Number of unrelated products in the JetBrains feed.")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions of all phases.")
+    arg_parser.add_argument("--tool-args", default="", help="Extra arguments passed to the tool in every phase.")
+    arg_parser.add_argument("--json", help="Write the results to this file.")
+    arg_parser.add_argument("--baseline", help="Compare the results with a file written by --json.")
+    arg_parser.add_argument("--tolerance", type=float, default=0.2,
+                            help="Slowdown over the baseline reported as a regression (default: 0.2, i.e. 20%%).")
+    arg_parser.add_argument("--directory", help="Directory of the sandboxes (default: a temporary one).")
+    args = arg_parser.parse_args()
+
+    tool = load_tool()
+    unknown_apps = [app_key for app_key in args.apps if app_key not in tool.APP_LIST]
+    if unknown_apps:
+        arg_parser.error(f"unknown applications: {', '.join(unknown_apps)}")
+
+    work_directory = tempfile.mkdtemp(prefix="jmt-benchmark-", dir=args.directory)
+    try:
+        archives = []
+        for version in (1, 2):
+            archive_path = os.path.join(work_directory, f"ide-{version}.tar.gz")
+            generate_archive(archive_path, files=args.files, size=args.size, seed=version,
+                             top_level=f"ide-{release(version)[0]}", product_info=release(version)[2],
+                             executables={tool.APP_LIST[app_key]["executable"] for app_key in args.apps})
+            archives.append(archive_path)
+
+        repetitions = [run_repetition(tool, work_directory, archives, args) for _ in range(args.repeat)]
+    finally:
+        shutil.rmtree(work_directory)
+
+    summary = summarize(repetitions)
+    print(f"{len(args.apps)} applications, {args.files} files and {args.size} MiB each, "
+          f"median of {args.repeat} runs")
+    print(f"{'Phase':<20} {'Time (s)':>9} {'MiB':>9} {'MiB/s':>9} {'Peak RSS (MiB)':>15}")
+    for phase, result in summary.items():
+        print(f"{phase:<20} {result['time']:>9.2f} {result['bytes'] / 1024 ** 2:>9.1f} "
+              f"{result['throughput'] / 1024 ** 2:>9.1f} {result['peak_rss'] / 1024 ** 2:>15.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({"parameters": {key: value for key, value in vars(args).items()
+                                      if key not in ("json", "baseline", "directory")},
+                       "phases": summary}, json_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(summary, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regression.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+#
+# This file is part of the JetBrains Manager Tool distribution
+# (https://github.com/diogocaveiro/jetbrains-manager-tool).
+# Copyright (c) 2024 Diogo Caveiro.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Helpers shared by the benchmarks: loading the tool as a module, running it in a sandbox, generating synthetic
+application archives and feeds, and serving them from a local HTTP server standing in for the download servers.
+"""
+
+import contextlib
+import email.utils
+import http.server
+import importlib.util
+import inspect
+import io
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tarfile
+import threading
+import time
+
+TOOL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                         "jetbrains-manager-tool", "jetbrains-manager-tool.py")
+
+
+def load_tool():
+    """
+    Import jetbrains-manager-tool.py, whose file name is not a valid module name, as the `jetbrains_manager_tool`
+    module.
+    """
+
+    if "jetbrains_manager_tool" in sys.modules:
+        return sys.modules["jetbrains_manager_tool"]
+
+    spec = importlib.util.spec_from_file_location("jetbrains_manager_tool", TOOL_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["jetbrains_manager_tool"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_archive(path, files=20000, size=400, seed=0, top_level="ide-1.0", product_info=None, executables=()):
+    """
+    Write a .tar.gz archive shaped like a JetBrains application.
+
+    Most files are small (configuration files, scripts, icons, class files), a few percent are jars of a few MiB, and
+    the content compresses about as well as a real application. The archive also holds executables, symbolic links
+    and hard links. The same arguments always produce the same archive.
+
+    Parameters:
+    - path (str): The path of the archive to write.
+    - files (int, optional): The number of regular files. Defaults to 20000.
+    - size (int, optional): The approximate uncompressed size of the archive in MiB. Defaults to 400.
+    - seed (int, optional): The seed of the content generator. Defaults to 0.
+    - top_level (str, optional): The name of the top-level folder. Defaults to "ide-1.0".
+    - product_info (dict, optional): The content of product-info.json. Defaults to version 1.0, build 1.0.1.
+    - executables (iterable, optional): Names of launchers to add to the bin folder, with their .sh script and .svg
+      icon, as the tool expects for each application.
+
+    Returns:
+    - tuple: The number of files and the uncompressed size in bytes of the archive.
+    """
+
+    generator = random.Random(seed)
+    random_pool = generator.randbytes(8 * 1024 * 1024)
+    text_pool = b"".join(f"key.{index}=value {index * 7919 % 104729}\n".encode() for index in range(200000))
+
+    def content(length):
+        # Half incompressible, half text, like a mix of jars and plain files
+        offset = generator.randrange(0, len(random_pool) - length // 2) if length // 2 < len(random_pool) else 0
+        data = random_pool[offset:offset + length // 2]
+        while len(data) < length:
+            data += text_pool[:length - len(data)]
+        return data
+
+    large_files = max(1, files // 50)
+    large_size = size * 1024 * 1024 * 3 // 4 // large_files
+    small_size = max(1, size * 1024 * 1024 // 4 // max(1, files - large_files))
+    directories = [f"{top_level}/{section}/{index:03}" for section in ("lib", "plugins", "jbr", "bin")
+                   for index in range(max(1, files // 400))]
+    total_size = 0
+
+    with tarfile.open(path, "w:gz", compresslevel=6) as tar:
+        def add(name, data=b"", mode=0o644, **attributes):
+            member = tarfile.TarInfo(name)
+            member.size = len(data)
+            member.mode = mode
+            member.mtime = 1700000000
+            for key, value in attributes.items():
+                setattr(member, key, value)
+            tar.addfile(member, io.BytesIO(data) if data else None)
+
+        add(top_level, mode=0o755, type=tarfile.DIRTYPE)
+        for directory in sorted({os.path.dirname(directory) for directory in directories}) + directories:
+            add(directory, mode=0o755, type=tarfile.DIRTYPE)
+
+        for index in range(files):
+            directory = directories[index % len(directories)]
+            if index < large_files:
+                name, length, mode = f"{directory}/library-{index}.jar", large_size, 0o644
+            elif directory.split("/")[1] == "bin":
+                name, length, mode = f"{directory}/tool-{index}.sh", generator.randint(1, 2 * small_size), 0o755
+            else:
+                name, length, mode = f"{directory}/file-{index}.class", generator.randint(1, 2 * small_size), 0o644
+            add(name, content(length), mode)
+            total_size += length
+
+        add(f"{top_level}/bin/ide.sh", b"#!/bin/sh\nexec java \"$@\"\n", 0o755)
+        add(f"{top_level}/bin/ide", type=tarfile.SYMTYPE, linkname="ide.sh")
+        add(f"{top_level}/bin/ide-hardlink.sh", mode=0o755, type=tarfile.LNKTYPE,
+            linkname=f"{top_level}/bin/ide.sh")
+        for executable in executables:
+            add(f"{top_level}/bin/{executable}", b"#!/bin/sh\nexec java \"$@\"\n", 0o755)
+            add(f"{top_level}/bin/{executable}.sh", b"#!/bin/sh\nexec java \"$@\"\n", 0o755)
+            add(f"{top_level}/bin/{executable}.svg", b"<svg xmlns=\"http://www.w3.org/2000/svg\"/>")
+        add(f"{top_level}/product-info.json",
+            json.dumps(product_info or {"version": "1.0", "buildNumber": "1.0.1"}).encode())
+
+    return files, total_size
+
+
+class Timer:
+    """
+    A context manager measuring the wall time of a block, in seconds, in its `elapsed` attribute.
+    """
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def generate_feed(path, builds, products=0, seed=0):
+    """
+    Write an updates.xml feed in the format of the JetBrains and Android Studio update feeds.
+
+    Parameters:
+    - path (str): The path of the feed to write.
+    - builds (dict): The attributes of the `build` element of each (product name, channel name) pair.
+    - products (int, optional): The number of unrelated products to add, each with a few channels and builds, so
+      that the feed has a realistic size. Defaults to 0.
+    - seed (int, optional): The seed of the generator of the unrelated products. Defaults to 0.
+    """
+
+    generator = random.Random(seed)
+    channels = {}
+    for (product, channel), build in builds.items():
+        channels.setdefault(product, {})[channel] = build
+
+    with open(path, 'w') as feed_file:
+        feed_file.write('<?xml version="1.0" encoding="UTF-8"?>\n<products>\n')
+        for product, product_channels in channels.items():
+            feed_file.write(f'  <product name="{product}">\n')
+            for channel, build in product_channels.items():
+                attributes = " ".join(f'{key}="{value}"' for key, value in build.items())
+                feed_file.write(f'    <channel name="{channel}" status="release">\n'
+                                f'      <build {attributes}><message>Release notes</message></build>\n'
+                                f'    </channel>\n')
+            feed_file.write('  </product>\n')
+
+        for index in range(products):
+            feed_file.write(f'  <product name="Product {index}">\n')
+            for channel in ("RELEASE", "EAP", "BETA"):
+                feed_file.write(f'    <channel name="Product {index} {channel}" status="{channel.lower()}">\n')
+                for build in range(generator.randint(2, 8)):
+                    number = f"{generator.randint(200, 243)}.{generator.randint(1000, 30000)}"
+                    feed_file.write(f'      <build number="{number}" version="2024.{build}" fullNumber="{number}.1">'
+                                    f'<message>Release notes of build {number}</message>'
+                                    f'<patch from="{number[:-1]}" size="{generator.randint(1, 500)}"/></build>\n')
+                feed_file.write('    </channel>\n')
+            feed_file.write('  </product>\n')
+        feed_file.write('</products>\n')
+
+
+class StandInServer:
+    """
+    A local HTTP server standing in for the JetBrains and Google download servers.
+
+    Files are served from `root` under /files/, with support for HEAD, byte ranges, If-Range, ETag and
+    Last-Modified. Paths under /redirector/ go through two redirects before reaching /files/, whether or not the
+    file exists, like the Android Studio redirector. The number of body bytes sent is counted in `bytes_sent`.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.bytes_sent = 0
+        self.requests = 0
+        lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *arguments):
+                pass
+
+            def do_HEAD(self):
+                self.serve(body=False)
+
+            def do_GET(self):
+                self.serve(body=True)
+
+            def send_empty_response(self, status, headers=()):
+                self.send_response(status)
+                for key, value in headers:
+                    self.send_header(key, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def serve(self, body):
+                with lock:
+                    server.requests += 1
+
+                path = self.path.split("?")[0]
+                if path.startswith("/redirector/"):
+                    return self.send_empty_response(302, [("Location", "/edgedl/" + path[len("/redirector/"):])])
+                if path.startswith("/edgedl/"):
+                    return self.send_empty_response(302, [("Location", "/files/" + path[len("/edgedl/"):])])
+
+                file_path = os.path.join(server.root, path[len("/files/"):]) if path.startswith("/files/") else ""
+                if not os.path.isfile(file_path):
+                    return self.send_empty_response(404)
+
+                stat = os.stat(file_path)
+                etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+                last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+                if self.headers.get("If-None-Match") == etag:
+                    return self.send_empty_response(304, [("ETag", etag)])
+
+                start, end = 0, stat.st_size - 1
+                match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+                if match and self.headers.get("If-Range", etag) in (etag, last_modified):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), end) if match.group(2) else end
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{stat.st_size}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+                self.end_headers()
+                if not body:
+                    return
+
+                with open(file_path, 'rb') as served_file:
+                    served_file.seek(start)
+                    remaining = end - start + 1
+                    while remaining:
+                        data = served_file.read(min(remaining, 1024 * 1024))
+                        self.wfile.write(data)
+                        remaining -= len(data)
+                        with lock:
+                            server.bytes_sent += len(data)
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def sandbox_tool(tool, root, server_url):
+    """
+    Point every path and URL used by the tool inside `root` and at the stand-in server at `server_url`.
+
+    Module constants are replaced, and so are the default values of parameters that were bound to them when the
+    module was loaded. Download links become /files/<archive name>, except for Android Studio, which goes through
+    the /redirector/ chain.
+
+    Returns:
+    - str: The install directory.
+    """
+
+    paths = {
+        "JETBRAINS_INSTALL_PATH": os.path.join(root, "opt", "jetbrains"),
+        "DESKTOP_ENTRIES_PATH": os.path.join(root, "applications"),
+        "SYMLINKS_PATH": os.path.join(root, "bin"),
+        "LOG_FILE_PATH": os.path.join(root, "jetbrains-manager-tool.log"),
+        "FEED_CACHE_PATH": os.path.join(root, "cache"),
+        "ARTIFACT_CACHE_PATH": os.path.join(root, "cache", "artifacts"),
+        "CATALOG_PATH": os.path.join(root, "cache", "catalog.json"),
+        "DOWNLOAD_LINKS_PATH": os.path.join(root, "cache", "download_links.json"),
+        "CHECKSUMS_PATH": os.path.join(root, "cache", "checksums.json"),
+        "USER_FEED_CACHE_PATH": os.path.join(root, "user-cache"),
+        "REGISTRY_PATH": os.path.join(root, "lib", "registry.json"),
+        "DEDUP_INDEX_PATH": os.path.join(root, "lib", "dedup_index.json"),
+        "INSTALL_LOCKS_PATH": os.path.join(root, "lib", "locks"),
+        "CONFIGURATION_FILE_PATH": os.path.join(root, "configuration"),
+    }
+    replacements = {}
+    for name, path in paths.items():
+        if hasattr(tool, name):
+            replacements[getattr(tool, name)] = path
+            setattr(tool, name, path)
+    for name in ("JETBRAINS_INSTALL_PATH", "DESKTOP_ENTRIES_PATH", "SYMLINKS_PATH", "FEED_CACHE_PATH"):
+        os.makedirs(paths[name], exist_ok=True)
+
+    functions = [value for value in vars(tool).values() if inspect.isfunction(value)]
+    functions += [member for value in vars(tool).values() if inspect.isclass(value)
+                  for member in vars(value).values() if inspect.isfunction(member)]
+    for function in functions:
+        if function.__module__ == tool.__name__ and function.__defaults__:
+            function.__defaults__ = tuple(replacements.get(default, default) if isinstance(default, str) else default
+                                          for default in function.__defaults__)
+
+    tool.JETBRAINS_XML_URL = f"{server_url}/files/updates.xml"
+    tool.ANDROID_STUDIO_XML_URL = f"{server_url}/files/android-studio-updates.xml"
+    for app_key, app_data in tool.APP_LIST.items():
+        file_name = app_data["download-link"].rsplit("/", 1)[1]
+        if app_key == "android-studio":
+            app_data["download-link"] = f"{server_url}/redirector/ide-zips/<VERSION>/{file_name}"
+        else:
+            app_data["download-link"] = f"{server_url}/files/{file_name}"
+
+    return paths["JETBRAINS_INSTALL_PATH"]
+
+
+def run_tool(tool, arguments, quiet=True):
+    """
+    Run the tool in this process with the given command line arguments, as if it was started from a shell.
+    """
+
+    sys.argv = ["jetbrains-manager-tool"] + list(arguments)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+        tool.get_arguments_and_flags()
+        tool.JetbrainsManagerTool()
+    return output.getvalue()
+
+
+def reset_peak_rss():
+    """
+    Reset the peak resident set size of this process, where the kernel supports it (Linux 4.0 and later).
+    """
+
+    with contextlib.suppress(OSError):
+        with open("/proc/self/clear_refs", 'w') as clear_refs:
+            clear_refs.write("5")
+
+
+def peak_rss() -> int:
+    """
+    Return the peak resident set size of this process in bytes, since the last `reset_peak_rss` when supported.
+    """
+
+    with contextlib.suppress(OSError):
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
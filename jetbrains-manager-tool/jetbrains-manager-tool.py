@@ -16,18 +16,61 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import contextlib
+import fcntl
+import hashlib
+import importlib.util
 import re
 import shutil
-from pprint import pformat
 
-import requests
 import argparse
 import os
 import subprocess
+import struct
 import sys
-import xml.etree.ElementTree as elementTree
 import json
 import logging
+import threading
+import time
+import types
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import unquote, urljoin, urlsplit
+
+
+class MissingModule(types.ModuleType):
+    """
+    Stand-in for a module that is not installed, which raises ModuleNotFoundError when it is first used, so that the
+    operations not needing it still run.
+    """
+
+    def __getattr__(self, attribute):
+        raise ModuleNotFoundError(f"No module named '{self.__name__}'", name=self.__name__)
+
+
+def lazy_import(name):
+    """
+    Return a module that is only actually imported when one of its attributes is first used.
+    """
+
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return MissingModule(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# Modules that only some operations need are imported on first use, so that the others start faster
+requests = lazy_import("requests")
+urllib3 = lazy_import("urllib3")
+tarfile = lazy_import("tarfile")
+elementTree = lazy_import("xml.etree.ElementTree")
 
 __author__ = "Diogo Caveiro"
 __date__ = "2024-08-30"
@@ -35,121 +78,2596 @@ __version__ = "0.4.4"
 __github__ = "https://github.com/diogocaveiro"
 __license__ = "GPLv3 License"
 
-JETBRAINS_XML_URL = "https://www.jetbrains.com/updates/updates.xml"
-ANDROID_STUDIO_XML_URL = "https://dl.google.com/android/studio/patches/updates.xml"
-JETBRAINS_INSTALL_PATH = "/opt/jetbrains/"
-SCRIPT_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
-global args
+JETBRAINS_XML_URL = "https://www.jetbrains.com/updates/updates.xml"
+ANDROID_STUDIO_XML_URL = "https://dl.google.com/android/studio/patches/updates.xml"
+JETBRAINS_INSTALL_PATH = "/opt/jetbrains/"
+DESKTOP_ENTRIES_PATH = "/usr/share/applications"
+SYMLINKS_PATH = "/usr/local/bin"
+LOG_FILE_PATH = "/var/log/jetbrains-manager-tool.log"
+SCRIPT_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_CONNECTIONS = 4
+DOWNLOAD_PART_SUFFIX = ".part"
+DOWNLOAD_STATE_SUFFIX = ".state"
+DOWNLOAD_STATE_INTERVAL = 16 * 1024 * 1024
+EXTRACT_READ_SIZE = 64 * 1024
+EXTRACT_WORKERS = 8
+EXTRACT_BUFFER_SIZE = 64 * 1024 * 1024
+PIPELINE_RESOLVE_WORKERS = 4
+PIPELINE_DOWNLOAD_WORKERS = 1
+PIPELINE_EXTRACT_WORKERS = 1
+BANDWIDTH_LIMIT = 0
+TRASH_FOLDER = ".trash"
+# Hidden first argument running the script as the background process emptying a trash folder
+EMPTY_TRASH_ARGUMENT = "--empty-trash-process"
+PREFETCH_INTERVAL = 0
+PREFETCH_SUFFIX = ".prefetched"
+KEEP_VERSIONS = 1
+REMOVE_WORKERS = 8
+FEED_CACHE_PATH = "/var/cache/jetbrains-manager-tool/"
+FEED_CACHE_TTL = 3600
+ARTIFACT_CACHE_PATH = os.path.join(FEED_CACHE_PATH, "artifacts")
+# Archives are deleted once installed unless a cache size is set, since every archive takes about 1 GiB
+ARTIFACT_CACHE_SIZE = 0
+CATALOG_PATH = os.path.join(FEED_CACHE_PATH, "catalog.json")
+CATALOG_FORMAT = 1
+DOWNLOAD_LINKS_PATH = os.path.join(FEED_CACHE_PATH, "download_links.json")
+CHECKSUMS_PATH = os.path.join(FEED_CACHE_PATH, "checksums.json")
+# Feed cache of operations checking for changes before requesting root permissions
+USER_FEED_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'jetbrains-manager-tool')
+CHECKSUM_SUFFIX = ".sha256"
+ANDROID_STUDIO_PROBE_WORKERS = 8
+MIRROR_WORKERS = 4
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_READ_TIMEOUT = 60
+HTTP_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 1.0
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+REGISTRY_PATH = "/var/lib/jetbrains-manager-tool/registry.json"
+DEDUP_INDEX_PATH = "/var/lib/jetbrains-manager-tool/dedup_index.json"
+INSTALL_LOCKS_PATH = "/var/lib/jetbrains-manager-tool/locks"
+DEDUP_MIN_SIZE = 1024
+CONFIGURATION_FILE_PATH = os.path.join(os.path.expanduser('~'), '.config', 'jetbrains-manager-tool')
+# The configuration of the user running the tool through sudo, where the IDEs keep their settings
+USER_CONFIG_PATH = os.path.join(os.path.expanduser('~' + os.environ.get('SUDO_USER', '')), '.config')
+METRICS_PREFIX = "jetbrains_manager_tool"
+global args
+global http_session
+global profiler
+global bandwidth_limiter
+http_session = None
+profiler = None
+bandwidth_limiter = None
+
+with open(os.path.join(SCRIPT_DIRECTORY, 'apps_data.json'), 'r') as json_file:
+    APP_LIST = json.load(json_file)
+
+OPERATION_FLAGS = {
+    "install": [
+        "-i",
+        "--install",
+        "Install mode. Use this flag to install applications.",
+        "store_true",
+    ],
+    "update": [
+        "-u",
+        "--update",
+        "Update mode. Use this flag to update applications.",
+        "store_true",
+    ],
+    "remove": [
+        "-r",
+        "--remove",
+        "Removal mode. Use this flag to remove applications.",
+        "store_true",
+    ],
+    "help": [
+        "-h",
+        "--help",
+        "Displays helpful information.",
+        "store_true",
+    ],
+    "list": [
+        "-l",
+        "--list",
+        "List installed applications.",
+        "store_true",
+    ],
+    "updatedir": [
+        "-n",
+        "--updatedir",
+        "Update the installation path.",
+        "store_true",
+    ],
+    "deduplicate": [
+        "-j",
+        "--deduplicate",
+        "Hardlink identical files across installed applications.",
+        "store_true",
+    ],
+    "cache": [
+        "-c",
+        "--cache",
+        "Manage the downloaded archives cache: list, prune, pin or unpin.",
+        "store",
+        ["list", "prune", "pin", "unpin"],
+    ],
+    "apply": [
+        "-a",
+        "--apply",
+        "Install, update and remove applications to match a manifest file.",
+        "store",
+    ],
+    "prefetch": [
+        "-p",
+        "--prefetch",
+        "Download and extract updates in the background, so that updating only has to switch to them.",
+        "store_true",
+    ],
+    "rollback": [
+        "-o",
+        "--rollback",
+        "Switch applications back to the version they were updated from.",
+        "store_true",
+    ],
+    "mirror_sync": [
+        "-s",
+        "--mirror-sync",
+        "Download the update feeds and the latest version of applications into a mirror directory.",
+        "store",
+    ],
+}
+
+CONFIGURATION_FLAGS = {
+    "directory": [
+        "-d",
+        "--directory",
+        "Set the directory for JetBrains' applications.",
+        "store_true",
+    ],
+    "only_update_data": [
+        "-z",
+        "--only-update-data",
+        "Update application menu and symlinks only.",
+        "store_true",
+    ],
+    "update_mimetypes": [
+        "-m",
+        "--update-mimetypes",
+        "Update mimetypes.",
+        "store_true",
+    ],
+    "stream_extract": [
+        "-x",
+        "--stream-extract",
+        "Extract applications while downloading, without a temporary archive.",
+        "store_true",
+    ],
+    "background_remove": [
+        "-b",
+        "--background-remove",
+        "Delete removed and replaced applications in the background.",
+        "store_true",
+    ],
+    "no_confirm": [
+        "-y",
+        "--no-confirm",
+        "Do not ask for confirmation.",
+        "store_true",
+    ],
+    "verbose": [
+        "-v",
+        "--verbose",
+        "Verbose mode.",
+        "store_true",
+    ],
+}
+
+CONFIGURATION_ARGUMENTS = {
+    "chunk_size": [
+        None,
+        "--chunk-size",
+        "Size in bytes of the buffer used when downloading applications.",
+        int,
+        DOWNLOAD_CHUNK_SIZE,
+    ],
+    "connections": [
+        None,
+        "--connections",
+        "Number of concurrent connections used to download a single application.",
+        int,
+        DOWNLOAD_CONNECTIONS,
+    ],
+    "cache_ttl": [
+        None,
+        "--cache-ttl",
+        "Number of seconds during which cached update feeds are used without contacting the server.",
+        int,
+        FEED_CACHE_TTL,
+    ],
+    "bandwidth_limit": [
+        None,
+        "--bandwidth-limit",
+        "Maximum download rate in KiB/s of all application downloads. Use 0 for no limit.",
+        int,
+        BANDWIDTH_LIMIT,
+    ],
+    "bandwidth_lock": [
+        None,
+        "--bandwidth-lock",
+        "Share the download rate limit with the other processes using this lock file.",
+        str,
+        None,
+    ],
+    "download_window": [
+        None,
+        "--download-window",
+        "Only start downloading applications between these times of the day, as HH:MM-HH:MM.",
+        str,
+        None,
+    ],
+    "prefetch_interval": [
+        None,
+        "--prefetch-interval",
+        "Number of seconds between two checks for updates to prefetch. Use 0 to check only once.",
+        int,
+        PREFETCH_INTERVAL,
+    ],
+    "keep_versions": [
+        None,
+        "--keep-versions",
+        "Number of previous versions of every application kept to roll back to.",
+        int,
+        KEEP_VERSIONS,
+    ],
+    "feed_url": [
+        None,
+        "--feed-url",
+        "Base URL of a mirror to fetch the update feeds from instead of JetBrains and Google, e.g. file:///srv/mirror.",
+        str,
+        None,
+    ],
+    "download_url": [
+        None,
+        "--download-url",
+        "Base URL of a mirror to download applications from instead of JetBrains and Google.",
+        str,
+        None,
+    ],
+    "extract_workers": [
+        None,
+        "--extract-workers",
+        "Number of threads writing extracted files. Use 0 to extract with the system tar command.",
+        int,
+        EXTRACT_WORKERS,
+    ],
+    "artifact_cache_size": [
+        None,
+        "--artifact-cache-size",
+        "Maximum size in MiB of the downloaded archives cache. Disabled by default (0).",
+        int,
+        ARTIFACT_CACHE_SIZE,
+    ],
+    "connect_timeout": [
+        None,
+        "--connect-timeout",
+        "Number of seconds to wait for a connection to a server.",
+        float,
+        HTTP_CONNECT_TIMEOUT,
+    ],
+    "read_timeout": [
+        None,
+        "--read-timeout",
+        "Number of seconds to wait for data from a server before giving up.",
+        float,
+        HTTP_READ_TIMEOUT,
+    ],
+    "retries": [
+        None,
+        "--retries",
+        "Number of times a failed request is retried, with exponential backoff.",
+        int,
+        HTTP_RETRIES,
+    ],
+    "profile": [
+        None,
+        "--profile",
+        "Append the duration, bytes, throughput and retries of every phase to this file, as JSON lines.",
+        str,
+        None,
+    ],
+    "metrics": [
+        None,
+        "--metrics",
+        "Write the totals of every phase to this file, in the Prometheus textfile format.",
+        str,
+        None,
+    ],
+}
+
+
+class FileBody:
+    """
+    The body of a response served by `FileAdapter`: `length` bytes of an open file, starting at its current position.
+    The file is closed once the body has been read.
+    """
+
+    def __init__(self, fileobj, length):
+        self.fileobj = fileobj
+        self.remaining = length
+        self.decode_content = False
+
+    def read(self, size=-1) -> bytes:
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        if not size:
+            return b""
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        if not self.remaining:
+            self.close()
+        return data
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer)[:self.remaining]
+        if not len(view):
+            return 0
+        read = self.fileobj.readinto(view)
+        self.remaining -= read
+        if not self.remaining:
+            self.close()
+        return read
+
+    def close(self):
+        if self.fileobj is not None:
+            self.fileobj.close()
+
+
+class FileAdapter:
+    """
+    A requests transport adapter serving file:// URLs from the local filesystem, so that the update feeds and the
+    applications can be taken from a mirror directory (see `mirror_url`) without an HTTP server.
+
+    Files are served the way a static HTTP server would: missing files are answered with 404, and responses carry
+    Content-Length, ETag and Last-Modified headers and honour conditional requests (If-None-Match,
+    If-Modified-Since) and byte ranges (Range, If-Range). The feed cache, checksums and resumable, segmented
+    downloads therefore work unchanged.
+    """
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        response = requests.models.Response()
+        response.url = request.url
+        response.request = request
+        response.headers = requests.structures.CaseInsensitiveDict()
+        response.raw = FileBody(None, 0)
+
+        try:
+            fileobj = open(unquote(urlsplit(request.url).path), 'rb')
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            response.status_code, response.reason = 404, "Not Found"
+            return response
+        except PermissionError:
+            response.status_code, response.reason = 403, "Forbidden"
+            return response
+
+        stat = os.fstat(fileobj.fileno())
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        last_modified = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(stat.st_mtime))
+        response.headers.update({"ETag": etag, "Last-Modified": last_modified, "Accept-Ranges": "bytes"})
+        response.status_code, response.reason = 200, "OK"
+        start, length = 0, stat.st_size
+        range_match = re.fullmatch(r"bytes=(\d+)-(\d*)", request.headers.get("Range", ""))
+
+        if (request.headers.get("If-None-Match") == etag
+                or request.headers.get("If-Modified-Since") == last_modified):
+            response.status_code, response.reason = 304, "Not Modified"
+            length = 0
+        elif range_match and request.headers.get("If-Range", etag) in (etag, last_modified):
+            start = int(range_match.group(1))
+            end = min(int(range_match.group(2)), stat.st_size - 1) if range_match.group(2) else stat.st_size - 1
+            if start > end:
+                response.status_code, response.reason = 416, "Range Not Satisfiable"
+                response.headers["Content-Range"] = f"bytes */{stat.st_size}"
+                length = 0
+            else:
+                response.status_code, response.reason = 206, "Partial Content"
+                response.headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+                length = end - start + 1
+
+        response.headers["Content-Length"] = str(length)
+        if request.method == "HEAD" or not length:
+            fileobj.close()
+        else:
+            fileobj.seek(start)
+            response.raw = FileBody(fileobj, length)
+        return response
+
+    def close(self):
+        pass
+
+
+class HttpSession:
+    """
+    A requests session shared by all network calls of the tool.
+
+    Connections are pooled and kept alive between requests, every request gets connect and read timeouts unless
+    one is given explicitly, and idempotent requests failing with a connection error or a transient status code
+    (HTTP_RETRY_STATUSES) are retried with exponential backoff. The retry settings and the exceptions worth
+    retrying are also exposed as attributes for callers that retry failures happening while streaming a response
+    body.
+
+    The underlying `requests.Session`, and the requests module itself, are only loaded when the first request is
+    sent, so operations that never use the network do not pay for them.
+    """
+
+    def __init__(self, connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT, retries=HTTP_RETRIES,
+                 backoff_factor=HTTP_BACKOFF_FACTOR, pool_size=10):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self.session = None
+        self.lock = threading.Lock()
+
+    @property
+    def transient_errors(self) -> tuple:
+        return (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout, urllib3.exceptions.ProtocolError, urllib3.exceptions.ReadTimeoutError)
+
+    def open(self):
+        """
+        Return the underlying `requests.Session`, creating it on first use.
+        """
+
+        with self.lock:
+            if self.session is None:
+                retry = urllib3.Retry(
+                    total=self.retries,
+                    backoff_factor=self.backoff_factor,
+                    status_forcelist=HTTP_RETRY_STATUSES,
+                    allowed_methods=frozenset({"GET", "HEAD"}),
+                    raise_on_status=False,
+                )
+                adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_size,
+                                                        pool_maxsize=self.pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.mount("file://", FileAdapter())
+                self.session = session
+            return self.session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        response = self.open().request(method, url, **kwargs)
+        if profiler is not None and getattr(response.raw, "retries", None):
+            profiler.count(retries=len(response.raw.retries.history))
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", False)
+        return self.request("HEAD", url, **kwargs)
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def backoff(self, attempt):
+        """
+        Sleep before retrying an operation for the `attempt`-th time (starting at 0).
+        """
+
+        time.sleep(self.backoff_factor * 2 ** attempt)
+
+
+def configure_session(**kwargs) -> HttpSession:
+    """
+    Replace the shared HTTP session with a new one built from the given `HttpSession` settings.
+    """
+
+    global http_session
+    if http_session is not None:
+        http_session.close()
+    http_session = HttpSession(**kwargs)
+    return http_session
+
+
+def get_session() -> HttpSession:
+    """
+    Return the shared HTTP session, creating it with the default settings if `configure_session` was not called.
+    """
+
+    if http_session is None:
+        return configure_session()
+    return http_session
+
+
+class Span:
+    """
+    A timed phase of a run, used as a context manager and recorded by its `Profiler` when it ends.
+
+    The bytes and retries of a span are those counted by the profiler while it was open, so a span also accounts
+    for the work of the spans nested in it, and concurrent spans may share some of each other's counts. Attributes
+    given to `span` or `set` (such as the application) are recorded along with the measurements, except for a
+    `bytes` attribute, which replaces the bytes counted, for phases reading local files rather than the network.
+    """
+
+    def __init__(self, profiler, name, attributes):
+        self.profiler = profiler
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start = time.time()
+        self.bytes, self.retries = self.profiler.bytes, self.profiler.retries
+        self.clock = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self.clock
+        size = self.attributes.pop("bytes", self.profiler.bytes - self.bytes)
+        self.profiler.record(self, duration, size, self.profiler.retries - self.retries,
+                             exc_type.__name__ if exc_type else None)
+        return False
+
+
+class NullSpan:
+    """
+    The span returned by `span` when profiling is disabled, which records nothing.
+    """
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Profiler:
+    """
+    Record the duration, bytes received, throughput and HTTP retries of the phases of a run (see `span`).
+
+    Every span is appended to `profile_path` as a JSON line as soon as it ends. The totals of every phase and
+    application are written to `metrics_path` in the Prometheus textfile format when the profiler is closed,
+    replacing the file atomically so a collector never reads it half written.
+    """
+
+    def __init__(self, profile_path=None, metrics_path=None):
+        self.metrics_path = metrics_path
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.retries = 0
+        self.totals = {}
+        self.start = time.time()
+        self.clock = time.perf_counter()
+        self.run = f"{os.getpid()}-{int(self.start * 1000)}"
+        self.profile_file = open(profile_path, 'a', buffering=1) if profile_path else None
+
+    def count(self, size=0, retries=0):
+        """
+        Account for `size` bytes received and `retries` retried requests.
+        """
+
+        with self.lock:
+            self.bytes += size
+            self.retries += retries
+
+    def record(self, span, duration, size, retries, error):
+        with self.lock:
+            if self.profile_file:
+                self.profile_file.write(json.dumps({
+                    "run": self.run,
+                    "span": span.name,
+                    "start": round(span.start, 6),
+                    "duration": round(duration, 6),
+                    "bytes": size,
+                    "throughput": round(size / duration) if duration else 0,
+                    "retries": retries,
+                    "error": error,
+                    **span.attributes,
+                }) + "\n")
+
+            totals = self.totals.setdefault((span.name, span.attributes.get("app", "")), [0, 0.0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += duration
+            totals[2] += size
+            totals[3] += retries
+            totals[4] += error is not None
+
+    def close(self):
+        """
+        Close the profile file and write the metrics file.
+        """
+
+        if self.profile_file:
+            self.profile_file.close()
+        if not self.metrics_path:
+            return
+
+        def escape(value):
+            return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+        lines = []
+        metrics = [
+            ("span_count", "Number of times each phase ran during the last run.", 0),
+            ("span_duration_seconds", "Time spent in each phase during the last run.", 1),
+            ("span_bytes", "Bytes received during each phase of the last run.", 2),
+            ("span_retries", "HTTP requests retried during each phase of the last run.", 3),
+            ("span_errors", "Phases of the last run that ended with an exception.", 4),
+        ]
+        for metric, description, index in metrics:
+            lines.append(f"# HELP {METRICS_PREFIX}_{metric} {description}")
+            lines.append(f"# TYPE {METRICS_PREFIX}_{metric} gauge")
+            for (name, app), totals in sorted(self.totals.items()):
+                lines.append(f'{METRICS_PREFIX}_{metric}{{span="{escape(name)}",app="{escape(app)}"}} '
+                             f'{round(totals[index], 6)}')
+        lines.append(f"# HELP {METRICS_PREFIX}_last_run_timestamp_seconds Time at which the last run started.")
+        lines.append(f"# TYPE {METRICS_PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(f"{METRICS_PREFIX}_last_run_timestamp_seconds {round(self.start, 3)}")
+        lines.append(f"# HELP {METRICS_PREFIX}_last_run_duration_seconds Duration of the last run.")
+        lines.append(f"# TYPE {METRICS_PREFIX}_last_run_duration_seconds gauge")
+        lines.append(f"{METRICS_PREFIX}_last_run_duration_seconds {round(time.perf_counter() - self.clock, 6)}")
+
+        with open(self.metrics_path + ".tmp", 'w') as metrics_file:
+            metrics_file.write("\n".join(lines) + "\n")
+        os.replace(self.metrics_path + ".tmp", self.metrics_path)
+
+
+def configure_profiler(profile_path=None, metrics_path=None) -> Profiler | None:
+    """
+    Replace the shared profiler with a new one writing to the given paths, or disable profiling if both are None.
+    """
+
+    global profiler
+    close_profiler()
+    if profile_path or metrics_path:
+        profiler = Profiler(profile_path, metrics_path)
+    return profiler
+
+
+def close_profiler():
+    """
+    Close the shared profiler, writing its metrics file, and disable profiling.
+    """
+
+    global profiler
+    if profiler is not None:
+        closing, profiler = profiler, None
+        closing.close()
+
+
+def span(name, **attributes) -> Span | NullSpan:
+    """
+    Return a context manager timing a phase of the run named `name`, such as "install.download".
+
+    When profiling is disabled, a shared span that records nothing is returned, so spans cost next to nothing.
+    """
+
+    if profiler is None:
+        return NULL_SPAN
+    return Span(profiler, name, attributes)
+
+
+def mirror_url(url, base_url=None) -> str:
+    """
+    Return the URL of a file in the mirror at `base_url`, or `url` itself if no mirror is set.
+
+    A mirror holds every file at `<host>/<path>` of its original URL (see `mirror_path`), so the same base URL covers
+    the JetBrains and Google servers, and the mirror can be served by any static HTTP server or read with file://.
+    """
+
+    if not base_url:
+        return url
+    parts = urlsplit(url)
+    return base_url.rstrip('/') + "/" + parts.netloc + parts.path
+
+
+def mirror_path(url, base_url=None) -> str:
+    """
+    Return the path of a file relative to the root of a mirror, from its URL in the mirror at `base_url` or its
+    original URL (see `mirror_url`).
+    """
+
+    if base_url and url.startswith(base_url.rstrip('/') + "/"):
+        return url[len(base_url.rstrip('/')) + 1:]
+    parts = urlsplit(url)
+    return parts.netloc + parts.path
+
+
+def check_redirect(url, max_redirects=5, session=None) -> int | None:
+    """
+    Check the final status code of a URL after potentially following a series of redirects.
+
+    The function uses the HTTP HEAD method to iteratively follow redirects up to a maximum
+    specified by `max_redirects`. If the maximum number of redirects is reached without arriving
+    at a non-redirect status code, the function returns `None`.
+
+    Parameters:
+    - url (str): The initial URL to check.
+    - max_redirects (int, optional): The maximum number of redirects to follow. Defaults to 5.
+    - session (requests.Session, optional): The session used to send the requests. Defaults to the shared session.
+
+    Returns:
+    - int or None: The HTTP status code of the final destination after following redirects. If the
+      maximum number of redirects is exceeded, returns `None`.
+
+    Notes:
+    - Only 301 and 302 status codes are treated as redirects.
+    """
+
+    with span("check_redirect", url=url) as redirect_span:
+        for redirects in range(max_redirects):
+            response = (session or get_session()).head(url, allow_redirects=False)
+            if response.status_code in (301, 302):
+                url = urljoin(url, response.headers.get("Location"))
+            else:
+                redirect_span.set(status=response.status_code, redirects=redirects)
+                return response.status_code
+        redirect_span.set(status=None, redirects=max_redirects)
+        return None
+
+
+def resolve_android_studio_link(link_template, version, links_path=DOWNLOAD_LINKS_PATH,
+                                max_workers=ANDROID_STUDIO_PROBE_WORKERS) -> str | None:
+    """
+    Find the download link of an Android Studio version.
+
+    The feed only gives the first three components of the Android Studio version, so the link is found by probing
+    the candidates `<version>.29` down to `<version>.1` with `check_redirect`. The candidates are probed concurrently
+    over the shared session, and the highest suffix that answers 200 is always selected, whatever the order in which
+    the probes complete. Probes for lower suffixes are cancelled as soon as the result is known.
+
+    A probe that fails, for instance because of a timeout or a reset connection, counts as a miss, so a single
+    failing suffix does not abort the resolution. Resolved links are cached per version and server in `links_path`,
+    so later runs skip probing entirely.
+
+    Parameters:
+    - link_template (str): The download link of Android Studio, with a <VERSION> placeholder.
+    - version (str): The version of Android Studio, as found in the feed (e.g. "2024.1.2").
+    - links_path (str, optional): The path of the resolved links cache. Defaults to DOWNLOAD_LINKS_PATH.
+    - max_workers (int, optional): The number of concurrent probes. Defaults to ANDROID_STUDIO_PROBE_WORKERS.
+
+    Returns:
+    - str or None: The download link, or None if no candidate is available.
+
+    Raises:
+    - requests.exceptions.RequestException: If every probe failed.
+    """
+
+    links = read_json_file(links_path) or {}
+    link_key = link_template.replace("<VERSION>", version)
+    if link_key in links:
+        logging.debug(f'Using cached download link for Android Studio {version}.')
+        return links[link_key]
+
+    candidates = [link_template.replace("<VERSION>", f"{version}.{suffix}") for suffix in reversed(range(1, 30))]
+    download_link = None
+    errors = []
+
+    def probe(candidate):
+        try:
+            return check_redirect(candidate)
+        except requests.exceptions.RequestException as error:
+            logging.debug(f'Could not probe {candidate}: {error}')
+            errors.append(error)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(probe, candidate) for candidate in candidates]
+        for candidate, future in zip(candidates, futures):
+            if future.result() == 200:
+                download_link = candidate
+                break
+        for future in futures:
+            future.cancel()
+
+    if not download_link and len(errors) == len(candidates):
+        raise errors[-1]
+
+    if download_link:
+        links[link_key] = download_link
+        os.makedirs(os.path.dirname(links_path), exist_ok=True)
+        write_json_file(links_path, links)
+
+    return download_link
+
+
+class ArtifactCache:
+    """
+    A size-bounded, content-addressed cache of downloaded application archives.
+
+    Archives are stored in `path` as `<sha256>.tar.gz`, and an index maps each download URL to its archive, together
+    with the application, version, size, time of last use and pinned state. Before downloading, the install process
+    looks the URL up in the cache, so reinstalling, rolling back or installing the same version in another directory
+    never downloads the archive again. When the cache grows beyond `max_size` bytes, the least recently used archives
+    that are not pinned are evicted, except for the archives held by downloads that are not extracted yet (see
+    `hold`).
+
+    The cache may be used by several threads and processes at the same time, such as an update and the background
+    prefetch: every change to the index is made in a `transaction`, which locks the index and reads it again, and
+    holds are locks on files of the cache, which other processes see.
+    """
+
+    def __init__(self, path=ARTIFACT_CACHE_PATH, max_size=ARTIFACT_CACHE_SIZE * 1024 ** 2):
+        self.path = path
+        self.max_size = max_size
+        self.index_path = os.path.join(path, "index.json")
+        self.holds_path = os.path.join(path, "holds")
+        self.lock = threading.RLock()
+        self.lock_fd = None
+        self.depth = 0
+        self.holds = {}
+        self.load()
+
+    def load(self):
+        """
+        Read the index again, without locking it, for callers that only read it.
+        """
+
+        self.entries = read_json_file(self.index_path) or {}
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Lock the index against other threads and processes, read it again, and write it back if it changed once the
+        outermost transaction ends.
+        """
+
+        with self.lock:
+            if self.depth:
+                self.depth += 1
+                try:
+                    yield
+                finally:
+                    self.depth -= 1
+                return
+
+            os.makedirs(self.path, exist_ok=True)
+            self.lock_fd = os.open(os.path.join(self.path, "index.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+                self.load()
+                loaded = json.dumps(self.entries, sort_keys=True)
+                self.depth = 1
+                try:
+                    yield
+                finally:
+                    self.depth = 0
+                    if json.dumps(self.entries, sort_keys=True) != loaded:
+                        write_json_file(self.index_path, self.entries)
+            finally:
+                os.close(self.lock_fd)
+                self.lock_fd = None
+
+    def archive_path(self, url) -> str:
+        return os.path.join(self.path, self.entries[url]["sha256"] + ".tar.gz")
+
+    def download_path(self, app, version) -> str:
+        """
+        Return the path where an archive is downloaded before being stored, on the same filesystem as the cache.
+        """
+
+        os.makedirs(self.path, exist_ok=True)
+        return os.path.join(self.path, f"{app}-{version}.tar.gz")
+
+    def hold_path(self, url) -> str:
+        return os.path.join(self.holds_path, hashlib.sha1(url.encode()).hexdigest() + ".lock")
+
+    def hold(self, url):
+        """
+        Protect the archive of `url` from eviction by any process until `release` is called as many times as `hold`,
+        while it is downloaded and extracted. Every hold is a shared lock on the hold file of the URL, which is
+        dropped when the process dies.
+        """
+
+        with self.transaction():
+            os.makedirs(self.holds_path, exist_ok=True)
+            fd = os.open(self.hold_path(url), os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            self.holds.setdefault(url, []).append(fd)
+
+    def release(self, url):
+        """
+        Drop a hold taken by `hold`, and evict the archives that were only kept over the size budget by it.
+        """
+
+        with self.transaction():
+            os.close(self.holds[url].pop())
+            if not self.holds[url]:
+                del self.holds[url]
+                self.evict(keep=(url,))
+
+    def is_held(self, url) -> bool:
+        """
+        Check whether a thread of any process holds the archive of `url` (see `hold`).
+        """
+
+        try:
+            fd = os.open(self.hold_path(url), os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(fd)
+        return False
+
+    def digest(self, url) -> str | None:
+        """
+        Return the SHA-256 digest of the archive cached for `url`, or None if it is not cached.
+        """
+
+        with self.transaction():
+            return self.entries.get(url, {}).get("sha256")
+
+    def lookup(self, url, sha256=None) -> str | None:
+        """
+        Return the path of the cached archive downloaded from `url`, or None if it is not cached.
+
+        If `sha256` is given, an archive with a different digest is dropped from the cache and None is returned.
+        """
+
+        with self.transaction():
+            entry = self.entries.get(url)
+            if not entry:
+                return None
+
+            archive_path = self.archive_path(url)
+            if (not os.path.exists(archive_path) or os.path.getsize(archive_path) != entry["size"]
+                    or (sha256 and entry["sha256"] != sha256)):
+                self.remove(url)
+                return None
+
+            entry["last_used"] = time.time()
+            return archive_path
+
+    def store(self, download_path, url, app, version, sha256=None) -> str:
+        """
+        Move a downloaded archive into the cache and evict old archives if the cache is over its size budget.
+
+        Parameters:
+        - download_path (str): The downloaded archive, preferably from `download_path`.
+        - url (str): The URL the archive was downloaded from.
+        - app (str): The key of the application.
+        - version (str): The version of the application.
+        - sha256 (str, optional): The SHA-256 digest of the archive, as computed while downloading it. The archive
+          is read again to compute it if not given.
+
+        Returns:
+        - str: The path of the archive in the cache.
+        """
+
+        sha256 = sha256 or hash_file(download_path)
+        with self.transaction():
+            self.entries[url] = {
+                "app": app,
+                "version": version,
+                "sha256": sha256,
+                "size": os.path.getsize(download_path),
+                "last_used": time.time(),
+                "pinned": self.entries.get(url, {}).get("pinned", False),
+            }
+            archive_path = self.archive_path(url)
+            shutil.move(download_path, archive_path)
+            remove_download(download_path)
+
+            self.evict(keep=(url,))
+            return archive_path
+
+    def remove(self, url) -> int:
+        """
+        Remove a cached archive, unless another URL shares it. Returns the number of bytes freed. Must be called in a
+        `transaction`.
+        """
+
+        entry = self.entries.pop(url)
+        if url not in self.holds and not self.is_held(url) and os.path.exists(self.hold_path(url)):
+            os.remove(self.hold_path(url))
+        if any(other["sha256"] == entry["sha256"] for other in self.entries.values()):
+            return 0
+        archive_path = os.path.join(self.path, entry["sha256"] + ".tar.gz")
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+        return entry["size"]
+
+    def evict(self, max_size=None, keep=()) -> int:
+        """
+        Remove the least recently used archives that are not pinned until the cache fits in `max_size` bytes.
+
+        Parameters:
+        - max_size (int, optional): The size budget in bytes. Defaults to the size budget of the cache.
+        - keep (iterable, optional): URLs whose archives must not be evicted, besides the held ones (see `hold`).
+
+        Returns:
+        - int: The number of bytes freed.
+        """
+
+        max_size = self.max_size if max_size is None else max_size
+        with self.transaction():
+            total_size = sum(entry["size"] for entry in self.entries.values())
+            freed = 0
+            for url, entry in sorted(self.entries.items(), key=lambda item: item[1]["last_used"]):
+                if total_size - freed <= max_size:
+                    break
+                if entry["pinned"] or url in keep or url in self.holds or self.is_held(url):
+                    continue
+                freed += self.remove(url)
+                logging.debug(f'Evicted {url} from the artifact cache.')
+            return freed
+
+
+class TokenBucket:
+    """
+    Limit the rate at which bytes are consumed to `rate` bytes per second, allowing bursts of up to one second.
+
+    Callers report the bytes they have just transferred with `consume`, which sleeps for as long as needed to bring
+    the average rate back under the limit. The bucket may be shared by any number of threads.
+
+    With a `lock_path`, the bucket is also shared with every other process using the same file: its state (the
+    available bytes and the time it was last updated) is kept in the file and only read and updated while holding
+    an exclusive lock on it, so concurrent downloads on a host stay under the limit together. Processes sharing a
+    bucket should use the same rate.
+    """
+
+    STATE = struct.Struct("=dd")
+
+    def __init__(self, rate, lock_path=None):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.fd = None
+        if lock_path:
+            os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+            self.fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def take(self, tokens, updated, size, now) -> tuple[float, float]:
+        """
+        Return the bytes available after refilling the bucket up to `now` and removing `size` bytes, and the number
+        of seconds to wait for the bucket to be refilled back to zero.
+        """
+
+        tokens = min(float(self.rate), tokens + (now - updated) * self.rate) - size
+        return tokens, max(0.0, -tokens / self.rate)
+
+    def consume(self, size):
+        with self.lock:
+            if self.fd is None:
+                now = time.monotonic()
+                self.tokens, wait = self.take(self.tokens, self.updated, size, now)
+                self.updated = now
+            else:
+                # The monotonic clock is shared by all processes of a host
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+                try:
+                    state = os.pread(self.fd, self.STATE.size, 0)
+                    now = time.monotonic()
+                    tokens, updated = self.STATE.unpack(state) if len(state) == self.STATE.size else (self.rate, now)
+                    if updated > now:
+                        # Left by a previous boot
+                        tokens, updated = self.rate, now
+                    tokens, wait = self.take(tokens, updated, size, now)
+                    os.pwrite(self.fd, self.STATE.pack(tokens, now), 0)
+                finally:
+                    fcntl.flock(self.fd, fcntl.LOCK_UN)
+        if wait:
+            time.sleep(wait)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def configure_bandwidth_limit(rate, lock_path=None) -> TokenBucket | None:
+    """
+    Limit application downloads to `rate` bytes per second, shared with other processes through `lock_path` if
+    given, or remove the limit if `rate` is 0.
+    """
+
+    global bandwidth_limiter
+    if bandwidth_limiter is not None:
+        bandwidth_limiter.close()
+    bandwidth_limiter = TokenBucket(rate, lock_path=lock_path) if rate else None
+    return bandwidth_limiter
+
+
+def parse_time_window(value) -> tuple[int, int]:
+    """
+    Parse a window of the day given as "HH:MM-HH:MM" into its start and end, in minutes since midnight.
+
+    Raises:
+    - ValueError: If the window is not in the expected format.
+    """
+
+    match = re.fullmatch(r"\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*", value)
+    if not match:
+        raise ValueError(f"Invalid time window: {value}")
+    hours_start, minutes_start, hours_end, minutes_end = (int(group) for group in match.groups())
+    if hours_start > 23 or hours_end > 23 or minutes_start > 59 or minutes_end > 59:
+        raise ValueError(f"Invalid time window: {value}")
+    return hours_start * 60 + minutes_start, hours_end * 60 + minutes_end
+
+
+def in_time_window(window, now=None) -> bool:
+    """
+    Check whether the local time `now` (by default, the current time) falls within a window of the day returned by
+    `parse_time_window`. A window ending before it starts spans midnight, and one ending when it starts is always
+    open.
+    """
+
+    start, end = window
+    now = time.localtime(now)
+    minute = now.tm_hour * 60 + now.tm_min
+    if start < end:
+        return start <= minute < end
+    return minute >= start or minute < end or start == end
+
+
+class RangeNotSupportedError(Exception):
+    """Raised when a server answers a ranged request with the full content instead of a partial response."""
+
+
+class DownloadCancelledError(Exception):
+    """Raised in the connections of a download that is stopped because another of its connections failed."""
+
+
+def preallocate_file(fd, size):
+    """
+    Reserve `size` bytes on disk for the file referenced by the descriptor `fd`.
+
+    Falls back to a sparse truncate on platforms or filesystems that do not support posix_fallocate.
+    """
+
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        os.ftruncate(fd, size)
+
+
+class StreamDigest:
+    """
+    Incrementally compute the SHA-256 digest of a file downloaded as one or more concurrent byte ranges.
+
+    Bytes are hashed straight from the download buffers when they extend the prefix of the file hashed so far.
+    Bytes written further ahead by other connections are hashed from the file, while they are still in the page
+    cache, as soon as every byte before them has been written. A download over a single connection is therefore
+    hashed without reading anything back, and a resumed download only reads back the bytes fetched before it was
+    interrupted.
+
+    The `segments` are the `[start, end, completed_bytes]` ranges of a download state (see `download_segments`),
+    updated by the caller before every call to `update`. Calls must not overlap.
+    """
+
+    def __init__(self, fd, segments, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        self.fd = fd
+        self.segments = segments
+        self.chunk_size = chunk_size
+        self.reset()
+
+    def reset(self):
+        self.digest = hashlib.sha256()
+        self.position = 0
+
+    def update(self, offset, data):
+        """
+        Account for `data`, just written to the file at `offset`.
+        """
+
+        if offset == self.position:
+            self.digest.update(data)
+            self.position += len(data)
+        self.catch_up()
+
+    def catch_up(self):
+        """
+        Hash, from the file, the bytes already written right after the prefix hashed so far.
+        """
+
+        for start, end, done in self.segments:
+            if end != -1 and self.position > end:
+                continue
+            while self.position < start + done:
+                data = os.pread(self.fd, min(self.chunk_size, start + done - self.position), self.position)
+                if not data:
+                    raise OSError(f"Unexpected end of file at byte {self.position}.")
+                self.digest.update(data)
+                self.position += len(data)
+            if end == -1 or self.position <= end:
+                break
+
+    def hexdigest(self) -> str:
+        self.catch_up()
+        return self.digest.hexdigest()
+
+
+class DigestReader:
+    """
+    A read-only file object that computes the SHA-256 digest of the bytes read from an underlying stream.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1) -> bytes:
+        data = self.fileobj.read(size)
+        self.digest.update(data)
+        if profiler is not None:
+            profiler.count(size=len(data))
+        if bandwidth_limiter is not None:
+            bandwidth_limiter.consume(len(data))
+        return data
+
+    def hexdigest(self, chunk_size=DOWNLOAD_CHUNK_SIZE) -> str:
+        """
+        Read and hash whatever is left of the stream, such as the zero padding after the end of a tar archive.
+        """
+
+        while self.read(chunk_size):
+            pass
+        return self.digest.hexdigest()
+
+
+def write_response(response, fd, offset, view, progress=None, cancelled=None) -> int:
+    """
+    Copy a streamed response body into an open file descriptor starting at `offset`.
+
+    Bytes are read into the caller-provided buffer `view` and written with os.pwrite, so several responses can write
+    to different regions of the same file concurrently. Reads are throttled by the bandwidth limit, if one is set
+    (see `configure_bandwidth_limit`).
+
+    Parameters:
+    - response (requests.Response): A response opened with `stream=True`.
+    - fd (int): The file descriptor to write to.
+    - offset (int): The position in the file where the first byte is written.
+    - view (memoryview): The reusable read buffer.
+    - progress (callable, optional): Called with every chunk after it is written, as a view of `view` that is only
+      valid until the callback returns.
+    - cancelled (threading.Event, optional): Stops the copy between two chunks once set.
+
+    Returns:
+    - int: The number of bytes written.
+
+    Raises:
+    - DownloadCancelledError: If `cancelled` is set before the end of the response.
+    """
+
+    response.raw.decode_content = True
+    written = 0
+    while True:
+        if cancelled is not None and cancelled.is_set():
+            raise DownloadCancelledError("Download cancelled.")
+        read = response.raw.readinto(view)
+        if not read:
+            break
+        os.pwrite(fd, view[:read], offset + written)
+        written += read
+        if profiler is not None:
+            profiler.count(size=read)
+        if bandwidth_limiter is not None:
+            bandwidth_limiter.consume(read)
+        if progress:
+            progress(view[:read])
+    return written
+
+
+def read_json_file(path) -> dict | None:
+    """
+    Read a JSON state or metadata file, returning None if it does not exist or cannot be parsed.
+    """
+
+    try:
+        with open(path, 'r') as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_file(path, data):
+    """
+    Atomically write a JSON state or metadata file. Every writer uses its own temporary file, so threads writing the
+    same file at the same time never corrupt it.
+    """
+
+    temporary_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(temporary_path, 'w') as json_file:
+        json.dump(data, json_file)
+    os.replace(temporary_path, path)
+
+
+def is_valid_download(download_path) -> bool:
+    """
+    Check whether a previously downloaded archive can be reused without downloading it again.
+
+    The check is cheap and does not read the archive: the sidecar state file must mark the download as complete,
+    the file size must match the length announced by the server, and the file must start with the gzip magic number.
+
+    Parameters:
+    - download_path (str): The path of the downloaded archive.
+
+    Returns:
+    - bool: True if the archive is complete and can be extracted.
+    """
+
+    state = read_json_file(download_path + DOWNLOAD_STATE_SUFFIX)
+    if not state or not state.get("complete"):
+        return False
+
+    try:
+        if os.path.getsize(download_path) != state["length"]:
+            return False
+        with open(download_path, 'rb') as f:
+            return f.read(2) == b"\x1f\x8b"
+    except (OSError, KeyError):
+        return False
+
+
+def download_digest(download_path) -> str | None:
+    """
+    Return the SHA-256 digest of a complete download, as recorded in its sidecar state file while downloading it.
+    """
+
+    state = read_json_file(download_path + DOWNLOAD_STATE_SUFFIX)
+    return state.get("sha256") if state and state.get("complete") else None
+
+
+def fetch_checksum(url, checksums_path=CHECKSUMS_PATH) -> str | None:
+    """
+    Fetch the SHA-256 digest published next to a download, as `<url>.sha256`.
+
+    Digests are cached in `checksums_path` together with the other feed data, keyed by download URL. Since the URL
+    of a download includes its version, a cached digest never needs to be revalidated. Downloads without a published
+    digest are cached as such too, so they are not requested again.
+
+    Parameters:
+    - url (str): The URL of the download.
+    - checksums_path (str, optional): The path of the digests cache. Defaults to CHECKSUMS_PATH.
+
+    Returns:
+    - str or None: The lowercase hex digest, or None if no digest is published for the download.
+
+    Raises:
+    - requests.exceptions.RequestException: If the server cannot be reached or returns an unexpected status code.
+    """
+
+    checksums = read_json_file(checksums_path) or {}
+    if url in checksums:
+        logging.debug(f'Using cached checksum for {url}.')
+        return checksums[url]
+
+    response = get_session().get(url + CHECKSUM_SUFFIX)
+    if response.status_code in (403, 404):
+        checksum = None
+    else:
+        response.raise_for_status()
+        # The file has the format of the sha256sum output: "<digest> *<file name>"
+        checksum = response.text.split()[0].lower() if response.text.split() else ""
+        if len(checksum) != 64 or any(character not in "0123456789abcdef" for character in checksum):
+            raise ValueError(f"Invalid checksum file at {url + CHECKSUM_SUFFIX}.")
+
+    checksums[url] = checksum
+    os.makedirs(os.path.dirname(checksums_path), exist_ok=True)
+    write_json_file(checksums_path, checksums)
+    return checksum
+
+
+def remove_download(download_path):
+    """
+    Remove a downloaded archive together with its partial file and sidecar state file, ignoring missing files.
+    """
+
+    for path in (download_path, download_path + DOWNLOAD_PART_SUFFIX, download_path + DOWNLOAD_STATE_SUFFIX):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def download_file(url, download_path, chunk_size=DOWNLOAD_CHUNK_SIZE, connections=1) -> tuple[int, str]:
+    """
+    Stream a remote file to disk using fixed-size, reused buffers, resuming any interrupted previous attempt.
+
+    The response body is never held in memory as a whole: bytes are read from the socket into a pre-allocated buffer
+    of `chunk_size` bytes and written straight to the target file. When the server announces a Content-Length, the
+    target file is preallocated to that size before the first byte is written, so a full disk is detected up front.
+
+    When `connections` is greater than 1 and the server advertises byte range support, the file is split into
+    `connections` byte ranges fetched concurrently into the same file.
+
+    While downloading, data is written to `<download_path>.part` and progress is recorded in the sidecar state file
+    `<download_path>.state` (URL, length, ETag, Last-Modified and the completed bytes of every range). If a previous
+    attempt was interrupted and the remote file is unchanged, only the missing bytes are requested, using HTTP Range
+    with If-Range so that a file changed in the meantime is downloaded again from scratch. Once complete, the
+    partial file is renamed to `download_path` and the state file is marked as complete (see `is_valid_download`).
+
+    The SHA-256 digest of the file is computed while it is being downloaded (see `StreamDigest`) and recorded in the
+    state file, so it can be checked against the published digest without reading the file again.
+
+    Parameters:
+    - url (str): The URL of the file to download.
+    - download_path (str): The path where the file will be written.
+    - chunk_size (int, optional): The size in bytes of the read buffer. Defaults to DOWNLOAD_CHUNK_SIZE.
+    - connections (int, optional): The maximum number of concurrent connections. Defaults to 1.
+
+    Returns:
+    - tuple: The size in bytes and the SHA-256 hex digest of the downloaded file.
+
+    Raises:
+    - requests.exceptions.RequestException: If a request fails or returns an error status code.
+    - OSError: If a response ends before the announced Content-Length is reached.
+    """
+
+    part_path = download_path + DOWNLOAD_PART_SUFFIX
+    state_path = download_path + DOWNLOAD_STATE_SUFFIX
+
+    probe = get_session().head(url, allow_redirects=True)
+    probe.raise_for_status()
+    content_length = 0
+    if "Content-Encoding" not in probe.headers:
+        content_length = int(probe.headers.get("Content-Length", 0))
+    accepts_ranges = probe.headers.get("Accept-Ranges") == "bytes" and content_length > 0
+
+    state = read_json_file(state_path)
+    if (state and os.path.exists(part_path) and accepts_ranges and not state.get("complete")
+            and state.get("url") == url and state.get("length") == content_length
+            and state.get("etag") == probe.headers.get("ETag")
+            and state.get("last_modified") == probe.headers.get("Last-Modified")):
+        msg_resume = "Resuming download: {} of {} bytes already downloaded.".format(
+            sum(segment[2] for segment in state["segments"]), content_length)
+        logging.info(msg_resume)
+    else:
+        segment_count = connections if accepts_ranges and content_length >= 2 * chunk_size else 1
+        segment_size = -(-content_length // segment_count) if content_length else 0
+        state = {
+            "url": url,
+            "length": content_length,
+            "etag": probe.headers.get("ETag"),
+            "last_modified": probe.headers.get("Last-Modified"),
+            "complete": False,
+            "segments": [[start, min(start + segment_size, content_length) - 1, 0]
+                         for start in range(0, content_length, segment_size)] if content_length else [[0, -1, 0]],
+        }
+
+        fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if content_length:
+                preallocate_file(fd, content_length)
+        finally:
+            os.close(fd)
+
+    try:
+        downloaded, sha256 = download_segments(probe.url, part_path, state, state_path, chunk_size=chunk_size)
+    except RangeNotSupportedError:
+        logging.warning(f'Server ignored range requests for {probe.url}. Restarting download on a single connection.')
+        remove_download(download_path)
+        return download_file(url, download_path, chunk_size=chunk_size, connections=1)
+
+    if content_length and downloaded != content_length:
+        raise OSError(f"Incomplete download: received {downloaded} of {content_length} bytes.")
+
+    os.truncate(part_path, downloaded)
+    os.replace(part_path, download_path)
+    state["length"] = downloaded
+    state["sha256"] = sha256
+    state["complete"] = True
+    write_json_file(state_path, state)
+
+    return downloaded, sha256
+
+
+def download_segments(url, part_path, state, state_path, chunk_size=DOWNLOAD_CHUNK_SIZE) -> tuple[int, str]:
+    """
+    Fetch the missing bytes of every range listed in a download state, concurrently, into a partial file.
+
+    Each range is requested on its own connection and written in place with os.pwrite, using a dedicated buffer of
+    `chunk_size` bytes. Progress is recorded in `state["segments"]` as `[start, end, completed_bytes]` and saved to
+    `state_path` every DOWNLOAD_STATE_INTERVAL bytes and whenever the download stops, so it can be resumed later.
+    A range with an end of -1 stands for a file of unknown length, fetched without a Range header.
+
+    The first range to fail stops the others between two chunks, and its error is raised as soon as they have
+    stopped, instead of once every range before it in the list has finished.
+
+    Parameters:
+    - url (str): The final (already redirected) URL of the file.
+    - part_path (str): The path of the partial file, already created and preallocated.
+    - state (dict): The download state, as created by `download_file`.
+    - state_path (str): The path of the sidecar state file.
+    - chunk_size (int, optional): The size in bytes of each connection's read buffer.
+
+    Returns:
+    - tuple: The total number of bytes present in the partial file and their SHA-256 hex digest.
+
+    Raises:
+    - RangeNotSupportedError: If the server answers a range request with anything other than 206 Partial Content.
+    - OSError: If any range ends before its announced size is reached.
+    """
+
+    lock = threading.Lock()
+    cancelled = threading.Event()
+    unsaved = [0]
+
+    def progress(segment, chunk):
+        with lock:
+            offset = segment[0] + segment[2]
+            read = len(chunk)
+            segment[2] += read
+            digest.update(offset, chunk)
+            unsaved[0] += read
+            if unsaved[0] >= DOWNLOAD_STATE_INTERVAL:
+                write_json_file(state_path, state)
+                unsaved[0] = 0
+
+    def fetch_segment(segment):
+        session = get_session()
+        for attempt in range(session.retries + 1):
+            if cancelled.is_set():
+                raise DownloadCancelledError("Download cancelled.")
+            if segment[1] == -1:
+                # A response of unknown length cannot be resumed
+                segment[2] = 0
+                digest.reset()
+            try:
+                return fetch_range(segment)
+            except session.transient_errors as error:
+                if attempt == session.retries:
+                    raise
+                logging.warning(f'Download of range {segment[0]}-{segment[1]} interrupted ({error}). Retrying.')
+                if profiler is not None:
+                    profiler.count(retries=1)
+                session.backoff(attempt)
+
+    def fetch_range(segment):
+        start, end, done = segment
+        if end != -1 and start + done > end:
+            return
+        headers = {}
+        if end != -1:
+            headers["Range"] = f"bytes={start + done}-{end}"
+            if state.get("etag") or state.get("last_modified"):
+                headers["If-Range"] = state.get("etag") or state.get("last_modified")
+
+        view = memoryview(bytearray(chunk_size))
+        with get_session().get(url, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            # A full response is only acceptable when the whole file was requested anyway
+            if (end != -1 and response.status_code != 206
+                    and not (start + done == 0 and len(state["segments"]) == 1)):
+                raise RangeNotSupportedError(f"Expected 206 Partial Content, got {response.status_code}.")
+            write_response(response, fd, start + done, view, progress=lambda chunk: progress(segment, chunk),
+                           cancelled=cancelled)
+
+        if end != -1 and segment[2] != end - start + 1:
+            raise OSError(f"Incomplete range {start}-{end}: received {segment[2] - done} of {end - start - done + 1} "
+                          f"bytes.")
+
+    fd = os.open(part_path, os.O_RDWR)
+    digest = StreamDigest(fd, state["segments"], chunk_size=chunk_size)
+    try:
+        # Hash the bytes downloaded by a previous attempt
+        digest.catch_up()
+        with ThreadPoolExecutor(max_workers=len(state["segments"])) as executor:
+            futures = [executor.submit(fetch_segment, segment) for segment in state["segments"]]
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    cancelled.set()
+                    for pending in futures:
+                        pending.cancel()
+                    raise future.exception()
+        sha256 = digest.hexdigest()
+    finally:
+        os.close(fd)
+        write_json_file(state_path, state)
+
+    if len(state["segments"]) > 1:
+        logging.debug(f'Downloaded {state["length"]} bytes over {len(state["segments"])} connections.')
+    return sum(segment[2] for segment in state["segments"]), sha256
+
+
+def fetch_feed(url, cache_directory=FEED_CACHE_PATH, ttl=FEED_CACHE_TTL) -> tuple[str, dict]:
+    """
+    Fetch an update feed through a persistent on-disk cache.
+
+    Every feed is stored in `cache_directory` as `<sha1 of url>.xml`, next to a `<sha1 of url>.json` metadata file
+    holding its ETag, Last-Modified, the SHA-1 of its content and the time it was last validated. The cached copy is
+    used without any network access while it is younger than `ttl` seconds. Past that, the feed is revalidated with a
+    conditional GET (If-None-Match / If-Modified-Since), so an unchanged feed costs a single 304 response. If the
+    server cannot be reached, the last good copy is used, whatever its age.
+
+    The content itself is not read by this function, so callers that only need the validator (see `feed_validator`)
+    never load the feed into memory.
+
+    Parameters:
+    - url (str): The URL of the feed.
+    - cache_directory (str, optional): The directory holding the cached feeds. Defaults to FEED_CACHE_PATH.
+    - ttl (int, optional): The number of seconds a cached feed is used without revalidation. Defaults to FEED_CACHE_TTL.
+
+    Returns:
+    - tuple: The path of the cached feed and its metadata dictionary.
+
+    Raises:
+    - requests.exceptions.RequestException: If the feed cannot be fetched and no cached copy exists.
+    """
+
+    cache_key = hashlib.sha1(url.encode()).hexdigest()
+    content_path = os.path.join(cache_directory, cache_key + ".xml")
+    metadata_path = os.path.join(cache_directory, cache_key + ".json")
+
+    metadata = read_json_file(metadata_path) if os.path.exists(content_path) else None
+    if metadata and time.time() - metadata.get("validated", 0) < ttl:
+        logging.debug(f'Using cached feed for {url}.')
+        return content_path, metadata
+
+    headers = {}
+    if metadata and metadata.get("etag"):
+        headers["If-None-Match"] = metadata["etag"]
+    if metadata and metadata.get("last_modified"):
+        headers["If-Modified-Since"] = metadata["last_modified"]
+
+    try:
+        response = get_session().get(url, headers=headers)
+        if response.status_code != 304:
+            response.raise_for_status()
+    except requests.exceptions.RequestException as error:
+        if not metadata:
+            raise
+        logging.warning(f'Could not reach {url} ({error}). Using the last cached copy of the feed.')
+        return content_path, metadata
+
+    os.makedirs(cache_directory, exist_ok=True)
+    if response.status_code == 304:
+        logging.debug(f'Cached feed for {url} is still valid.')
+    else:
+        with open(content_path + ".tmp", 'wb') as cache_file:
+            cache_file.write(response.content)
+        if profiler is not None:
+            profiler.count(size=len(response.content))
+        os.replace(content_path + ".tmp", content_path)
+        metadata = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "sha1": hashlib.sha1(response.content).hexdigest(),
+        }
+
+    metadata["validated"] = time.time()
+    write_json_file(metadata_path, metadata)
+    return content_path, metadata
+
+
+def feed_validator(metadata) -> str | None:
+    """
+    Return the value identifying the version of a cached feed: its ETag, Last-Modified date or content hash.
+    """
+
+    return metadata.get("etag") or metadata.get("last_modified") or metadata.get("sha1")
+
+
+def load_catalog(catalog_path, validators, products) -> dict | None:
+    """
+    Load the compiled catalog snapshot, if it is still up to date.
+
+    The snapshot is only used if it was written in the current CATALOG_FORMAT, from feeds with the same
+    validators as `validators`, and for the same set of products and channels as `products`.
+
+    Parameters:
+    - catalog_path (str): The path of the snapshot file.
+    - validators (dict): The current validator of each feed, keyed by URL (see `feed_validator`).
+    - products (dict): The product names to index, each mapped to the set of channel names to keep.
+
+    Returns:
+    - dict or None: The catalog in the form returned by `index_feed`, or None if it must be rebuilt.
+    """
+
+    catalog = read_json_file(catalog_path)
+    if (not catalog or catalog.get("format") != CATALOG_FORMAT or catalog.get("sources") != validators
+            or catalog.get("products") != {name: sorted(channels) for name, channels in products.items()}):
+        return None
+
+    return {(product, channel): build
+            for product, channels in catalog["builds"].items()
+            for channel, build in channels.items()}
+
+
+def save_catalog(catalog_path, validators, products, index):
+    """
+    Write the compiled catalog snapshot read by `load_catalog`.
+
+    Parameters:
+    - catalog_path (str): The path of the snapshot file.
+    - validators (dict): The validator of each feed the index was built from, keyed by URL.
+    - products (dict): The product names that were indexed, each mapped to the set of channel names kept.
+    - index (dict): The index returned by `index_feed`.
+    """
+
+    builds = {}
+    for (product, channel), build in index.items():
+        builds.setdefault(product, {})[channel] = build
+
+    os.makedirs(os.path.dirname(catalog_path), exist_ok=True)
+    write_json_file(catalog_path, {
+        "format": CATALOG_FORMAT,
+        "sources": validators,
+        "products": {name: sorted(channels) for name, channels in products.items()},
+        "builds": builds,
+    })
+
+
+def index_feed(source, products) -> dict:
+    """
+    Index the latest build of selected products and channels from an updates.xml feed in a single pass.
+
+    The feed is streamed with iterparse and every product element is cleared as soon as it has been read, so only
+    one product is held in memory at a time, instead of the whole document tree. Besides its attributes, each indexed
+    build records the attributes of its patches and download buttons under the "patches" and "downloads" keys.
+
+    Parameters:
+    - source (str or file-like): The path or binary stream of the feed.
+    - products (dict): The product names to index, each mapped to the set of channel names to keep.
+
+    Returns:
+    - dict: The attributes of the first build listed in each channel, in the form:
+            {(<product_name>, <channel_name>): {<attribute>: <value>, ..., "patches": [...], "downloads": [...]}, ...}
+    """
+
+    index = {}
+    product = channel = None
+    root = None
+
+    for event, element in elementTree.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            elif element.tag == "product":
+                product = element.get("name")
+            elif element.tag == "channel":
+                channel = element.get("name")
+            continue
+
+        if element.tag == "build":
+            if channel in products.get(product, ()) and (product, channel) not in index:
+                build = dict(element.attrib)
+                build["patches"] = [dict(patch.attrib) for patch in element.iter("patch")]
+                build["downloads"] = [dict(button.attrib) for button in element.iter("button")]
+                index[(product, channel)] = build
+        elif element.tag == "channel":
+            channel = None
+        elif element.tag == "product":
+            product = None
+            root.clear()
+
+    return index
+
+
+def strip_tar_members(tar, strip_components=1):
+    """
+    Yield the members of a tar archive with their leading path components removed.
+
+    This mirrors the behaviour of `tar --strip-components`: members whose path has no more than `strip_components`
+    components are skipped, and the link names of hard links are rewritten the same way so that they keep pointing
+    at the stripped target. Symbolic link targets are left untouched.
+
+    Parameters:
+    - tar (tarfile.TarFile): The archive being read. Stream archives are supported.
+    - strip_components (int, optional): The number of leading path components to remove. Defaults to 1.
+    """
+
+    for member in tar:
+        parts = member.name.split("/")[strip_components:]
+        if not any(parts):
+            continue
+        member.name = "/".join(parts)
+        if member.islnk():
+            member.linkname = "/".join(member.linkname.split("/")[strip_components:])
+        yield member
+
+
+def extract_tar_stream(fileobj, destination, strip_components=1, bufsize=EXTRACT_READ_SIZE,
+                       workers=EXTRACT_WORKERS, buffer_size=EXTRACT_BUFFER_SIZE):
+    """
+    Extract a gzip-compressed tar archive from a non-seekable file object.
+
+    The archive is read strictly sequentially, so `fileobj` can be a network stream. Decompression and parsing run on
+    the calling thread, which hands the content of every regular file to a pool of `workers` threads that write it
+    and set its permissions, owner and modification time, while the next members are being decompressed. Since an
+    application archive holds tens of thousands of mostly small files, this keeps the single-threaded inflate busy
+    instead of waiting for every file to be written in turn. At most `buffer_size` bytes of file content wait to be
+    written at any time; larger files are written directly by the calling thread.
+
+    Directories are created as they are found, and their permissions and times are set once everything else has been
+    extracted. Symbolic and hard links are created last, so hard links always find their target. File modes, owners
+    (when running as root), symbolic links and hard links are preserved, with the same restrictions as the 'tar'
+    extraction filter: absolute paths and paths leaving `destination` are rejected, and setuid, setgid, sticky and
+    group/other write bits are removed. Symbolic links whose target is absolute or leaves `destination` are rejected
+    as well. Since no symbolic link exists until the files are written, the paths of files and directories are
+    checked lexically, and only links are resolved against the filesystem.
+
+    Parameters:
+    - fileobj (file-like): A readable binary stream containing a .tar.gz archive.
+    - destination (str): The directory into which the members are extracted.
+    - strip_components (int, optional): The number of leading path components to remove. Defaults to 1.
+    - bufsize (int, optional): The size in bytes of the read buffer. Defaults to EXTRACT_READ_SIZE. The tar module
+      copies what is left of its buffer after every header it reads, so large buffers slow extraction down.
+    - workers (int, optional): The number of writer threads. Use 0 to extract sequentially. Defaults to
+      EXTRACT_WORKERS.
+    - buffer_size (int, optional): The maximum number of bytes waiting to be written. Defaults to
+      EXTRACT_BUFFER_SIZE.
+
+    Raises:
+    - tarfile.TarError: If the archive is truncated or corrupt, or a member is rejected by the extraction filter.
+    - OSError: If a member cannot be written.
+    """
+
+    def check_link(member):
+        if member.issym():
+            target_path = os.path.realpath(os.path.join(destination, os.path.dirname(member.name), member.linkname))
+            if (os.path.isabs(member.linkname) or os.path.commonpath([target_path, os.path.realpath(destination)])
+                    != os.path.realpath(destination)):
+                raise tarfile.ExtractError(f"Refusing to link {member.name} to {member.linkname}.")
+        return member
+
+    if not workers:
+        with tarfile.open(fileobj=fileobj, mode="r|gz", bufsize=bufsize) as tar:
+            members = (check_link(member) for member in strip_tar_members(tar, strip_components))
+            if hasattr(tarfile, "tar_filter"):
+                tar.extractall(destination, members=members, filter="tar")
+            else:
+                tar.extractall(destination, members=members)
+        return
+
+    condition = threading.Condition()
+    pending = [0]
+    directories = []
+    links = []
+    created_directories = {destination}
+    set_owner = hasattr(os, "geteuid") and os.geteuid() == 0
+
+    def set_attributes(tar, member, path):
+        if set_owner:
+            tar.chown(member, path, False)
+        tar.chmod(member, path)
+        tar.utime(member, path)
+
+    def write_file(tar, member, path, data):
+        try:
+            with open(path, 'wb') as target_file:
+                target_file.write(data)
+            set_attributes(tar, member, path)
+        finally:
+            with condition:
+                pending[0] -= len(data)
+                condition.notify()
+
+    def check_member(member):
+        if member.name.startswith("/") or ".." in member.name.split("/"):
+            raise tarfile.ExtractError(f"Refusing to extract {member.name} outside of {destination}.")
+        member.mode &= 0o755
+
+    def make_parent_directory(path):
+        parent = os.path.dirname(path)
+        if parent not in created_directories:
+            os.makedirs(parent, exist_ok=True)
+            created_directories.add(parent)
+
+    os.makedirs(destination, exist_ok=True)
+    with (tarfile.open(fileobj=fileobj, mode="r|gz", bufsize=bufsize) as tar,
+          ThreadPoolExecutor(max_workers=workers) as executor):
+        futures = deque()
+        for member in strip_tar_members(tar, strip_components):
+            check_member(member)
+            path = os.path.join(destination, member.name)
+
+            if member.isdir():
+                os.makedirs(path, exist_ok=True)
+                created_directories.add(path)
+                directories.append((member, path))
+
+            elif member.isfile():
+                make_parent_directory(path)
+                if member.size > buffer_size // 4:
+                    with tar.extractfile(member) as source_file, open(path, 'wb') as target_file:
+                        shutil.copyfileobj(source_file, target_file, bufsize)
+                    set_attributes(tar, member, path)
+                    continue
+
+                with tar.extractfile(member) as source_file:
+                    data = source_file.read()
+                with condition:
+                    condition.wait_for(lambda: pending[0] == 0 or pending[0] + len(data) <= buffer_size)
+                    pending[0] += len(data)
+                futures.append(executor.submit(write_file, tar, member, path, data))
+
+                # Stop at the first write error instead of decompressing the rest of the archive
+                while futures and futures[0].done():
+                    futures.popleft().result()
+
+            elif member.issym() or member.islnk():
+                links.append((member, path))
+
+        for future in futures:
+            future.result()
+
+        for member, path in links:
+            if hasattr(tarfile, "tar_filter"):
+                tarfile.tar_filter(member, destination)
+            check_link(member)
+            make_parent_directory(path)
+            if os.path.lexists(path):
+                os.remove(path)
+            if member.issym():
+                os.symlink(member.linkname, path)
+                if set_owner:
+                    tar.chown(member, path, False)
+            else:
+                # A hard link shares the permissions and owner already set on its target
+                target_path = os.path.realpath(os.path.join(destination, member.linkname))
+                if os.path.commonpath([target_path, os.path.realpath(destination)]) != os.path.realpath(destination):
+                    raise tarfile.ExtractError(f"Refusing to link {member.name} to {target_path}.")
+                os.link(target_path, path)
+
+        for member, path in reversed(directories):
+            set_attributes(tar, member, path)
+
+
+def download_and_extract(url, destination, workers=EXTRACT_WORKERS) -> str:
+    """
+    Download a .tar.gz archive and extract it on the fly, without writing the archive to disk.
+
+    The SHA-256 digest of the archive is computed from the bytes as they are read. Since it is only known once the
+    whole archive has been extracted, callers must extract into a staging directory and discard it if the digest
+    does not match.
+
+    Parameters:
+    - url (str): The URL of the archive.
+    - destination (str): The directory into which the archive is extracted, stripping its top-level folder.
+    - workers (int, optional): The number of threads writing extracted files (see `extract_tar_stream`).
+
+    Returns:
+    - str: The SHA-256 hex digest of the archive.
+
+    Raises:
+    - requests.exceptions.RequestException: If the request fails or returns a non-200 status code.
+    - tarfile.TarError: If the archive is truncated or corrupt.
+    """
+
+    with get_session().get(url, stream=True) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        reader = DigestReader(response.raw)
+        extract_tar_stream(reader, destination, workers=workers)
+        return reader.hexdigest()
+
+
+def get_mtime(path) -> int | None:
+    """
+    Return the modification time of `path` in nanoseconds, or None if it does not exist.
+    """
+
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def new_registry() -> dict:
+    """
+    Return an empty registry for the current JETBRAINS_INSTALL_PATH.
+    """
+
+    return {"path": JETBRAINS_INSTALL_PATH, "mtime": get_mtime(JETBRAINS_INSTALL_PATH), "apps": {}, "versions": {}}
+
+
+def load_registry(registry_path=REGISTRY_PATH) -> dict:
+    """
+    Load the registry of managed installs.
+
+    The registry has the form:
+    {"path": <install path>, "mtime": <mtime of install path>,
+     "apps": {<app_key>: {"version": ..., "build": ..., "path": ..., "mtime": ..., "installed": ..., "url": ...,
+                          "artifact": <sha256 of the archive>}},
+     "versions": {<versioned directory>: {"installed": ..., "url": ..., "artifact": ...}}}
+
+    "versions" keeps where every versioned directory (see `versioned_path`) was installed from, so that an
+    application rolled back to a previous version is registered with the archive of that version.
+
+    Returns:
+    - dict: The registry, or an empty registry if the file does not exist or belongs to another install path.
+    """
+
+    registry = read_json_file(registry_path)
+    if not registry or registry.get("path") != JETBRAINS_INSTALL_PATH:
+        registry = new_registry()
+        registry["mtime"] = None
+    return registry
+
+
+def prune_registry_versions(registry):
+    """
+    Forget the versioned directories of the registry (see `load_registry`) that were deleted.
+    """
+
+    versions = registry.setdefault("versions", {})
+    for path in list(versions):
+        if not os.path.isdir(path):
+            del versions[path]
+
+
+def save_registry(registry, registry_path=REGISTRY_PATH):
+    """
+    Write the registry of managed installs, logging instead of failing if it cannot be written.
+    """
+
+    try:
+        os.makedirs(os.path.dirname(registry_path), exist_ok=True)
+        write_json_file(registry_path, registry)
+    except OSError:
+        logging.debug(f'Could not write registry at {registry_path}.', exc_info=True)
+
+
+def registry_is_current(registry) -> bool:
+    """
+    Check that no application folder was added, removed or replaced since the registry was written.
+    """
+
+    if registry["mtime"] is None or registry["mtime"] != get_mtime(JETBRAINS_INSTALL_PATH):
+        return False
+    return all(entry["mtime"] == get_mtime(entry["path"]) for entry in registry["apps"].values())
+
+
+def load_manifest(manifest_path) -> dict:
+    """
+    Read a manifest describing the desired state of the installed applications.
+
+    A manifest is a JSON file listing applications by their key in APP_LIST, either as a list of keys or as an object
+    mapping every key to its settings: an optional "version" pinning the application to that version instead of the
+    latest one, and an optional "state", "present" (the default) or "absent" for an application to remove. With
+    "exclusive" set to true, installed applications missing from the manifest are removed as well:
+
+        {"apps": {"pycharm-professional": {}, "goland": {"version": "2024.1.4"}, "clion": {"state": "absent"}},
+         "exclusive": false}
+
+    Returns:
+    - dict: The manifest, with every application mapped to its complete settings, in the form:
+            {"apps": {<app_key>: {"state": <state>, "version": <version or None>}, ...}, "exclusive": <bool>}
+
+    Raises:
+    - OSError: If the manifest cannot be read.
+    - ValueError: If the manifest is not valid JSON or refers to unknown applications or states.
+    """
+
+    with open(manifest_path, 'r') as manifest_file:
+        manifest = json.load(manifest_file)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("apps", {}), (dict, list)):
+        raise ValueError('The manifest must be an object with an "apps" list or object.')
+
+    apps = manifest.get("apps", {})
+    if isinstance(apps, list):
+        apps = {app: {} for app in apps}
+
+    desired_apps = {}
+    for app, settings in apps.items():
+        settings = settings or {}
+        if app not in APP_LIST:
+            raise ValueError(f'Unknown application "{app}".')
+        if not isinstance(settings, dict) or settings.get("state", "present") not in ("present", "absent"):
+            raise ValueError(f'Invalid settings for "{app}": {settings}.')
+        desired_apps[app] = {"state": settings.get("state", "present"),
+                             "version": str(settings["version"]) if settings.get("version") else None}
+
+    return {"apps": desired_apps, "exclusive": bool(manifest.get("exclusive", False))}
+
+
+def version_matches(installed_version, version) -> bool:
+    """
+    Check whether an installed version is the `version` pinned in a manifest, which may leave out trailing
+    components (e.g. "2024.1" matches "2024.1.4").
+    """
+
+    return installed_version == version or installed_version.startswith(version + ".")
+
+
+def registry_entry(install_path, previous_entry=None, url=None, artifact=None) -> dict | None:
+    """
+    Build the registry entry of the application installed at `install_path` from its product-info.json file.
+
+    The install time, download URL and artifact of `previous_entry` are kept unless the application was installed
+    again from the archive at `url`, whose SHA-256 digest is `artifact` (None if unknown).
+
+    Returns:
+    - dict or None: The registry entry, or None if the folder has no readable product-info.json file.
+    """
+
+    try:
+        with open(os.path.join(install_path, 'product-info.json'), 'r') as product_info_json:
+            data = json.load(product_info_json)
+        version = data['version']
+        build_number = data['buildNumber']
+    except (OSError, ValueError, KeyError):
+        return None
+
+    previous_entry = previous_entry or {}
+    return {
+        "version": version,
+        "build": build_number,
+        "path": install_path,
+        "mtime": get_mtime(install_path),
+        "installed": time.time() if url else previous_entry.get("installed"),
+        "url": url if url else previous_entry.get("url"),
+        "artifact": artifact if url else previous_entry.get("artifact"),
+    }
+
+
+def move_to_trash(path) -> str | None:
+    """
+    Atomically move a directory out of the way, into the trash folder (TRASH_FOLDER) of its parent directory.
+
+    Renaming is instant whatever the size of the directory, so the caller never waits for tens of thousands of files
+    to be deleted. The trash is emptied later by `empty_trash`. If the directory cannot be renamed into the trash,
+    for instance because the trash is on another filesystem, it is deleted in place.
+
+    Returns:
+    - str: The path of the directory in the trash, or None if it was deleted in place.
+    """
+
+    trash_path = os.path.join(os.path.dirname(path.rstrip('/')), TRASH_FOLDER)
+    trashed_path = os.path.join(trash_path, f"{os.path.basename(path.rstrip('/'))}-{time.time_ns()}")
+    try:
+        os.makedirs(trash_path, exist_ok=True)
+        os.rename(path, trashed_path)
+    except OSError:
+        logging.debug(f'Could not move {path} to the trash. Deleting it in place.', exc_info=True)
+        delete_tree(path)
+        return None
+    return trashed_path
+
+
+def delete_tree(path, workers=REMOVE_WORKERS):
+    """
+    Delete a directory tree, processing the directories of each level of the tree concurrently.
+
+    Every directory is listed once with os.scandir, whose entries tell files from directories without an extra stat
+    call. Files and symbolic links are unlinked by the thread that lists their directory, and the emptied directories
+    are then removed from the deepest level up. Entries that disappear meanwhile, because another process is
+    emptying the same trash, are ignored.
+
+    Parameters:
+    - path (str): The directory to delete.
+    - workers (int, optional): The number of threads. Defaults to REMOVE_WORKERS.
+    """
+
+    def empty_directory(directory):
+        subdirectories = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    else:
+                        try:
+                            os.unlink(entry.path)
+                        except FileNotFoundError:
+                            pass
+        except FileNotFoundError:
+            pass
+        return subdirectories
+
+    def remove_directory(directory):
+        try:
+            os.rmdir(directory)
+        except FileNotFoundError:
+            pass
+
+    if not os.path.lexists(path):
+        return
+    if os.path.islink(path) or not os.path.isdir(path):
+        os.unlink(path)
+        return
+
+    levels = [[path]]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while levels[-1]:
+            levels.append([subdirectory for subdirectories in executor.map(empty_directory, levels[-1])
+                           for subdirectory in subdirectories])
+        for level in reversed(levels):
+            list(executor.map(remove_directory, level))
+
+
+def empty_trash(trash_path, workers=REMOVE_WORKERS) -> int:
+    """
+    Delete everything in a trash folder, including what earlier runs left behind. The folder itself is kept, so
+    that emptying it does not change the modification time of the install directory (see `registry_is_current`).
+
+    Returns:
+    - int: The number of entries deleted.
+    """
+
+    try:
+        trashed_paths = [entry.path for entry in os.scandir(trash_path)]
+    except FileNotFoundError:
+        return 0
+
+    for trashed_path in trashed_paths:
+        delete_tree(trashed_path, workers=workers)
+        logging.debug(f'Deleted {trashed_path} from the trash.')
+    return len(trashed_paths)
+
+
+def prefetched_path(version_path) -> str:
+    """
+    Return the directory holding a build prefetched in the background until it is installed into `version_path`.
+    """
+
+    return os.path.join(os.path.dirname(version_path), "." + os.path.basename(version_path) + PREFETCH_SUFFIX)
+
+
+class InstallLock:
+    """
+    An exclusive lock on the staging of an application, shared between processes through the lock file
+    `<folder>.lock` in `locks_path`, so that an update never stages a build the background prefetch is still working
+    on. The lock is released when the lock file is closed, even if the process dies. Lock files are kept, since a
+    process waiting for the lock may already have opened the file.
+    """
+
+    def __init__(self, install_path, locks_path=INSTALL_LOCKS_PATH):
+        self.path = os.path.join(locks_path, os.path.basename(install_path.rstrip('/')) + ".lock")
+        self.fd = None
+
+    def acquire(self, blocking=True) -> bool:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.release()
+            return False
+        return True
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def lower_priority():
+    """
+    Lower the CPU and disk priority of the current process, so that its work does not slow down the system.
+    """
+
+    os.nice(10)
+    try:
+        subprocess.call(["ionice", "-c", "3", "-p", str(os.getpid())], stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL)
+    except OSError:
+        logging.debug('Could not lower the disk priority.', exc_info=True)
+
+
+def versioned_path(install_path, build) -> str:
+    """
+    Return the directory holding the given build of the application whose current version is at `install_path`.
+    """
+
+    return f"{install_path.rstrip('/')}-{build}"
+
+
+def build_key(build) -> tuple:
+    """
+    Return a key ordering build numbers (e.g. "241.14494.240" or "AI-241.18034.62") numerically.
+    """
+
+    return tuple(int(number) for number in re.findall(r"\d+", build))
+
+
+def switch_version(install_path, version_path):
+    """
+    Atomically point the symbolic link `install_path` to the versioned directory `version_path`.
+    """
+
+    link_path = install_path.rstrip('/')
+    temporary_link = link_path + ".link"
+    if os.path.lexists(temporary_link):
+        os.remove(temporary_link)
+    os.symlink(os.path.basename(version_path), temporary_link)
+    os.replace(temporary_link, link_path)
+
+
+def activate_version(install_path, staging_path, version_path) -> tuple[str | None, list]:
+    """
+    Move a staged application into its versioned directory and atomically make it the current version.
+
+    `install_path` is a symbolic link to the versioned directory of the current version, which the desktop entry
+    and the /usr/local/bin symlink point through. Switching versions replaces that link in a single rename, so the
+    application is never missing. An install path that is still a plain directory (from older versions of this
+    tool) is first renamed to its own versioned directory.
+
+    Parameters:
+    - install_path (str): The path through which the application is used.
+    - staging_path (str): The directory into which the new version was extracted.
+    - version_path (str): The versioned directory of the new version (see `versioned_path`).
+
+    Returns:
+    - tuple: The directory of the version that was current until now, or None, and the directories of replaced
+             copies of the new version, which are no longer in use.
+    """
+
+    obsolete_paths = []
+    previous_path = None
+
+    if os.path.lexists(version_path):
+        obsolete_path = version_path + ".old"
+        if os.path.lexists(obsolete_path):
+            move_to_trash(obsolete_path)
+        os.rename(version_path, obsolete_path)
+        obsolete_paths.append(obsolete_path)
+    os.rename(staging_path, version_path)
+
+    link_path = install_path.rstrip('/')
+    if os.path.islink(link_path):
+        current_path = os.path.realpath(link_path)
+        switch_version(link_path, version_path)
+        if os.path.exists(current_path) and current_path != os.path.realpath(version_path):
+            previous_path = current_path
+    elif os.path.isdir(link_path):
+        entry = registry_entry(link_path)
+        previous_path = versioned_path(link_path, entry["build"] if entry else "previous")
+        if os.path.lexists(previous_path):
+            previous_path += ".old"
+        os.rename(link_path, previous_path)
+        os.symlink(os.path.basename(version_path), link_path)
+    else:
+        os.symlink(os.path.basename(version_path), link_path)
+
+    return previous_path, obsolete_paths
+
+
+def retained_versions(install_path) -> list:
+    """
+    Return the previous versions of the application whose current version is at `install_path`, which are kept to
+    roll back to.
+
+    Previous versions are the versioned directories (see `versioned_path`) next to the install path, other than the
+    current one, whose product-info.json file matches their name. The modification time of a directory is set when
+    its version stops being the current one, so the most recently used versions come first.
+
+    Returns:
+    - list: The build number and directory of every previous version, as (build, path) tuples.
+    """
+
+    link_path = install_path.rstrip('/')
+    prefix = os.path.basename(link_path) + "-"
+    current_path = os.path.realpath(link_path)
+    versions = []
+    try:
+        with os.scandir(os.path.dirname(link_path)) as entries:
+            for entry in entries:
+                if (not entry.name.startswith(prefix) or entry.path == current_path
+                        or not entry.is_dir(follow_symlinks=False)):
+                    continue
+                version_entry = registry_entry(entry.path)
+                if version_entry and entry.name == prefix + version_entry["build"]:
+                    versions.append((version_entry["build"], entry.path, version_entry["mtime"]))
+    except FileNotFoundError:
+        return []
+
+    versions.sort(key=lambda version: version[2], reverse=True)
+    return [(build, path) for build, path, _ in versions]
+
 
-with open(os.path.join(SCRIPT_DIRECTORY, 'apps_data.json'), 'r') as json_file:
-    APP_LIST = json.load(json_file)
+def hash_file(path, chunk_size=DOWNLOAD_CHUNK_SIZE) -> str:
+    """
+    Return the SHA-256 hex digest of a file, read in chunks of `chunk_size` bytes.
+    """
 
-OPERATION_FLAGS = {
-    "install": [
-        "-i",
-        "--install",
-        "Install mode. Use this flag to install applications.",
-        "store_true",
-    ],
-    "update": [
-        "-u",
-        "--update",
-        "Update mode. Use this flag to update applications.",
-        "store_true",
-    ],
-    "remove": [
-        "-r",
-        "--remove",
-        "Removal mode. Use this flag to remove applications.",
-        "store_true",
-    ],
-    "help": [
-        "-h",
-        "--help",
-        "Displays helpful information.",
-        "store_true",
-    ],
-    "list": [
-        "-l",
-        "--list",
-        "List installed applications.",
-        "store_true",
-    ],
-    "updatedir": [
-        "-n",
-        "--updatedir",
-        "Update the installation path.",
-        "store_true",
-    ],
-}
+    digest = hashlib.sha256()
+    view = memoryview(bytearray(chunk_size))
+    with open(path, 'rb', buffering=0) as f:
+        while read := f.readinto(view):
+            digest.update(view[:read])
+    return digest.hexdigest()
 
-CONFIGURATION_FLAGS = {
-    "directory": [
-        "-d",
-        "--directory",
-        "Set the directory for JetBrains' applications.",
-        "store_true",
-    ],
-    "only_update_data": [
-        "-z",
-        "--only-update-data",
-        "Update application menu and symlinks only.",
-        "store_true",
-    ],
-    "update_mimetypes": [
-        "-m",
-        "--update-mimetypes",
-        "Update mimetypes.",
-        "store_true",
-    ],
-    "no_confirm": [
-        "-y",
-        "--no-confirm",
-        "Do not ask for confirmation.",
-        "store_true",
-    ],
-    "verbose": [
-        "-v",
-        "--verbose",
-        "Verbose mode.",
-        "store_true",
-    ],
-}
 
+def scan_files(root):
+    """
+    Yield the path and stat result of every regular file below `root`, without following symbolic links.
+    """
+
+    directories = [root]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path, entry.stat(follow_symlinks=False)
 
-def check_redirect(url, max_redirects=5) -> int | None:
+
+def deduplicate_files(roots, index_path=DEDUP_INDEX_PATH, min_size=DEDUP_MIN_SIZE,
+                      prune_index=True) -> tuple[int, int]:
     """
-    Check the final status code of a URL after potentially following a series of redirects.
+    Replace identical files found below `roots` with hard links to a single copy.
 
-    The function uses the HTTP HEAD method to iteratively follow redirects up to a maximum
-    specified by `max_redirects`. If the maximum number of redirects is reached without arriving
-    at a non-redirect status code, the function returns `None`.
+    Files are grouped by size first, and only files sharing their size with another file are hashed. Digests are
+    kept in an index at `index_path`, keyed by path and validated by size, modification time and inode, so running
+    again after an update only hashes new or changed files. Files are only linked together if they live on the same
+    filesystem and have the same permissions and owner, since hard links share their metadata. Each file is replaced
+    atomically by renaming a new link over it. The modification times of the roots themselves are kept, since they
+    order the previous versions of an application (see `retained_versions`).
 
     Parameters:
-    - url (str): The initial URL to check.
-    - max_redirects (int, optional): The maximum number of redirects to follow. Defaults to 5.
+    - roots (list): The directories to deduplicate, typically the versioned directories of the installed apps.
+    - index_path (str, optional): The path of the digest index. Defaults to DEDUP_INDEX_PATH.
+    - min_size (int, optional): Files smaller than this number of bytes are ignored. Defaults to DEDUP_MIN_SIZE.
+    - prune_index (bool, optional): If set to False, the digests of files outside `roots` are kept in the index,
+                                    for runs covering only some of the installed apps. Defaults to True.
 
     Returns:
-    - int or None: The HTTP status code of the final destination after following redirects. If the
-      maximum number of redirects is exceeded, returns `None`.
+    - tuple: The number of files replaced by a hard link and the number of bytes reclaimed.
+    """
 
-    Notes:
-    - Only 301 and 302 status codes are treated as redirects.
+    index = read_json_file(index_path) or {}
+    new_index = {} if prune_index else {path: value for path, value in index.items()
+                                        if not any(path.startswith(os.path.join(root, "")) for root in roots)}
+    files_by_size = {}
+
+    root_mtimes = {root: get_mtime(root) for root in roots}
+    for root in roots:
+        for path, stat in scan_files(root):
+            if stat.st_size >= min_size:
+                files_by_size.setdefault(stat.st_size, []).append((path, stat))
+
+    files_by_key = {}
+    for size, files in files_by_size.items():
+        if len(files) < 2:
+            continue
+        for path, stat in files:
+            cached = index.get(path)
+            if cached and cached[:3] == [stat.st_size, stat.st_mtime_ns, stat.st_ino]:
+                digest = cached[3]
+            else:
+                digest = hash_file(path)
+            new_index[path] = [stat.st_size, stat.st_mtime_ns, stat.st_ino, digest]
+            key = (digest, stat.st_dev, stat.st_mode, stat.st_uid, stat.st_gid)
+            files_by_key.setdefault(key, []).append((path, stat))
+
+    linked_files = 0
+    reclaimed_bytes = 0
+    for files in files_by_key.values():
+        if len(files) < 2:
+            continue
+
+        # Keep the copy that already has the most links
+        files.sort(key=lambda file: -file[1].st_nlink)
+        source_path, source_stat = files[0]
+        # Links left to each replaced copy, whose space is only freed once the last one is replaced
+        remaining_links = {}
+
+        for path, stat in files[1:]:
+            if stat.st_ino == source_stat.st_ino:
+                continue
+            temporary_path = path + ".dedup"
+            try:
+                os.link(source_path, temporary_path)
+                os.replace(temporary_path, path)
+            except OSError:
+                logging.debug(f'Could not hardlink {path} to {source_path}.', exc_info=True)
+                if os.path.lexists(temporary_path):
+                    os.remove(temporary_path)
+                continue
+
+            linked_files += 1
+            remaining_links[stat.st_ino] = remaining_links.get(stat.st_ino, stat.st_nlink) - 1
+            if remaining_links[stat.st_ino] == 0:
+                reclaimed_bytes += stat.st_size
+            new_index[path] = new_index[source_path][:2] + [source_stat.st_ino] + new_index[source_path][3:]
+
+    for root, mtime in root_mtimes.items():
+        if mtime is not None and get_mtime(root) != mtime:
+            os.utime(root, ns=(mtime, mtime))
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    write_json_file(index_path, new_index)
+    return linked_files, reclaimed_bytes
+
+
+def last_used(app, config_path=USER_CONFIG_PATH) -> int:
+    """
+    Return when an application was last used, as the latest modification time in nanoseconds of its settings
+    directories (e.g. ~/.config/JetBrains/GoLand2024.1 and its options folder, which the IDE writes to while it
+    runs), or 0 if the user never ran it. The directories are found from the "config_folder" entry of APP_LIST.
+    """
+
+    parent_path, prefix = os.path.split(os.path.join(config_path, APP_LIST[app]["config_folder"]))
+    latest = 0
+    try:
+        with os.scandir(parent_path) as entries:
+            for entry in entries:
+                if re.fullmatch(re.escape(prefix) + r"\d{4}\.\d+", entry.name) and entry.is_dir():
+                    for path in (entry.path, os.path.join(entry.path, "options")):
+                        latest = max(latest, get_mtime(path) or 0)
+    except OSError:
+        pass
+    return latest
+
+
+def run_pipeline(items, stages, on_failure=None) -> dict:
+    """
+    Run every item through a sequence of stages, each stage running on its own pool of threads, so that different
+    items are in different stages at the same time, e.g. one application downloading while another is extracted.
+
+    Items enter the first stage in the given order, and every stage serves the items in the order they reach it, so
+    a later item never overtakes an earlier one waiting for the same stage. A stage returning False drops the item,
+    and so does an exception, which is logged. A dropped item goes through no further stage, but the other items
+    are not affected.
+
+    Parameters:
+    - items (list): The items, in order of priority.
+    - stages (list): The stages, as (name, function, workers) tuples. Every function is called with an item.
+    - on_failure (callable, optional): Called with every dropped item, e.g. to clean up what its stages left behind.
+
+    Returns:
+    - dict: Whether every item went through all stages.
     """
 
-    for _ in range(max_redirects):
-        response = requests.head(url, allow_redirects=False)
-        if response.status_code in (301, 302):
-            url = response.headers.get("Location")
+    results = {}
+    lock = threading.Lock()
+    finished = threading.Event()
+    executors = [ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"pipeline-{name}")
+                 for name, _, workers in stages]
+
+    def finish(item, succeeded):
+        if not succeeded and on_failure:
+            try:
+                on_failure(item)
+            except Exception:
+                logging.exception('Exception occurred')
+        with lock:
+            results[item] = succeeded
+            if len(results) == len(items):
+                finished.set()
+
+    def run_stage(index, item):
+        name, function, _ = stages[index]
+        try:
+            succeeded = function(item) is not False
+        except Exception:
+            logging.exception(f'Exception occurred in the {name} stage of {item}')
+            succeeded = False
+
+        if not succeeded or index == len(stages) - 1:
+            finish(item, succeeded)
         else:
-            return response.status_code
-    return None
+            executors[index + 1].submit(run_stage, index + 1, item)
+
+    try:
+        for item in items:
+            executors[0].submit(run_stage, 0, item)
+        if items:
+            finished.wait()
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+    return results
 
 
 class JetbrainsManagerTool:
     def __init__(self):
         # Set logging level
-        logging.basicConfig(level=logging.DEBUG, filename=os.path.join('/var/log/', 'jetbrains-manager-tool.log'))
+        try:
+            logging.basicConfig(level=logging.DEBUG, filename=LOG_FILE_PATH)
+        except PermissionError:
+            # Read-only operations may run without root permissions, and then do not write to the log file
+            logging.basicConfig(level=logging.DEBUG, handlers=[logging.NullHandler()])
 
         msg_initialize = "Initializing Jetbrains Updater."
         print("\n" + msg_initialize)
@@ -158,6 +2676,40 @@ class JetbrainsManagerTool:
         # Verbose mode
         self.verbose = True if args.verbose else False
 
+        # Download settings
+        self.chunk_size = args.chunk_size
+        self.connections = args.connections
+        self.stream_extract = args.stream_extract
+        self.extract_workers = args.extract_workers
+        self.artifact_cache = (ArtifactCache(max_size=args.artifact_cache_size * 1024 ** 2)
+                               if args.artifact_cache_size else None)
+        self.download_window = parse_time_window(args.download_window) if args.download_window else None
+        self.keep_versions = args.keep_versions
+        configure_bandwidth_limit(args.bandwidth_limit * 1024, lock_path=args.bandwidth_lock)
+
+        # Network settings
+        configure_session(connect_timeout=args.connect_timeout, read_timeout=args.read_timeout, retries=args.retries,
+                          pool_size=max(self.connections * (MIRROR_WORKERS if args.mirror_sync else 1),
+                                        ANDROID_STUDIO_PROBE_WORKERS))
+
+        # Feed settings
+        self.cache_ttl = args.cache_ttl
+        if os.geteuid() == 0:
+            self.feed_cache_path, self.catalog_path = FEED_CACHE_PATH, CATALOG_PATH
+        else:
+            # Checking for changes without root permissions (see `defers_root_permissions`)
+            self.feed_cache_path = USER_FEED_CACHE_PATH
+            self.catalog_path = os.path.join(USER_FEED_CACHE_PATH, os.path.basename(CATALOG_PATH))
+        self.version_index = None
+        self.feed_paths = {}
+
+        # Mirror settings
+        self.feed_url = args.feed_url
+        self.download_url = args.download_url
+
+        # Profiling settings
+        configure_profiler(profile_path=args.profile, metrics_path=args.metrics)
+
         # Check selected applications
         self.selected_apps = [
             app_key
@@ -165,46 +2717,117 @@ class JetbrainsManagerTool:
             if getattr(args, app_data["flag"][-1], False)
         ]
 
-        # Check installed applications
-        self.__check_installed_apps()
+        try:
+            # Check installed applications
+            with span("check_installed_apps"):
+                self.__check_installed_apps(list_installed_apps=args.list)
+
+            # Set operation (install, update, remove)
+            if args.install:
+                if not self.selected_apps:
+                    msg_no_app_selected = "No app selected. Stopping installer."
+                    print(msg_no_app_selected)
+                    logging.info(msg_no_app_selected)
+                    return
+                else:
+                    self.__install(only_update_data=args.only_update_data, update_mimetypes=args.update_mimetypes,
+                                   no_confirm=args.no_confirm)
+            elif args.update:
+                self.__install(update=True, only_update_data=args.only_update_data,
+                               update_mimetypes=args.update_mimetypes, no_confirm=args.no_confirm)
+            elif args.remove:
+                if not self.selected_apps:
+                    msg_no_app_selected = "No app selected. Stopping installer."
+                    print(msg_no_app_selected)
+                    logging.info(msg_no_app_selected)
+                    return
+                else:
+                    self.__remove(no_confirm=args.no_confirm)
 
-        # Fetch JetBrains XML file
-        self.__fetch_xml()
+            elif args.deduplicate:
+                self.__deduplicate()
 
-        # Set operation (install, update, remove)
-        if args.install:
-            if not self.selected_apps:
-                msg_no_app_selected = "No app selected. Stopping installer."
-                print(msg_no_app_selected)
-                logging.info(msg_no_app_selected)
-                return
-            else:
-                self.__install(only_update_data=args.only_update_data, update_mimetypes=args.update_mimetypes,
-                               no_confirm=args.no_confirm)
-        elif args.update:
-            self.__install(update=True, only_update_data=args.only_update_data, update_mimetypes=args.update_mimetypes,
-                           no_confirm=args.no_confirm)
-        elif args.remove:
-            if not self.selected_apps:
-                msg_no_app_selected = "No app selected. Stopping installer."
-                print(msg_no_app_selected)
-                logging.info(msg_no_app_selected)
+            elif args.cache:
+                self.__manage_cache(args.cache)
+
+            elif args.apply:
+                self.__apply(args.apply, only_update_data=args.only_update_data,
+                             update_mimetypes=args.update_mimetypes, no_confirm=args.no_confirm)
+
+            elif args.prefetch:
+                self.__prefetch(interval=args.prefetch_interval)
+
+            elif args.mirror_sync:
+                self.__mirror_sync(args.mirror_sync)
+
+            elif args.rollback:
+                if not self.selected_apps:
+                    msg_no_app_selected = "No app selected. Stopping installer."
+                    print(msg_no_app_selected)
+                    logging.info(msg_no_app_selected)
+                    return
+                else:
+                    self.__rollback(update_mimetypes=args.update_mimetypes, no_confirm=args.no_confirm)
+
+            # Delete removed and replaced applications
+            if not is_read_only_operation() and os.geteuid() == 0:
+                self.__empty_trash(background=args.background_remove)
+
+            print("\nOperation completed successfully.")
+        finally:
+            close_profiler()
+
+    def __empty_trash(self, background: bool = False):
+        """
+        Delete the applications moved to the trash folder of the install directory by this run or by earlier ones.
+
+        With `background`, the deletion runs in a new process of this script (started with EMPTY_TRASH_ARGUMENT) in its
+        own session, with a lower priority, so this run ends without waiting for it. Anything that process does not
+        finish is deleted by the next run.
+
+        Parameters:
+        - background (bool): If set to True, delete the trash in a background process. Default is False.
+        """
+
+        trash_path = os.path.join(JETBRAINS_INSTALL_PATH, TRASH_FOLDER)
+        try:
+            if not os.path.isdir(trash_path) or not os.listdir(trash_path):
                 return
-            else:
-                self.__remove(no_confirm=args.no_confirm)
+        except OSError:
+            logging.exception('Exception occurred')
+            return
 
-        elif args.list:
-            self.__check_installed_apps(list_installed_apps=True)
+        if background:
+            try:
+                subprocess.Popen([sys.executable, os.path.abspath(__file__), EMPTY_TRASH_ARGUMENT, trash_path],
+                                 stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                 start_new_session=True)
+                logging.debug(f'Emptying {trash_path} in the background.')
+                return
+            except OSError:
+                logging.exception('Exception occurred')
 
-        print("\nOperation completed successfully.")
+        msg_empty_trash = "Deleting removed files..."
+        if self.verbose:
+            print(msg_empty_trash)
+        logging.info(msg_empty_trash)
+        try:
+            with span("empty_trash"):
+                empty_trash(trash_path)
+        except Exception:
+            logging.exception('Exception occurred')
 
     def __check_installed_apps(self, list_installed_apps: bool = False):
         """
         Check and identify installed JetBrains applications along with their versions.
 
-        This method scans a predefined installation directory (specified by JETBRAINS_INSTALL_PATH) for any
-        JetBrains applications listed in the APP_LIST. For each detected application, it retrieves the version
-        and build number from the 'product-info.json' file located within the application's folder.
+        The installed applications are read from the registry file (REGISTRY_PATH), which records the version, build
+        number, path, install time and artifact of every managed install. The registry is trusted as long as the
+        modification times of JETBRAINS_INSTALL_PATH and of every registered application folder are unchanged, so
+        applications installed, removed or updated out of band are still detected. Otherwise, this method scans
+        JETBRAINS_INSTALL_PATH for any JetBrains applications listed in the APP_LIST, reading the version and build
+        number from the 'product-info.json' file of every application whose folder changed, and saves the registry.
+        Folders without a 'product-info.json' file are skipped.
 
         The information about installed applications is stored in the instance variable `self.installed_apps` in the
         form: {<app_key>: [<version>, <build_number>], ...}
@@ -215,18 +2838,30 @@ class JetbrainsManagerTool:
 
         Attributes updated:
         - self.installed_apps (dict): A dictionary mapping app keys to their respective versions and build numbers.
+        - self.registry (dict): The registry of managed installs (see `load_registry`).
         """
 
         # Check installed applications
-        self.installed_apps = {}
-        for key, value in APP_LIST.items():
-            install_path = os.path.join(JETBRAINS_INSTALL_PATH, value["folder"])
-            if os.path.exists(install_path):
-                with open(os.path.join(install_path, 'product-info.json'), 'r') as product_info_json:
-                    data = json.load(product_info_json)
-                    version = data['version']
-                    build_number = data['buildNumber']
-                self.installed_apps[key] = [version, build_number]
+        self.registry = load_registry()
+        if not registry_is_current(self.registry):
+            registered_apps = self.registry["apps"]
+            registered_versions = self.registry.get("versions", {})
+            self.registry = new_registry()
+            self.registry["versions"] = registered_versions
+            for key, value in APP_LIST.items():
+                install_path = os.path.join(JETBRAINS_INSTALL_PATH, value["folder"])
+                entry = registered_apps.get(key)
+                if entry and entry["path"] == install_path and entry["mtime"] == get_mtime(install_path):
+                    self.registry["apps"][key] = entry
+                elif os.path.exists(install_path):
+                    entry = registry_entry(install_path, entry)
+                    if entry:
+                        self.registry["apps"][key] = entry
+                    else:
+                        logging.warning(f'No product-info.json found in {install_path}. Skipping.')
+            save_registry(self.registry)
+
+        self.installed_apps = {key: [entry["version"], entry["build"]] for key, entry in self.registry["apps"].items()}
 
         # Print result
         if self.installed_apps:
@@ -243,60 +2878,213 @@ class JetbrainsManagerTool:
 
         logging.info(msg_installed_apps)
 
+    def __register_app(self, app: str, url: str | None = None, artifact: str | None = None,
+                       switched: bool = False):
+        """
+        Record a freshly installed or updated application in the registry.
+
+        Parameters:
+        - app (str): The key of the application.
+        - url (str, optional): The URL of the archive the application was installed from.
+        - artifact (str, optional): The SHA-256 digest of that archive.
+        - switched (bool, optional): If set to True, the application was switched to a version installed earlier,
+                                     whose install time, URL and artifact are taken from the registry of versions
+                                     instead of the previous entry. Default is False.
+
+        Attributes updated:
+        - self.installed_apps (dict): The version and build number of the application.
+        - self.registry (dict): The registry entry of the application.
+        """
+
+        install_path = os.path.join(JETBRAINS_INSTALL_PATH, APP_LIST[app]["folder"])
+        versions = self.registry.setdefault("versions", {})
+        version_path = os.path.realpath(install_path)
+        previous_entry = versions.get(version_path, {}) if switched else self.registry["apps"].get(app)
+        entry = registry_entry(install_path, previous_entry, url=url, artifact=artifact)
+        if entry:
+            self.registry["apps"][app] = entry
+            self.installed_apps[app] = [entry["version"], entry["build"]]
+            versions[version_path] = {key: entry[key] for key in ("installed", "url", "artifact")}
+        prune_registry_versions(self.registry)
+        self.registry["mtime"] = get_mtime(JETBRAINS_INSTALL_PATH)
+        save_registry(self.registry)
+
+    def __unregister_app(self, app: str):
+        """
+        Remove a deleted application from the registry.
+
+        Parameters:
+        - app (str): The key of the application.
+        """
+
+        self.registry["apps"].pop(app, None)
+        self.installed_apps.pop(app, None)
+        prune_registry_versions(self.registry)
+        self.registry["mtime"] = get_mtime(JETBRAINS_INSTALL_PATH)
+        save_registry(self.registry)
+
+    def __deduplicate(self):
+        """
+        Hardlink identical files across all installed applications and report the disk space reclaimed.
+
+        Attributes accessed:
+        - self.registry (dict): The registry of managed installs, giving the directory of every installed app.
+        """
+
+        roots = [root for entry in self.registry["apps"].values()
+                 for root in [os.path.realpath(entry["path"])] + [path for _, path in retained_versions(entry["path"])]]
+        if not roots:
+            msg_no_apps = "No app installed in the designated install folder."
+            print(msg_no_apps)
+            logging.info(msg_no_apps)
+            return
+
+        msg_deduplicating = "Deduplicating files of {} installed apps...".format(len(roots))
+        print(msg_deduplicating)
+        logging.info(msg_deduplicating)
+
+        try:
+            linked_files, reclaimed_bytes = deduplicate_files(roots)
+            msg_deduplicated = "Linked {} identical files, reclaiming {:.1f} MiB.".format(
+                linked_files, reclaimed_bytes / 1024 ** 2)
+            print(msg_deduplicated)
+            logging.info(msg_deduplicated)
+
+        except Exception:
+            logging.exception('Exception occurred')
+
+        # Directory modification times changed, so refresh the registry
+        for app in self.registry["apps"]:
+            self.__register_app(app)
+
+    def __manage_cache(self, action: str):
+        """
+        List, prune, pin or unpin the archives stored in the downloaded archives cache.
+
+        Pruning removes every archive that is not pinned. Pruning, pinning and unpinning apply to the archives of
+        the selected applications, or to all archives if no application is selected.
+
+        Parameters:
+        - action (str): One of 'list', 'prune', 'pin' or 'unpin'.
+
+        Attributes accessed:
+        - self.artifact_cache (ArtifactCache): The downloaded archives cache.
+        - self.selected_apps (list): List of application keys the action applies to.
+        """
+
+        if not self.artifact_cache:
+            msg_cache_disabled = "The downloaded archives cache is disabled."
+            print(msg_cache_disabled)
+            logging.info(msg_cache_disabled)
+            return
+
+        if action == "list":
+            self.artifact_cache.load()
+            entries = {url: entry for url, entry in self.artifact_cache.entries.items()
+                       if not self.selected_apps or entry["app"] in self.selected_apps}
+            if not entries:
+                print("No archive in the cache.")
+            for url, entry in sorted(entries.items(), key=lambda item: (item[1]["app"], item[1]["version"])):
+                print("  - {} {} ({:.1f} MiB, last used {}){}".format(
+                    APP_LIST[entry["app"]]["help"] if entry["app"] in APP_LIST else entry["app"], entry["version"],
+                    entry["size"] / 1024 ** 2, time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"])),
+                    " [pinned]" if entry["pinned"] else ""))
+            print("Cache size: {:.1f} of {:.1f} MiB.".format(
+                sum(entry["size"] for entry in self.artifact_cache.entries.values()) / 1024 ** 2,
+                self.artifact_cache.max_size / 1024 ** 2))
+
+        elif action == "prune":
+            with self.artifact_cache.transaction():
+                freed = sum(self.artifact_cache.remove(url) for url, entry in list(self.artifact_cache.entries.items())
+                            if (not self.selected_apps or entry["app"] in self.selected_apps) and not entry["pinned"]
+                            and not self.artifact_cache.is_held(url))
+            msg_cache_pruned = "Removed {:.1f} MiB from the cache.".format(freed / 1024 ** 2)
+            print(msg_cache_pruned)
+            logging.info(msg_cache_pruned)
+
+        else:
+            with self.artifact_cache.transaction():
+                entries = [entry for entry in self.artifact_cache.entries.values()
+                           if not self.selected_apps or entry["app"] in self.selected_apps]
+                for entry in entries:
+                    entry["pinned"] = action == "pin"
+            msg_cache_pinned = "{} {} archives.".format("Pinned" if action == "pin" else "Unpinned", len(entries))
+            print(msg_cache_pinned)
+            logging.info(msg_cache_pinned)
+
     def __fetch_xml(self):
         """
-        Fetch XML files from JetBrains and Android Studio URLs and combine them.
+        Fetch XML files from JetBrains and Android Studio URLs and index the builds of the managed applications.
 
         This method performs the following tasks:
-        1. Fetches the XML file from the JetBrains URL.
-        2. Fetches the XML file from the Android Studio URL.
-        3. Appends the contents of the Android Studio XML into the JetBrains XML.
-        4. Stores the combined XML content into the instance variable `self.xml_file`.
+        1. Fetches the XML file from the JetBrains URL, through the feed cache (see `fetch_feed`).
+        2. Fetches the XML file from the Android Studio URL, through the feed cache.
+        3. Loads the compiled catalog snapshot if both feeds are unchanged since it was written (see `load_catalog`).
+        4. Otherwise, streams both files once through `index_feed`, keeping only the products and channels listed in
+           APP_LIST, and saves the result as the new snapshot.
+        5. Stores the combined index into the instance variable `self.version_index`.
 
         If any step fails (e.g., the request returns a non-200 status code or parsing issues occur),
         an exception is raised and the error message is printed to the console.
 
         Note:
         - The URLs JETBRAINS_XML_URL and ANDROID_STUDIO_XML_URL should be set correctly before calling this method.
-        - The combined XML content will be stored as a bytes string in the `self.xml_file` attribute.
+          They are fetched from the mirror at `self.feed_url` instead if one is set (see `mirror_url`).
 
         Attributes updated:
-        - self.xml_file (bytes): Combined XML content from both JetBrains and Android Studio.
+        - self.version_index (dict): The latest build attributes of each product and channel, in the form:
+                                     {(<product_name>, <channel_name>): {<attribute>: <value>, ...}, ...}
+        - self.feed_paths (dict): The path of the cached copy of each feed, by URL.
 
         Raises:
         - Various exceptions, including potential HTTP errors and XML parsing errors. Errors are printed to the console.
         """
 
+        products = {}
+        for app_data in APP_LIST.values():
+            products.setdefault(app_data["name"], set()).add(app_data["channel_name"])
+
+        jetbrains_url = mirror_url(JETBRAINS_XML_URL, self.feed_url)
+        android_studio_url = mirror_url(ANDROID_STUDIO_XML_URL, self.feed_url)
+
         try:
             # Fetch Jetbrains XML file
-            req_jetbrains = requests.get(JETBRAINS_XML_URL)
-            assert req_jetbrains.status_code == 200
-            jetbrains_xml = req_jetbrains.content
+            with span("fetch_feed", url=jetbrains_url):
+                jetbrains_xml, jetbrains_metadata = fetch_feed(jetbrains_url, cache_directory=self.feed_cache_path,
+                                                                  ttl=self.cache_ttl)
             msg_fetch_xml = "Successfully fetched Jetbrains XML file."
             if self.verbose:
                 print(msg_fetch_xml)
-            logging.debug('XML Status code: ' + str(req_jetbrains.status_code))
             logging.info(msg_fetch_xml)
 
             # Fetch Android Studio XML file
-            req_android_studio = requests.get(ANDROID_STUDIO_XML_URL)
-            assert req_android_studio.status_code == 200
-            android_studio_xml = req_android_studio.content
+            with span("fetch_feed", url=android_studio_url):
+                android_studio_xml, android_studio_metadata = fetch_feed(android_studio_url,
+                                                                              cache_directory=self.feed_cache_path,
+                                                                              ttl=self.cache_ttl)
             msg_fetch_xml_as = "Successfully fetched Android Studio XML file."
             if self.verbose:
                 print(msg_fetch_xml_as)
-            logging.debug('Android Studio XML Status code: ' + str(req_android_studio.status_code))
             logging.info(msg_fetch_xml_as)
 
-            # Append Android Studio XML to JetBrains XML
-            jetbrains_root = elementTree.fromstring(jetbrains_xml)
-            android_studio_root = elementTree.fromstring(android_studio_xml)
-            for child in android_studio_root:
-                jetbrains_root.append(child)
-
-            self.xml_file = elementTree.tostring(jetbrains_root, encoding="utf-8")
-
-            msg_xml_success = "Successfully fetched and combined JetBrains and Android Studio XML files."
+            # Load or rebuild the catalog snapshot
+            self.feed_paths = {jetbrains_url: jetbrains_xml, android_studio_url: android_studio_xml}
+            validators = {
+                jetbrains_url: feed_validator(jetbrains_metadata),
+                android_studio_url: feed_validator(android_studio_metadata),
+            }
+            with span("load_catalog") as catalog_span:
+                version_index = load_catalog(self.catalog_path, validators, products)
+                catalog_span.set(rebuilt=version_index is None)
+                if version_index is None:
+                    version_index = index_feed(jetbrains_xml, products)
+                    for key, build in index_feed(android_studio_xml, products).items():
+                        version_index.setdefault(key, build)
+                    save_catalog(self.catalog_path, validators, products, version_index)
+                    logging.debug(f'Rebuilt catalog snapshot at {self.catalog_path}.')
+            self.version_index = version_index
+
+            msg_xml_success = "Successfully fetched and indexed JetBrains and Android Studio XML files."
             if self.verbose:
                 print(msg_xml_success)
             logging.info(msg_xml_success)
@@ -308,10 +3096,11 @@ class JetbrainsManagerTool:
         """
         Fetch and store the current versions of specified applications from the XML content.
 
-        This method processes the XML content stored in `self.xml_file` to extract the version and build number
-        of each application specified in `list_of_apps`. The data is then stored in the `self.app_versions` dictionary.
+        This method looks up the version and build number of each application specified in `list_of_apps` in the
+        index built by `__fetch_xml`. The data is then stored in the `self.app_versions` dictionary.
+        The XML files are only fetched on the first call, so operations that do not need version data never touch
+        the network.
 
-        The method specifically looks for product entries in the XML and fetches the associated build details.
         For Android Studio, special handling is done to extract the version and build number correctly.
 
         Parameters:
@@ -327,17 +3116,17 @@ class JetbrainsManagerTool:
           a message will be printed to the console.
         """
 
-        root = elementTree.fromstring(self.xml_file)
+        if self.version_index is None:
+            with span("fetch_xml"):
+                self.__fetch_xml()
+
         self.app_versions = {}
 
         for app in list_of_apps:
-            version_query = "./product[@name='{}']/channel[@name='{}']/build".format(
-                APP_LIST[app]["name"], APP_LIST[app]["channel_name"]
-            )
-            version_elements = root.findall(version_query)
+            build = (self.version_index or {}).get((APP_LIST[app]["name"], APP_LIST[app]["channel_name"]))
 
-            if version_elements:
-                last_version = version_elements[0].get("version")
+            if build:
+                last_version = build.get("version")
 
                 if app == "android-studio":
                     pattern = r"\d{4}\.\d+\.\d+"
@@ -349,9 +3138,9 @@ class JetbrainsManagerTool:
                         print(msg_fetch_data_error)
                         logging.error(msg_fetch_data_error)
                         continue
-                    build_number = version_elements[0].get("number")[3:]
+                    build_number = build.get("number")[3:]
                 else:
-                    build_number = version_elements[0].get("fullNumber")
+                    build_number = build.get("fullNumber")
 
                 self.app_versions[app] = [last_version, build_number]
 
@@ -405,18 +3194,198 @@ class JetbrainsManagerTool:
             return False
         return True
 
+    def __prefetch(self, interval: int = PREFETCH_INTERVAL):
+        """
+        Prepare the updates of the installed applications in the background, with a low CPU and disk priority.
+
+        Every new build is downloaded, verified and extracted exactly as `__install` would (see `__stage_app`), but
+        into a prefetch directory next to the current version (see `prefetched_path`) instead of being switched to.
+        A later update then only has to move the prefetched build in place, set up its desktop entry and symlink,
+        and switch to it. Prefetched builds superseded by a newer one or by an update are deleted.
+
+        Parameters:
+        - interval (int): The number of seconds between two checks for updates, running until interrupted, or 0 to
+                          check only once (e.g. from a systemd timer or cron). Default is PREFETCH_INTERVAL.
+        """
+
+        lower_priority()
+
+        while True:
+            try:
+                with span("prefetch"):
+                    self.__prefetch_updates()
+            except Exception:
+                logging.exception('Exception occurred')
+
+            self.__empty_trash()
+            if not interval:
+                return
+            time.sleep(interval)
+
+            # Start over from the current state
+            self.version_index = None
+            self.__check_installed_apps()
+
+    def __prefetch_updates(self):
+        """
+        Prefetch the latest build of every outdated installed application, once (see `__prefetch`).
+        """
+
+        with span("get_current_versions", apps=len(self.installed_apps)):
+            self.__get_current_versions(list(self.installed_apps.keys()))
+
+        for installed_app, version_data in self.installed_apps.items():
+            install_path = os.path.join(JETBRAINS_INSTALL_PATH, APP_LIST[installed_app]["folder"])
+            latest_build = self.app_versions.get(installed_app, version_data)[1]
+            current_path = prefetched_path(versioned_path(install_path, latest_build))
+
+            install_lock = InstallLock(install_path)
+            if not install_lock.acquire(blocking=False):
+                logging.info(f'{APP_LIST[installed_app]["name"]} is being updated. Skipping prefetch.')
+                continue
+            try:
+                # Delete builds prefetched before a newer one was released or the application was updated
+                stale_pattern = re.compile(re.escape("." + os.path.basename(install_path) + "-") + r"[^-/]+"
+                                           + re.escape(PREFETCH_SUFFIX) + r"(\.staging)?")
+                for entry in os.scandir(JETBRAINS_INSTALL_PATH):
+                    if stale_pattern.fullmatch(entry.name) and (entry.path != current_path
+                                                                or latest_build == version_data[1]):
+                        move_to_trash(entry.path)
+                        logging.debug(f'Deleted stale prefetched build: {entry.path}')
+
+                if latest_build == version_data[1] or os.path.isdir(current_path):
+                    continue
+
+                msg_prefetch = f"Prefetching {APP_LIST[installed_app]['name']} {self.app_versions[installed_app][0]}..."
+                print(msg_prefetch)
+                logging.info(msg_prefetch)
+
+                with span("prefetch.resolve_link", app=installed_app):
+                    download_link = self.__download_link(installed_app)
+                if not download_link:
+                    continue
+
+                staging_path = current_path + ".staging"
+                staged, download_path = self.__stage_app(installed_app, download_link, staging_path,
+                                                         phase="prefetch")
+                if not staged:
+                    continue
+                os.rename(staging_path, current_path)
+                if download_path:
+                    remove_download(download_path)
+
+                msg_prefetched = (f"Prefetched {APP_LIST[installed_app]['name']} "
+                                  f"{self.app_versions[installed_app][0]}. Run an update to install it.")
+                print(msg_prefetched)
+                logging.info(msg_prefetched)
+            finally:
+                install_lock.release()
+
+    def __apply(self, manifest_path: str, only_update_data: bool = False, update_mimetypes: bool = False,
+                no_confirm: bool = False):
+        """
+        Install, update and remove applications so that they match a manifest (see `load_manifest`).
+
+        The installed applications, read from the registry by `__check_installed_apps`, are compared with the
+        manifest, and only the applications that differ are installed, updated or removed. Applications pinned to a
+        version are compared with the manifest alone. The update feeds are only read if some application tracks the
+        latest version, and then through the feed cache, so while the feeds are fresh (see `--cache-ttl`), a run
+        with nothing to change makes no request and reads no application folder.
+
+        Parameters:
+        - manifest_path (str): The path of the manifest file.
+        - only_update_data (bool): Passed on to `__install`. Default is False.
+        - update_mimetypes (bool): Passed on to `__install`. Default is False.
+        - no_confirm (bool): If set to True, the changes are made without asking for confirmation. Default is False.
+        """
+
+        try:
+            manifest = load_manifest(manifest_path)
+        except (OSError, ValueError) as error:
+            msg_invalid_manifest = f'Error. Could not read the manifest \"{manifest_path}\": {error}'
+            print(msg_invalid_manifest)
+            logging.error(msg_invalid_manifest)
+            return
+
+        desired_apps = {app: settings for app, settings in manifest["apps"].items() if settings["state"] == "present"}
+        removed_apps = [app for app in self.installed_apps
+                        if (app not in manifest["apps"] and manifest["exclusive"])
+                        or manifest["apps"].get(app, {}).get("state") == "absent"]
+
+        # Latest versions
+        latest_apps = [app for app, settings in desired_apps.items() if not settings["version"]]
+        self.app_versions = {}
+        if latest_apps:
+            with span("get_current_versions", apps=len(latest_apps)):
+                self.__get_current_versions(latest_apps)
+
+        installed_apps = {}
+        updated_apps = {}
+        for app, settings in desired_apps.items():
+            if settings["version"]:
+                if app in self.installed_apps and version_matches(self.installed_apps[app][0], settings["version"]):
+                    continue
+                # The build number is only known once extracted (see `__install`)
+                target_version = [settings["version"], settings["version"]]
+            else:
+                target_version = self.app_versions.get(app)
+                if not target_version or (app in self.installed_apps
+                                          and self.installed_apps[app][1] == target_version[1]):
+                    continue
+            if app in self.installed_apps:
+                updated_apps[app] = target_version
+            else:
+                installed_apps[app] = target_version
+
+        if not installed_apps and not updated_apps and not removed_apps:
+            msg_no_change = "Installed applications already match the manifest."
+            print(msg_no_change)
+            logging.info(msg_no_change)
+            return
+
+        # The manifest was compared without root permissions, which the changes need. Run again through sudo, it is
+        # compared with freshly revalidated feeds.
+        request_root_permissions(["--cache-ttl", "0"])
+
+        msg_changes = "Changes to match the manifest:" + "".join(
+            [f"\n  - install {APP_LIST[app]['help']} {version[0]}" for app, version in installed_apps.items()]
+            + [f"\n  - update {APP_LIST[app]['help']} to {version[0]}" for app, version in updated_apps.items()]
+            + [f"\n  - remove {APP_LIST[app]['help']}" for app in removed_apps])
+        print(msg_changes)
+        logging.info(msg_changes)
+
+        # Confirmation
+        if not no_confirm:
+            if not self.__confirmation_prompt("apply the manifest to",
+                                              [*installed_apps, *updated_apps, *removed_apps]):
+                return
+
+        if installed_apps:
+            self.__install(only_update_data=only_update_data, update_mimetypes=update_mimetypes, no_confirm=True,
+                           versions=installed_apps)
+        if updated_apps:
+            self.__install(update=True, only_update_data=only_update_data, update_mimetypes=update_mimetypes,
+                           no_confirm=True, versions=updated_apps)
+        if removed_apps:
+            self.selected_apps = removed_apps
+            self.__remove(no_confirm=True)
+
     def __install(self,
                   update: bool = False,
                   only_update_data: bool = False,
                   update_mimetypes: bool = False,
-                  no_confirm: bool = False
+                  no_confirm: bool = False,
+                  versions: dict | None = None
                   ):
         """
         Install or update the selected applications.
 
         The method checks whether an application is outdated or not installed, and based on the specified flags,
         it installs or updates the application accordingly. The application is downloaded from a specified link,
-        extracted, and then the desktop entry, symlink, and execution permissions are set up.
+        extracted into a staging directory and switched to atomically (see `activate_version`), so an update that
+        fails leaves the current version untouched. The replaced version is kept to roll back to (see `__rollback`),
+        up to `self.keep_versions` previous versions. The desktop entry, symlink, and execution permissions are then
+        set up.
 
         Parameters:
         - update (bool): If set to True, the method will attempt to update the specified applications. Default is False.
@@ -425,6 +3394,9 @@ class JetbrainsManagerTool:
         - update_mimetypes (bool): If set to True, the method will update the MIME types for the specified applications
                                    in their desktop entry. Default is False.
         - no_confirm (bool): If set to True, the method will not prompt the user for confirmation. Default is False.
+        - versions (dict): The applications to install or update and their versions, in the same form as
+                           `self.app_versions`, instead of the selected or outdated ones at their latest versions.
+                           Default is None.
 
         Attributes accessed:
         - self.selected_apps (list): List of application keys selected for installation or update.
@@ -440,9 +3412,14 @@ class JetbrainsManagerTool:
         """
 
         # Check outdated applications
-        if update:
+        if versions is not None:
+            self.app_versions = versions
+            install_process_apps = list(versions)
+
+        elif update:
             outdated_apps = []
-            self.__get_current_versions(list(self.installed_apps.keys()))
+            with span("get_current_versions", apps=len(self.installed_apps)):
+                self.__get_current_versions(list(self.installed_apps.keys()))
 
             for installed_app, version_data in self.installed_apps.items():
                 if version_data[1] != self.app_versions[installed_app][1]:
@@ -458,23 +3435,31 @@ class JetbrainsManagerTool:
             install_process_apps = outdated_apps
 
         else:
-            self.__get_current_versions(list(self.selected_apps))
+            with span("get_current_versions", apps=len(self.selected_apps)):
+                self.__get_current_versions(list(self.selected_apps))
             install_process_apps = self.selected_apps
 
+        # Updates are checked without root permissions, which the changes need (see `defers_root_permissions`). Run
+        # again through sudo, only the applications found here are updated, from freshly revalidated feeds.
+        request_root_permissions([APP_LIST[app]["flag"] for app in install_process_apps] + ["--cache-ttl", "0"])
+
         # Confirmation
         if not no_confirm:
             if not self.__confirmation_prompt("update" if update else "install", install_process_apps):
                 return
 
-        # Install process
-        for selected_app in install_process_apps:
+        # Install process, as a pipeline running the stages of different applications at the same time
+        jobs = {selected_app: {"download_path": None} for selected_app in install_process_apps}
+
+        def resolve(selected_app):
+            job = jobs[selected_app]
             msg_install_process = "\n{} {}...".format("Updating" if update else "Installing",
                                                       APP_LIST[selected_app]["name"])
             print(msg_install_process)
             logging.info(msg_install_process)
 
             # Define install path
-            install_path = os.path.join(
+            job["install_path"] = install_path = os.path.join(
                 JETBRAINS_INSTALL_PATH, APP_LIST[selected_app]["folder"]
             )
 
@@ -483,99 +3468,220 @@ class JetbrainsManagerTool:
                 msg_app_already_installed = (f"{APP_LIST[selected_app]['name']} is already installed. Skipping "
                                              f"installation.")
                 print(msg_app_already_installed)
-                logging.warning(msg_app_already_installed)
-                continue
-            elif os.path.exists(install_path) and update and not only_update_data:
-                shutil.rmtree(install_path)
-                logging.info(f'Removed directory before {"update" if update else "install"}: {install_path}')
-
-            # Download latest version
-            if not only_update_data:
-                if selected_app == "android-studio":
-                    valid_link_found = False
-                    for suffix in reversed(range(1, 30)):
-                        last_version_try = self.app_versions['android-studio'][0] + "." + str(suffix)
-                        temp_link = APP_LIST[selected_app]["download-link"].replace(
-                            "<VERSION>", last_version_try
-                        )
-                        final_status = check_redirect(temp_link)
-
-                        if final_status == 200:
-                            download_link = temp_link
-                            valid_link_found = True
-                            break
-
-                    if not valid_link_found:
-                        msg_no_valid_link_as = ("Error. Could not find a valid download link for Android Studio. "
-                                                "Aborting installation.")
-                        print(msg_no_valid_link_as)
-                        logging.error(msg_no_valid_link_as)
-                        continue
+                logging.warning(msg_app_already_installed)
+                return False
 
-                else:
-                    download_link = APP_LIST[selected_app]["download-link"].replace(
-                        "<VERSION>", self.app_versions[selected_app][0]
-                    )
+            if only_update_data:
+                return True
+
+            with span("install.resolve_link", app=selected_app):
+                job["download_link"] = download_link = self.__download_link(selected_app)
+            if not download_link:
+                return False
 
-                msg_download_app = f"Downloading {APP_LIST[selected_app]['name']} from {download_link}"
+            msg_download_app = f"Downloading {APP_LIST[selected_app]['name']} from {download_link}"
+            if self.verbose:
+                print(msg_download_app)
+            logging.debug(msg_download_app)
+
+            # The new version is staged next to the current one, which stays usable until the switch
+            job["version_path"] = version_path = versioned_path(install_path, self.app_versions[selected_app][1])
+            job["staging_path"] = staging_path = os.path.join(os.path.dirname(version_path),
+                                                              "." + os.path.basename(version_path) + ".staging")
+            if os.path.exists(staging_path):
+                move_to_trash(staging_path)
+
+            # Reuse the build prepared by the background prefetch, waiting for it if it is in progress. The lock is
+            # held until the application is staged.
+            job["install_lock"] = install_lock = InstallLock(install_path)
+            if not install_lock.acquire(blocking=False):
+                msg_waiting_prefetch = (f"Waiting for the background prefetch of "
+                                        f"{APP_LIST[selected_app]['name']} to finish...")
+                print(msg_waiting_prefetch)
+                logging.info(msg_waiting_prefetch)
+                install_lock.acquire()
+
+            job["staged"] = False
+            if os.path.isdir(prefetched_path(version_path)):
+                os.rename(prefetched_path(version_path), staging_path)
+                job["staged"] = True
+                msg_prefetched = f"Using the prefetched build of {APP_LIST[selected_app]['name']}."
+                if self.verbose:
+                    print(msg_prefetched)
+                logging.info(msg_prefetched)
+            elif version_path in [path for _, path in retained_versions(install_path)]:
+                # Switch back to a version kept after an update that was rolled back
+                os.rename(version_path, staging_path)
+                job["staged"] = job["retained"] = True
+                msg_retained = f"Using the previous install of {APP_LIST[selected_app]['name']}."
                 if self.verbose:
-                    print(msg_download_app)
-                logging.debug(msg_download_app)
+                    print(msg_retained)
+                logging.info(msg_retained)
+            return True
+
+        def download(selected_app):
+            job = jobs[selected_app]
+            if only_update_data or job["staged"]:
+                return True
+            # The cached archive must outlive the downloads of the next applications until it is extracted
+            if self.artifact_cache:
+                self.artifact_cache.hold(job["download_link"])
+                job["held"] = True
+            downloaded, job["archive_path"], remove_archive, job["sha256"] = self.__download_app(
+                selected_app, job["download_link"], job["staging_path"])
+            if remove_archive:
+                job["download_path"] = job["archive_path"]
+            return downloaded
+
+        def extract(selected_app):
+            job = jobs[selected_app]
+            if only_update_data or job["staged"] or not job["archive_path"]:
+                release_archive(selected_app)
+                return True
+            try:
+                return self.__extract_app(selected_app, job["archive_path"], job["staging_path"])
+            finally:
+                release_archive(selected_app)
 
-                download_path = os.path.join(
-                    "/tmp",
-                    "{}-{}.tar.gz".format(APP_LIST[selected_app]["name"], self.app_versions[selected_app][0]),
-                )
+        def release_archive(selected_app):
+            job = jobs[selected_app]
+            if job.pop("held", False):
+                self.artifact_cache.release(job["download_link"])
 
-                if os.path.exists(download_path):
-                    msg_path_exists = "File already exists. Skipping download."
-                    if self.verbose:
-                        print(msg_path_exists)
-                    logging.warning(msg_path_exists)
-                else:
-                    try:
-                        req = requests.get(download_link)
-                        assert req.status_code == 200
+        def integrate(selected_app):
+            job = jobs[selected_app]
+            install_path = job["install_path"]
+            download_path = job["download_path"]
+
+            if not only_update_data:
+                job["install_lock"].release()
 
-                        with open(download_path, "wb") as f:
-                            f.write(req.content)
+                # Name the version after the build staged, which `retained_versions` recognizes it by. The build of
+                # a version pinned by a manifest is only known once extracted.
+                staged_entry = registry_entry(job["staging_path"])
+                version_path = (versioned_path(install_path, staged_entry["build"]) if staged_entry
+                                else job["version_path"])
 
-                        msg_download_success = "Successfully downloaded app file."
-                        if self.verbose:
-                            print(msg_download_success)
-                        logging.info(msg_download_success)
-                        logging.debug("Successfully downloaded app file to {}".format(download_path))
+                # Switch to the new version
+                try:
+                    with span("install.activate", app=selected_app):
+                        previous_path, obsolete_paths = activate_version(install_path, job["staging_path"],
+                                                                         version_path)
+                    msg_switch_version = f"Switched {APP_LIST[selected_app]['name']} to {version_path}."
+                    if self.verbose:
+                        print(msg_switch_version)
+                    logging.info(msg_switch_version)
 
-                    except Exception:
-                        logging.exception('Exception occurred')
+                except Exception:
+                    logging.exception('Exception occurred')
+                    msg_switch_error = (f"Error. Could not switch {APP_LIST[selected_app]['name']} to the new "
+                                        f"version. Aborting installation.")
+                    print(msg_switch_error)
+                    logging.error(msg_switch_error)
+                    return False
 
-                # Extract file
-                msg_extracting_file = "Extracting file..."
-                if self.verbose:
-                    print(msg_extracting_file)
-                logging.info(msg_extracting_file)
+                # Keep the most recently used previous versions, sharing their unchanged files with the new one
+                try:
+                    with span("install.keep_previous", app=selected_app):
+                        if previous_path:
+                            os.utime(previous_path)
+                        retained_paths = [path for _, path in retained_versions(install_path)]
+                        kept_paths = retained_paths[:self.keep_versions]
+                        obsolete_paths += retained_paths[self.keep_versions:]
+                        if previous_path and previous_path not in kept_paths + obsolete_paths:
+                            obsolete_paths.append(previous_path)
+                        if kept_paths:
+                            linked_files, reclaimed_bytes = deduplicate_files([version_path] + kept_paths,
+                                                                              prune_index=False)
+                            logging.debug(f'Linked {linked_files} files to the previous versions, '
+                                          f'reclaiming {reclaimed_bytes} bytes.')
+                except Exception:
+                    logging.exception('Exception occurred')
 
-                if not os.path.exists(install_path):
-                    os.makedirs(install_path)
+                # Remove previous versions
+                for obsolete_path in obsolete_paths:
                     try:
-                        result = subprocess.call(
-                            [
-                                "sudo",
-                                "tar",
-                                "-xzf",
-                                download_path,
-                                "-C",
-                                install_path,
-                                "--strip-components=1",
-                            ]
-                        )
+                        with span("install.trash_previous", app=selected_app):
+                            move_to_trash(obsolete_path)
+                        logging.debug(f'Removed previous version: {obsolete_path}')
                     except Exception:
                         logging.exception('Exception occurred')
 
-            # Create desktop entry
-            try:
+            # Create desktop entry and symlink
+            self.__set_up_app(selected_app, update_mimetypes=update_mimetypes)
+
+            # Remove downloaded file
+            if download_path:
+                try:
+                    with span("install.remove_download", app=selected_app):
+                        remove_download(download_path)
+                    msg_download_remove = "Successfully removed downloaded file."
+                    if self.verbose:
+                        print(msg_download_remove)
+                    logging.info(msg_download_remove)
+                    logging.debug("Successfully removed downloaded file at {}".format(download_path))
+
+                except Exception:
+                    logging.exception('Exception occurred')
+
+            # Register install
+            with span("install.register", app=selected_app):
+                if only_update_data:
+                    self.__register_app(selected_app)
+                elif job.get("retained"):
+                    self.__register_app(selected_app, switched=True)
+                else:
+                    # A prefetched or previous build was staged from an archive that may still be cached
+                    sha256 = job.get("sha256") or (self.artifact_cache.digest(job["download_link"])
+                                                   if self.artifact_cache else None)
+                    self.__register_app(selected_app, url=job["download_link"], artifact=sha256)
+
+            # Log install/update completion
+            logging.info(
+                "{} {} completed successfully.".format(
+                    APP_LIST[selected_app]["name"],
+                    "update" if update else "installation",
+                )
+            )
+            return True
+
+        def abort(selected_app):
+            job = jobs[selected_app]
+            release_archive(selected_app)
+            if job.get("install_lock"):
+                job["install_lock"].release()
+            if job.get("staging_path") and os.path.exists(job["staging_path"]):
+                move_to_trash(job["staging_path"])
+            msg_install_aborted = f"{APP_LIST[selected_app]['name']} was not {'updated' if update else 'installed'}."
+            logging.warning(msg_install_aborted)
+
+        # Most recently used applications first, so they are ready first
+        install_process_apps = sorted(install_process_apps, key=last_used, reverse=True)
+        run_pipeline(install_process_apps, [
+            ("resolve", resolve, PIPELINE_RESOLVE_WORKERS),
+            ("download", download, PIPELINE_DOWNLOAD_WORKERS),
+            ("extract", extract, PIPELINE_EXTRACT_WORKERS),
+            ("integrate", integrate, 1),
+        ], on_failure=abort)
+
+    def __set_up_app(self, selected_app: str, update_mimetypes: bool = False):
+        """
+        Create the desktop entry and the /usr/local/bin symlink of an installed application, and make its executable
+        runnable. Both point through the install path, so they follow the version it links to.
+
+        Parameters:
+        - selected_app (str): The key of the application.
+        - update_mimetypes (bool): If set to True, the MIME types of the application are added to its desktop entry.
+                                   Default is False.
+        """
+
+        install_path = os.path.join(JETBRAINS_INSTALL_PATH, APP_LIST[selected_app]["folder"])
+
+        # Create desktop entry
+        try:
+            with span("install.desktop_entry", app=selected_app):
                 desktop_entry_path = os.path.join(
-                    "/usr/share/applications", "{}.desktop".format(selected_app)
+                    DESKTOP_ENTRIES_PATH, "{}.desktop".format(selected_app)
                 )
 
                 if os.path.exists(desktop_entry_path):
@@ -626,12 +3732,13 @@ class JetbrainsManagerTool:
                 logging.info(msg_desktop_entry_created)
                 logging.debug(f'Desktop entry created at {desktop_entry_path}')
 
-            except Exception:
-                logging.exception('Exception occurred')
+        except Exception:
+            logging.exception('Exception occurred')
 
-            # Create symlink
-            try:
-                symlink_path = os.path.join("/usr/local/bin", selected_app)
+        # Create symlink
+        try:
+            with span("install.symlink", app=selected_app):
+                symlink_path = os.path.join(SYMLINKS_PATH, selected_app)
 
                 if os.path.exists(symlink_path):
                     msg_symlink_exists = "Symlink already exists. Deleting it."
@@ -666,11 +3773,12 @@ class JetbrainsManagerTool:
                 logging.info(msg_symlink_create)
                 logging.debug("Successfully created symlink at {}".format(symlink_path))
 
-            except Exception:
-                logging.exception('Exception occurred')
+        except Exception:
+            logging.exception('Exception occurred')
 
-            # Chmod +x on executable
-            try:
+        # Chmod +x on executable
+        try:
+            with span("install.permissions", app=selected_app):
                 if selected_app == "android-studio":
                     executable_path = os.path.join(
                         install_path, "bin", APP_LIST[selected_app]["executable"] + ".sh"
@@ -679,7 +3787,7 @@ class JetbrainsManagerTool:
                     executable_path = os.path.join(
                         install_path, "bin", APP_LIST[selected_app]["executable"]
                     )
-                subprocess.call(["sudo", "chmod", "+x", executable_path])
+                os.chmod(executable_path, os.stat(executable_path).st_mode | 0o111)
 
                 msg_executable_permissions = "Successfully set executable permissions"
                 if self.verbose:
@@ -687,29 +3795,450 @@ class JetbrainsManagerTool:
                 logging.info(msg_executable_permissions)
                 logging.debug("Successfully set executable permissions on {}".format(executable_path))
 
+        except Exception:
+            logging.exception('Exception occurred')
+
+    def __download_link(self, selected_app: str) -> str | None:
+        """
+        Return the download link of the version of an application found in `self.app_versions`, or None if no valid
+        link could be found for Android Studio. The link points to the mirror at `self.download_url` if one is set
+        (see `mirror_url`).
+        """
+
+        if selected_app == "android-studio":
+            download_link = resolve_android_studio_link(
+                mirror_url(APP_LIST[selected_app]["download-link"], self.download_url),
+                self.app_versions['android-studio'][0]
+            )
+
+            if not download_link:
+                msg_no_valid_link_as = ("Error. Could not find a valid download link for Android Studio. "
+                                        "Aborting installation.")
+                print(msg_no_valid_link_as)
+                logging.error(msg_no_valid_link_as)
+            return download_link
+
+        download_link = APP_LIST[selected_app]["download-link"].replace("<VERSION>", self.app_versions[selected_app][0])
+        return mirror_url(download_link, self.download_url)
+
+    def __stage_app(self, selected_app: str, download_link: str, staging_path: str,
+                    phase: str = "install") -> tuple[bool, str | None]:
+        """
+        Download, verify and extract an application into a staging directory, from which it can be switched to (see
+        `__download_app` and `__extract_app`). Errors are reported to the console and the log, and leave no staging
+        directory behind.
+
+        Parameters:
+        - selected_app (str): The key of the application.
+        - download_link (str): The URL of the archive of the version to stage.
+        - staging_path (str): The directory to extract the application into, which must not exist.
+        - phase (str): The prefix of the names of the profiling spans. Default is "install".
+
+        Returns:
+        - tuple: Whether the application was staged, and the path of the downloaded archive if it should be removed
+                 once the application is installed.
+        """
+
+        downloaded, archive_path, remove_archive, _ = self.__download_app(selected_app, download_link, staging_path,
+                                                                          phase=phase)
+        if not downloaded:
+            return False, None
+        if archive_path and not self.__extract_app(selected_app, archive_path, staging_path, phase=phase):
+            return False, None
+        return True, archive_path if remove_archive else None
+
+    def __download_app(self, selected_app: str, download_link: str, staging_path: str,
+                       phase: str = "install") -> tuple[bool, str | None, bool, str | None]:
+        """
+        Download and verify the archive of an application, the network-bound part of `__stage_app`.
+
+        The archive is taken from the downloaded archives cache when possible, without any request. Otherwise it is
+        downloaded, unless the download window is closed, checked against its published checksum (see
+        `fetch_checksum`), and either extracted into `staging_path` while being downloaded (stream extract mode) or
+        downloaded first and stored in the cache. Errors are reported to the console and the log, and leave no
+        staging directory behind.
+
+        Parameters:
+        - selected_app (str): The key of the application.
+        - download_link (str): The URL of the archive of the version to stage.
+        - staging_path (str): The directory to extract the application into, which must not exist.
+        - phase (str): The prefix of the names of the profiling spans. Default is "install".
+
+        Returns:
+        - tuple: Whether the archive was downloaded and verified, the path of the archive left to extract (see
+                 `__extract_app`), or None if it was extracted while being downloaded, whether the archive should
+                 be removed once the application is installed, and the SHA-256 digest of the archive.
+        """
+
+        # A cached archive was checked against its published checksum when it was stored, so reinstalling it makes
+        # no request and works offline
+        cached_archive = self.artifact_cache.lookup(download_link) if self.artifact_cache else None
+        expected_sha256 = None
+        if cached_archive:
+            msg_cached_archive = f"Using cached archive {cached_archive} for {APP_LIST[selected_app]['name']}."
+            if self.verbose:
+                print(msg_cached_archive)
+            logging.info(msg_cached_archive)
+
+        else:
+            # Get the published checksum of the archive
+            try:
+                with span(f"{phase}.fetch_checksum", app=selected_app):
+                    expected_sha256 = fetch_checksum(download_link)
             except Exception:
                 logging.exception('Exception occurred')
 
-            # Remove downloaded file
-            if not only_update_data:
-                try:
+                msg_checksum_unavailable = (f"Error. Could not get the checksum of "
+                                            f"{APP_LIST[selected_app]['name']}. Aborting installation.")
+                print(msg_checksum_unavailable)
+                logging.error(msg_checksum_unavailable)
+                return False, None, False, None
+
+            if not expected_sha256:
+                msg_no_checksum = (f"Warning. No checksum is published for {APP_LIST[selected_app]['name']}. "
+                                   f"The download cannot be verified.")
+                if self.verbose:
+                    print(msg_no_checksum)
+                logging.warning(msg_no_checksum)
+
+        msg_checksum_error = (f"Error. The checksum of the {APP_LIST[selected_app]['name']} download does not "
+                              f"match the published one. Aborting installation.")
+
+        # Large downloads only start within the download window
+        if not cached_archive and self.download_window and not in_time_window(self.download_window):
+            msg_outside_window = (f"Outside of the download window ({args.download_window}). Postponing the "
+                                  f"download of {APP_LIST[selected_app]['name']}.")
+            print(msg_outside_window)
+            logging.info(msg_outside_window)
+            return False, None, False, None
+
+        if self.stream_extract and not cached_archive:
+            # Download and extract in a single pass
+            msg_extracting_file = f"Downloading and extracting {APP_LIST[selected_app]['name']}..."
+            if self.verbose:
+                print(msg_extracting_file)
+            logging.info(msg_extracting_file)
+
+            try:
+                os.makedirs(staging_path)
+                with span(f"{phase}.download_and_extract", app=selected_app):
+                    sha256 = download_and_extract(download_link, staging_path, workers=self.extract_workers)
+
+                msg_extract_success = f"Successfully downloaded and extracted {APP_LIST[selected_app]['name']}."
+                if self.verbose:
+                    print(msg_extract_success)
+                logging.info(msg_extract_success)
+
+            except Exception:
+                logging.exception('Exception occurred')
+                if os.path.exists(staging_path):
+                    move_to_trash(staging_path)
+
+                msg_download_error = (f"Error. Could not download {APP_LIST[selected_app]['name']}. "
+                                      f"Aborting installation.")
+                print(msg_download_error)
+                logging.error(msg_download_error)
+                return False, None, False, None
+
+            if expected_sha256 and sha256 != expected_sha256:
+                move_to_trash(staging_path)
+                print(msg_checksum_error)
+                logging.error(msg_checksum_error)
+                return False, None, False, None
+
+        elif cached_archive:
+            download_path = cached_archive
+            sha256 = self.artifact_cache.digest(download_link)
+
+        else:
+            if self.artifact_cache:
+                download_path = self.artifact_cache.download_path(selected_app,
+                                                                  self.app_versions[selected_app][0])
+            else:
+                download_path = os.path.join(
+                    "/tmp",
+                    "{}-{}.tar.gz".format(APP_LIST[selected_app]["name"], self.app_versions[selected_app][0]),
+                )
+
+            if is_valid_download(download_path):
+                msg_path_exists = f"The {APP_LIST[selected_app]['name']} archive already exists. Skipping download."
+                if self.verbose:
+                    print(msg_path_exists)
+                logging.warning(msg_path_exists)
+                sha256 = download_digest(download_path) or hash_file(download_path)
+            else:
+                if os.path.exists(download_path):
+                    msg_invalid_file = (f"The existing {APP_LIST[selected_app]['name']} archive is incomplete or "
+                                        f"invalid. Downloading it again.")
+                    if self.verbose:
+                        print(msg_invalid_file)
+                    logging.warning(msg_invalid_file)
                     os.remove(download_path)
-                    msg_download_remove = "Successfully removed downloaded file."
+
+                try:
+                    with span(f"{phase}.download", app=selected_app):
+                        _, sha256 = download_file(download_link, download_path, chunk_size=self.chunk_size,
+                                                  connections=self.connections)
+
+                    msg_download_success = f"Successfully downloaded {APP_LIST[selected_app]['name']}."
                     if self.verbose:
-                        print(msg_download_remove)
-                    logging.info(msg_download_remove)
-                    logging.debug("Successfully removed downloaded file at {}".format(download_path))
+                        print(msg_download_success)
+                    logging.info(msg_download_success)
+                    logging.debug("Successfully downloaded app file to {}".format(download_path))
 
                 except Exception:
                     logging.exception('Exception occurred')
 
-            # Log install/update completion
-            logging.info(
-                "{} {} completed successfully.".format(
-                    APP_LIST[selected_app]["name"],
-                    "update" if update else "installation",
-                )
-            )
+                    msg_download_error = (f"Error. Could not download {APP_LIST[selected_app]['name']}. "
+                                          f"Aborting installation.")
+                    print(msg_download_error)
+                    logging.error(msg_download_error)
+                    return False, None, False, None
+
+            if expected_sha256 and sha256 != expected_sha256:
+                remove_download(download_path)
+                print(msg_checksum_error)
+                logging.error(msg_checksum_error)
+                return False, None, False, None
+
+            # Store downloaded file in the cache
+            if self.artifact_cache:
+                try:
+                    with span(f"{phase}.cache_store", app=selected_app):
+                        download_path = self.artifact_cache.store(download_path, download_link, selected_app,
+                                                                  self.app_versions[selected_app][0],
+                                                                  sha256=sha256)
+                    cached_archive = download_path
+                    logging.debug(f'Stored downloaded file in the cache at {download_path}')
+                except Exception:
+                    logging.exception('Exception occurred')
+
+        if self.stream_extract and not cached_archive:
+            return True, None, False, sha256
+        return True, download_path, not cached_archive, sha256
+
+    def __extract_app(self, selected_app: str, archive_path: str, staging_path: str, phase: str = "install") -> bool:
+        """
+        Extract a downloaded archive into a staging directory, the CPU-bound part of `__stage_app`. Errors are reported
+        to the console and the log, and leave no staging directory behind.
+
+        Parameters:
+        - selected_app (str): The key of the application.
+        - archive_path (str): The archive returned by `__download_app`.
+        - staging_path (str): The directory to extract the application into, which must not exist.
+        - phase (str): The prefix of the names of the profiling spans. Default is "install".
+
+        Returns:
+        - bool: Whether the application was extracted.
+        """
+
+        # Extract file
+        msg_extracting_file = f"Extracting {APP_LIST[selected_app]['name']}..."
+        if self.verbose:
+            print(msg_extracting_file)
+        logging.info(msg_extracting_file)
+
+        os.makedirs(staging_path)
+        try:
+            with span(f"{phase}.extract", app=selected_app, bytes=os.path.getsize(archive_path)):
+                if self.extract_workers:
+                    with open(archive_path, 'rb') as archive_file:
+                        extract_tar_stream(archive_file, staging_path, workers=self.extract_workers)
+                    result = 0
+                else:
+                    result = subprocess.call(
+                        [
+                            "sudo",
+                            "tar",
+                            "-xzf",
+                            archive_path,
+                            "-C",
+                            staging_path,
+                            "--strip-components=1",
+                        ]
+                    )
+        except Exception:
+            logging.exception('Exception occurred')
+            result = None
+
+        if result != 0:
+            move_to_trash(staging_path)
+            msg_extract_error = (f"Error. Could not extract {APP_LIST[selected_app]['name']}. "
+                                 f"Aborting installation.")
+            print(msg_extract_error)
+            logging.error(msg_extract_error)
+            return False
+
+        return True
+
+    def __rollback(self, update_mimetypes: bool = False, no_confirm: bool = False):
+        """
+        Switch the selected applications back to the version they were updated from.
+
+        The previous versions kept by updates (see `--keep-versions` and `retained_versions`) are complete installs,
+        so rolling back only replaces the install path link (see `switch_version`) and recreates the desktop entry and
+        symlink, without downloading anything. The target is the most recently used previous version with an older
+        build than the current one. The version rolled back from is kept in turn, so a later update switches to it
+        again without downloading it.
+
+        Parameters:
+        - update_mimetypes (bool): If set to True, the MIME types of the applications are added to their desktop
+                                   entries. Default is False.
+        - no_confirm (bool): If set to True, the method will not prompt the user for confirmation. Default is False.
+
+        Attributes accessed:
+        - self.selected_apps (list): List of application keys selected for the rollback.
+        - self.installed_apps (dict): Dictionary mapping installed applications to their versions and build numbers.
+        """
+
+        if not no_confirm:
+            if not self.__confirmation_prompt("roll back", self.selected_apps):
+                return
+
+        for selected_app in self.selected_apps:
+            install_path = os.path.join(JETBRAINS_INSTALL_PATH, APP_LIST[selected_app]["folder"])
+            current_build = self.installed_apps.get(selected_app, [None, None])[1]
+            previous_versions = [(build, path) for build, path in retained_versions(install_path)
+                                 if current_build and build_key(build) < build_key(current_build)]
+            if not os.path.islink(install_path) or not previous_versions:
+                msg_no_previous_version = f"No previous version of {APP_LIST[selected_app]['name']} to roll back to."
+                print(msg_no_previous_version)
+                logging.warning(msg_no_previous_version)
+                continue
+
+            build, version_path = previous_versions[0]
+            msg_rollback = f"\nRolling back {APP_LIST[selected_app]['name']} to build {build}..."
+            print(msg_rollback)
+            logging.info(msg_rollback)
+
+            try:
+                with span("rollback.activate", app=selected_app):
+                    current_path = os.path.realpath(install_path)
+                    switch_version(install_path, version_path)
+                    os.utime(current_path)
+                msg_switch_version = f"Switched {APP_LIST[selected_app]['name']} to {version_path}."
+                if self.verbose:
+                    print(msg_switch_version)
+                logging.info(msg_switch_version)
+
+            except Exception:
+                logging.exception('Exception occurred')
+                msg_switch_error = (f"Error. Could not switch {APP_LIST[selected_app]['name']} to the previous "
+                                    f"version. Aborting rollback.")
+                print(msg_switch_error)
+                logging.error(msg_switch_error)
+                continue
+
+            self.__set_up_app(selected_app, update_mimetypes=update_mimetypes)
+
+            with span("rollback.register", app=selected_app):
+                self.__register_app(selected_app, switched=True)
+
+            logging.info(f"{APP_LIST[selected_app]['name']} rollback completed successfully.")
+
+    def __mirror_sync(self, mirror_directory: str):
+        """
+        Download the update feeds and the latest version of the selected applications, or of all applications if none
+        is selected, into a mirror directory that other hosts install from instead of the JetBrains and Google servers.
+
+        Every file is stored at `<host>/<path>` of its original URL (see `mirror_path`), so the directory can be served
+        as is by any static HTTP server, or read through a file:// URL, and given to clients as `--feed-url` and
+        `--download-url`. The applications are downloaded concurrently, MIRROR_WORKERS at a time, each next to a
+        `<archive>.sha256` file holding its digest, which is checked against the published one when there is one.
+        The Android Studio download link is resolved once, here, and archives already in the mirror are not
+        downloaded again. The feeds are only published once every archive they point to is in the mirror, so clients
+        never see a version they cannot download. Older archives are kept for clients pinned to them.
+
+        The feeds and applications are taken from the mirror at `self.feed_url` and `self.download_url` if one is
+        set, so mirrors can be chained.
+
+        Parameters:
+        - mirror_directory (str): The root directory of the mirror.
+        """
+
+        apps = self.selected_apps or list(APP_LIST)
+        msg_mirror_sync = f"Synchronizing the mirror at {mirror_directory}..."
+        print(msg_mirror_sync)
+        logging.info(msg_mirror_sync)
+
+        if self.download_window and not in_time_window(self.download_window):
+            msg_outside_window = f"Outside of the download window ({args.download_window}). Postponing the mirror sync."
+            print(msg_outside_window)
+            logging.info(msg_outside_window)
+            return
+
+        # Always revalidate the feeds, which costs a single request each when they did not change
+        self.cache_ttl = 0
+        self.version_index = None
+        with span("get_current_versions", apps=len(apps)):
+            self.__get_current_versions(apps)
+        if not self.feed_paths:
+            msg_no_feeds = "Error. Could not fetch the update feeds. Stopping mirror sync."
+            print(msg_no_feeds)
+            logging.error(msg_no_feeds)
+            return
+
+        def sync_app(app):
+            with span("mirror.resolve_link", app=app):
+                download_link = self.__download_link(app)
+            if not download_link:
+                return False
+
+            archive_path = os.path.join(mirror_directory, mirror_path(download_link, self.download_url))
+            if os.path.exists(archive_path) and os.path.exists(archive_path + CHECKSUM_SUFFIX):
+                logging.debug(f'{archive_path} is already mirrored.')
+                return True
+
+            checksum = fetch_checksum(download_link)
+            os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+            with span("mirror.download", app=app) as download_span:
+                size, sha256 = download_file(download_link, archive_path, chunk_size=self.chunk_size,
+                                             connections=self.connections)
+                download_span.set(bytes=size)
+            os.remove(archive_path + DOWNLOAD_STATE_SUFFIX)
+            if checksum and sha256 != checksum:
+                remove_download(archive_path)
+                raise ValueError(f"Checksum mismatch for {download_link}: expected {checksum}, got {sha256}.")
+
+            with open(archive_path + CHECKSUM_SUFFIX + ".tmp", 'w') as checksum_file:
+                checksum_file.write(f"{sha256} *{os.path.basename(archive_path)}\n")
+            os.replace(archive_path + CHECKSUM_SUFFIX + ".tmp", archive_path + CHECKSUM_SUFFIX)
+
+            msg_mirrored = f"Mirrored {APP_LIST[app]['name']} {self.app_versions[app][0]} ({size / 1024 ** 2:.1f} MiB)."
+            print(msg_mirrored)
+            logging.info(msg_mirrored)
+            return True
+
+        def try_sync_app(app):
+            try:
+                return sync_app(app)
+            except Exception:
+                logging.exception('Exception occurred')
+                msg_mirror_error = f"Error. Could not mirror {APP_LIST[app]['name']}."
+                print(msg_mirror_error)
+                logging.error(msg_mirror_error)
+                return False
+
+        with ThreadPoolExecutor(max_workers=MIRROR_WORKERS) as executor:
+            results = list(executor.map(try_sync_app, [app for app in apps if app in self.app_versions]))
+
+        if not all(results):
+            msg_feeds_kept = "Some applications could not be mirrored. The mirrored update feeds were not updated."
+            print(msg_feeds_kept)
+            logging.error(msg_feeds_kept)
+            return
+
+        # Publish the feeds
+        for feed_url, feed_path in self.feed_paths.items():
+            mirrored_feed_path = os.path.join(mirror_directory, mirror_path(feed_url, self.feed_url))
+            os.makedirs(os.path.dirname(mirrored_feed_path), exist_ok=True)
+            shutil.copyfile(feed_path, mirrored_feed_path + ".tmp")
+            os.replace(mirrored_feed_path + ".tmp", mirrored_feed_path)
+            logging.debug(f'Published {feed_url} at {mirrored_feed_path}.')
+
+        msg_mirror_synced = f"Mirrored {len(results)} applications at {mirror_directory}."
+        print(msg_mirror_synced)
+        logging.info(msg_mirror_synced)
 
     def __remove(self, no_confirm=False):
         """
@@ -751,47 +4280,60 @@ class JetbrainsManagerTool:
 
                 # Remove directory
                 try:
-                    install_path = os.path.join(JETBRAINS_INSTALL_PATH, APP_LIST[selected_app]["folder"])
-                    shutil.rmtree(install_path)
-                    msg_removed_directory = "Successfully removed directory."
-                    if self.verbose:
-                        print(msg_removed_directory)
-                    logging.info(msg_removed_directory)
-                    logging.debug(f'Removed directory: {install_path}')
+                    with span("remove.directory", app=selected_app):
+                        install_path = os.path.join(JETBRAINS_INSTALL_PATH, APP_LIST[selected_app]["folder"])
+                        if os.path.islink(install_path):
+                            version_path = os.path.realpath(install_path)
+                            retained_paths = [path for _, path in retained_versions(install_path)]
+                            os.remove(install_path)
+                            move_to_trash(version_path)
+                            for retained_path in retained_paths:
+                                move_to_trash(retained_path)
+                        else:
+                            move_to_trash(install_path)
+                        msg_removed_directory = "Successfully removed directory."
+                        if self.verbose:
+                            print(msg_removed_directory)
+                        logging.info(msg_removed_directory)
+                        logging.debug(f'Removed directory: {install_path}')
+
+                        self.__unregister_app(selected_app)
 
                 except Exception:
                     logging.exception('Exception occurred')
 
                 # Remove desktop entry
                 try:
-                    desktop_entry_path = os.path.join(
-                        "/usr/share/applications", "{}.desktop".format(selected_app)
-                    )
+                    with span("remove.desktop_entry", app=selected_app):
+                        desktop_entry_path = os.path.join(
+                            DESKTOP_ENTRIES_PATH, "{}.desktop".format(selected_app)
+                        )
 
-                    if os.path.exists(desktop_entry_path):
-                        msg_remove_desktop_entry = "Removing desktop entry."
-                        if self.verbose:
-                            print(msg_remove_desktop_entry)
-                        logging.info(msg_remove_desktop_entry)
-                        logging.debug(f'Removing desktop entry at {desktop_entry_path}.')
+                        if os.path.exists(desktop_entry_path):
+                            msg_remove_desktop_entry = "Removing desktop entry."
+                            if self.verbose:
+                                print(msg_remove_desktop_entry)
+                            logging.info(msg_remove_desktop_entry)
+                            logging.debug(f'Removing desktop entry at {desktop_entry_path}.')
 
-                        os.remove(desktop_entry_path)
+                            os.remove(desktop_entry_path)
 
                 except Exception:
                     logging.exception('Exception occurred')
 
                 # Remove symlink
                 try:
-                    symlink_path = os.path.join("/usr/local/bin", selected_app)
+                    with span("remove.symlink", app=selected_app):
+                        symlink_path = os.path.join(SYMLINKS_PATH, selected_app)
 
-                    if os.path.exists(symlink_path):
-                        msg_remove_symlink = "Removing symlink."
-                        if self.verbose:
-                            print(msg_remove_symlink)
-                        logging.info(msg_remove_symlink)
-                        logging.debug(f"Removing symlink at {symlink_path}")
+                        if os.path.exists(symlink_path):
+                            msg_remove_symlink = "Removing symlink."
+                            if self.verbose:
+                                print(msg_remove_symlink)
+                            logging.info(msg_remove_symlink)
+                            logging.debug(f"Removing symlink at {symlink_path}")
 
-                        os.remove(symlink_path)
+                            os.remove(symlink_path)
 
                 except Exception:
                     logging.exception('Exception occurred')
@@ -807,7 +4349,8 @@ def get_arguments_and_flags():
     # Operation flags
     for operation in OPERATION_FLAGS.values():
         exclusive_group.add_argument(
-            operation[0], operation[1], action=operation[3], help=operation[2]
+            operation[0], operation[1], action=operation[3], help=operation[2],
+            **({"choices": operation[4]} if len(operation) > 4 else {})
         )
 
     # Application flags
@@ -820,8 +4363,46 @@ def get_arguments_and_flags():
             operation[0], operation[1], action=operation[3], help=operation[2]
         )
 
+    # Configuration arguments, with defaults overridden by the configuration file
+    configuration = read_configuration_file()
+    for name, operation in CONFIGURATION_ARGUMENTS.items():
+        default = operation[4]
+        if name.upper() in configuration:
+            try:
+                default = operation[3](configuration[name.upper()])
+            except ValueError:
+                logging.error(f'Invalid value for {name.upper()} in configuration file: '
+                              f'\"{configuration[name.upper()]}\".')
+        arg_parser.add_argument(
+            *[flag for flag in operation[:2] if flag], type=operation[3], default=default, help=operation[2]
+        )
+
     args = arg_parser.parse_args()
 
+    for argument in ("chunk_size", "connections", "connect_timeout", "read_timeout"):
+        if getattr(args, argument) <= 0:
+            msg_invalid_argument = f'Invalid {argument.replace("_", " ")}: \"{getattr(args, argument)}\".'
+            print(msg_invalid_argument)
+            logging.error(msg_invalid_argument)
+            sys.exit(1)
+
+    for argument in ("retries", "artifact_cache_size", "extract_workers", "bandwidth_limit", "prefetch_interval",
+                     "keep_versions"):
+        if getattr(args, argument) < 0:
+            msg_invalid_argument = f'Invalid {argument.replace("_", " ")}: \"{getattr(args, argument)}\".'
+            print(msg_invalid_argument)
+            logging.error(msg_invalid_argument)
+            sys.exit(1)
+
+    if args.download_window:
+        try:
+            parse_time_window(args.download_window)
+        except ValueError:
+            msg_invalid_window = f'Invalid download window: \"{args.download_window}\". Use HH:MM-HH:MM.'
+            print(msg_invalid_window)
+            logging.error(msg_invalid_window)
+            sys.exit(1)
+
     # Change default directory
     if args.directory and os.path.exists(args.directory):
         global JETBRAINS_INSTALL_PATH
@@ -832,10 +4413,8 @@ def get_arguments_and_flags():
 
         # Create configuration file
         try:
-            with open(os.path.join(os.path.expanduser('~'), '.config', 'jetbrains-manager-tool'), 'w') as config_file:
-                config_file.write(f'JETBRAINS_INSTALL_PATH={JETBRAINS_INSTALL_PATH}\n')
-            logging.debug(
-                f'Created configuration file at {os.path.join(os.path.expanduser("~"), ".config", "jetbrains-manager-tool")}')
+            write_configuration_value('JETBRAINS_INSTALL_PATH', JETBRAINS_INSTALL_PATH)
+            logging.debug(f'Created configuration file at {CONFIGURATION_FILE_PATH}')
         except Exception:
             logging.exception('Exception occurred')
     elif args.directory and not os.path.exists(args.directory):
@@ -843,16 +4422,38 @@ def get_arguments_and_flags():
         print(msg_invalid_path)
         logging.error(msg_invalid_path)
         sys.exit(1)
-    else:
-        if os.path.exists(os.path.join(os.path.expanduser('~'), '.config', 'jetbrains-manager-tool')):
-            with open(os.path.join(os.path.expanduser('~'), '.config', 'jetbrains-manager-tool'), 'r') as config_file:
-                for line in config_file.readlines():
-                    if line.startswith('JETBRAINS_INSTALL_PATH'):
-                        JETBRAINS_INSTALL_PATH = line.split('=')[1].strip()
-                        msg_custom_path = f'Custom path: \"{JETBRAINS_INSTALL_PATH}\".'
-                        print(msg_custom_path)
-                        logging.info(msg_custom_path)
-                        break
+    elif 'JETBRAINS_INSTALL_PATH' in configuration:
+        JETBRAINS_INSTALL_PATH = configuration['JETBRAINS_INSTALL_PATH']
+        msg_custom_path = f'Custom path: \"{JETBRAINS_INSTALL_PATH}\".'
+        print(msg_custom_path)
+        logging.info(msg_custom_path)
+
+
+def read_configuration_file() -> dict:
+    """
+    Read the KEY=VALUE settings stored in the configuration file, returning an empty dictionary if it does not exist.
+    """
+
+    configuration = {}
+    if os.path.exists(CONFIGURATION_FILE_PATH):
+        with open(CONFIGURATION_FILE_PATH, 'r') as config_file:
+            for line in config_file.readlines():
+                if '=' in line and not line.startswith('#'):
+                    key, value = line.split('=', 1)
+                    configuration[key.strip()] = value.strip()
+    return configuration
+
+
+def write_configuration_value(key, value):
+    """
+    Set a single setting in the configuration file, keeping all other settings.
+    """
+
+    configuration = read_configuration_file()
+    configuration[key] = value
+    with open(CONFIGURATION_FILE_PATH, 'w') as config_file:
+        for config_key, config_value in configuration.items():
+            config_file.write(f'{config_key}={config_value}\n')
 
 
 def show_help_documentation():
@@ -881,28 +4482,65 @@ def show_help_documentation():
         print('Error opening documentation.')
 
 
-def request_root_permissions():
+def is_read_only_operation() -> bool:
+    """
+    Check whether the requested operation only reads the installed applications and caches, and therefore runs
+    without root permissions.
+    """
+
+    return bool(args.list or args.cache == "list")
+
+
+def defers_root_permissions() -> bool:
+    """
+    Check whether the requested operation first finds out what to change without root permissions, and only
+    requests them (see `request_root_permissions`) once it has something to change, so that an update or manifest
+    with nothing to do never asks for a password.
+    """
+
+    return bool(args.update or args.apply)
+
+
+def request_root_permissions(extra_arguments=()):
     """
     Ensure the script is run with root permissions.
 
-    This function checks if the current process has root permissions. If not, it attempts to
-    re-run the script using sudo to gain elevated permissions. If the subprocess fails for any reason,
-    the script will exit with an error code.
+    This function checks if the current process has root permissions. If not, it replaces the current process
+    with the script run again through sudo to gain elevated permissions, so no unprivileged process is left waiting
+    for it, which starts the operation over. Read-only operations do not call this function (see
+    `is_read_only_operation`), and updates and manifests only call it once they have something to change (see
+    `defers_root_permissions`).
+
+    Parameters:
+    - extra_arguments (list, optional): Arguments added to the command run through sudo, which pass on what the
+                                        unprivileged process found, such as the applications to update.
 
     Raises:
-    - SystemExit: This function will exit the script either with an error code (1) if the subprocess fails,
-                  or normally (0) if the subprocess succeeds.
+    - SystemExit: This function will exit the script with an error code (1) if sudo cannot be run.
     """
 
     if os.geteuid() != 0:
         print("This script requires root permissions. Please enter your password.")
-        ret = subprocess.call(["sudo", sys.executable] + sys.argv, shell=False)
-        if ret != 0:
+        sys.stdout.flush()
+        close_profiler()
+        try:
+            os.execvp("sudo", ["sudo", sys.executable] + sys.argv + list(extra_arguments))
+        except OSError:
+            logging.exception('Exception occurred')
             sys.exit(1)
-        sys.exit(0)
 
 
 if __name__ == "__main__":
+    # Empty a trash folder in the background (see JetbrainsManagerTool.__empty_trash)
+    if len(sys.argv) == 3 and sys.argv[1] == EMPTY_TRASH_ARGUMENT:
+        logging.basicConfig(level=logging.DEBUG, filename=LOG_FILE_PATH)
+        try:
+            lower_priority()
+            empty_trash(sys.argv[2])
+        except Exception:
+            logging.exception('Exception occurred')
+        sys.exit(0)
+
     # Get arguments and flags
     try:
         get_arguments_and_flags()
@@ -919,8 +4557,7 @@ if __name__ == "__main__":
     if args.updatedir:
         update_path = input("Enter the new install path: ")
         if os.path.exists(update_path):
-            with open(os.path.join(os.path.expanduser('~'), '.config', 'jetbrains-manager-tool'), 'w') as config_file:
-                config_file.write(f'JETBRAINS_INSTALL_PATH={update_path}\n')
+            write_configuration_value('JETBRAINS_INSTALL_PATH', update_path)
         else:
             print(f'Invalid path: \"{update_path}\".')
             logging.error(f'Invalid path: \"{update_path}\".')
@@ -929,7 +4566,8 @@ if __name__ == "__main__":
 
     try:
         # Request root permissions
-        request_root_permissions()
+        if not is_read_only_operation() and not defers_root_permissions():
+            request_root_permissions()
 
         # Run script
         managertool = JetbrainsManagerTool
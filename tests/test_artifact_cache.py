@@ -0,0 +1,107 @@
+#
+# This file is part of the JetBrains Manager Tool distribution
+# (https://github.com/diogocaveiro/jetbrains-manager-tool).
+# Copyright (c) 2024 Diogo Caveiro.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "benchmarks"))
+
+from common import load_tool  # noqa: E402
+
+ARCHIVE_SIZE = 1000
+
+
+class ArtifactCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tool = load_tool()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "artifacts")
+        self.cache = self.tool.ArtifactCache(self.path, max_size=3 * ARCHIVE_SIZE)
+
+    def tearDown(self):
+        for url in list(self.cache.holds):
+            while url in self.cache.holds:
+                self.cache.release(url)
+        self.directory.cleanup()
+
+    def store(self, name, cache=None):
+        cache = cache or self.cache
+        download_path = cache.download_path(name, "1.0")
+        with open(download_path, 'wb') as download_file:
+            download_file.write(hashlib.sha256(name.encode()).digest() * (ARCHIVE_SIZE // 32) + b"\0" * 8)
+        return cache.store(download_path, f"https://download/{name}.tar.gz", name, "1.0")
+
+    def cached(self, cache=None):
+        cache = cache or self.cache
+        return sorted(entry["app"] for url, entry in cache.entries.items() if cache.lookup(url))
+
+    def test_evicts_least_recently_used_archive(self):
+        for name in ("a", "b", "c"):
+            self.store(name)
+        self.cache.lookup("https://download/a.tar.gz")
+        self.store("d")
+
+        self.assertEqual(self.cached(), ["a", "c", "d"])
+        self.assertEqual(len([name for name in os.listdir(self.path) if name.endswith(".tar.gz")]), 3)
+
+    def test_pinned_archive_is_not_evicted(self):
+        self.store("a")
+        with self.cache.transaction():
+            self.cache.entries["https://download/a.tar.gz"]["pinned"] = True
+        for name in ("b", "c", "d"):
+            self.store(name)
+
+        self.assertEqual(self.cached(), ["a", "c", "d"])
+
+    def test_held_archive_is_kept_until_released(self):
+        self.store("a")
+        self.cache.hold("https://download/a.tar.gz")
+        self.cache.hold("https://download/a.tar.gz")
+        for name in ("b", "c", "d"):
+            self.store(name)
+        self.assertEqual(self.cached(), ["a", "c", "d"])
+
+        self.cache.max_size = ARCHIVE_SIZE
+        self.cache.release("https://download/a.tar.gz")
+        self.assertEqual(self.cached(), ["a", "c", "d"])
+        # The last release evicts what the hold kept over the size budget, but not the released archive
+        self.cache.release("https://download/a.tar.gz")
+        self.assertEqual(self.cached(), ["a"])
+
+    def test_holds_are_seen_by_other_instances(self):
+        other_cache = self.tool.ArtifactCache(self.path, max_size=ARCHIVE_SIZE)
+        self.store("a")
+        self.cache.hold("https://download/a.tar.gz")
+        self.assertTrue(other_cache.is_held("https://download/a.tar.gz"))
+
+        self.store("b", cache=other_cache)
+        self.assertEqual(self.cached(other_cache), ["a", "b"])
+
+        self.cache.release("https://download/a.tar.gz")
+        self.assertFalse(other_cache.is_held("https://download/a.tar.gz"))
+        other_cache.evict()
+        self.assertEqual(self.cached(other_cache), ["b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#
+# This file is part of the JetBrains Manager Tool distribution
+# (https://github.com/diogocaveiro/jetbrains-manager-tool).
+# Copyright (c) 2024 Diogo Caveiro.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "benchmarks"))
+
+from common import load_tool  # noqa: E402
+
+
+def local_time(hours, minutes):
+    return time.mktime((2024, 1, 1, hours, minutes, 0, 0, 0, -1))
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tool = load_tool()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_take_refills_up_to_one_second_of_bytes(self):
+        bucket = self.tool.TokenBucket(1000)
+        self.assertEqual(bucket.take(1000.0, 0.0, 1500, 0.0), (-500.0, 0.5))
+        self.assertEqual(bucket.take(-500.0, 0.0, 0, 0.25), (-250.0, 0.25))
+        self.assertEqual(bucket.take(-500.0, 0.0, 100, 10.0), (900.0, 0.0))
+
+    def test_consume_waits_for_bytes_over_the_rate(self):
+        bucket = self.tool.TokenBucket(100000)
+        start = time.monotonic()
+        bucket.consume(100000)
+        self.assertLess(time.monotonic() - start, 0.1)
+        bucket.consume(30000)
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+
+    def test_limit_is_shared_through_lock_file(self):
+        lock_path = os.path.join(self.directory.name, "bandwidth.lock")
+        first = self.tool.TokenBucket(100000, lock_path=lock_path)
+        second = self.tool.TokenBucket(100000, lock_path=lock_path)
+        try:
+            start = time.monotonic()
+            first.consume(100000)
+            second.consume(30000)
+            self.assertGreaterEqual(time.monotonic() - start, 0.25)
+        finally:
+            first.close()
+            second.close()
+
+
+class TimeWindowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tool = load_tool()
+
+    def test_parse_time_window(self):
+        self.assertEqual(self.tool.parse_time_window("01:30-06:00"), (90, 360))
+        self.assertEqual(self.tool.parse_time_window(" 22:00 - 6:15 "), (1320, 375))
+        for value in ("24:00-06:00", "01:60-02:00", "1-6", "01:00"):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                self.tool.parse_time_window(value)
+
+    def test_window_within_the_day(self):
+        window = self.tool.parse_time_window("01:30-06:00")
+        self.assertFalse(self.tool.in_time_window(window, local_time(1, 29)))
+        self.assertTrue(self.tool.in_time_window(window, local_time(1, 30)))
+        self.assertTrue(self.tool.in_time_window(window, local_time(5, 59)))
+        self.assertFalse(self.tool.in_time_window(window, local_time(6, 0)))
+
+    def test_window_across_midnight(self):
+        window = self.tool.parse_time_window("22:00-06:00")
+        self.assertFalse(self.tool.in_time_window(window, local_time(21, 59)))
+        self.assertTrue(self.tool.in_time_window(window, local_time(22, 0)))
+        self.assertTrue(self.tool.in_time_window(window, local_time(0, 0)))
+        self.assertTrue(self.tool.in_time_window(window, local_time(5, 59)))
+        self.assertFalse(self.tool.in_time_window(window, local_time(6, 0)))
+        self.assertFalse(self.tool.in_time_window(window, local_time(12, 0)))
+
+    def test_window_ending_when_it_starts_is_always_open(self):
+        window = self.tool.parse_time_window("03:00-03:00")
+        for hours in (0, 3, 12, 23):
+            self.assertTrue(self.tool.in_time_window(window, local_time(hours, 0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+#
+# This file is part of the JetBrains Manager Tool distribution
+# (https://github.com/diogocaveiro/jetbrains-manager-tool).
+# Copyright (c) 2024 Diogo Caveiro.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+
+TOOL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                         "jetbrains-manager-tool", "jetbrains-manager-tool.py")
+
+
+def load_tool():
+    if "jetbrains_manager_tool" in sys.modules:
+        return sys.modules["jetbrains_manager_tool"]
+
+    spec = importlib.util.spec_from_file_location("jetbrains_manager_tool", TOOL_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["jetbrains_manager_tool"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class DeduplicateFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tool = load_tool()
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        self.index_path = os.path.join(self.root, "index", "dedup_index.json")
+        self.content = os.urandom(4096)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, relative_path):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(self.content)
+        return path
+
+    def test_relinks_copies_already_hardlinked_together(self):
+        a = self.write("a/f")
+        os.link(a, os.path.join(self.root, "a", "g"))
+        os.link(a, os.path.join(self.root, "a", "h"))
+        b = self.write("b/f")
+        c = os.path.join(self.root, "c", "f")
+        os.makedirs(os.path.dirname(c))
+        os.link(b, c)
+        d = self.write("d/f")
+
+        roots = [os.path.join(self.root, name) for name in "abcd"]
+        linked_files, reclaimed_bytes = self.tool.deduplicate_files(roots, index_path=self.index_path, min_size=1)
+
+        self.assertEqual(len({os.stat(path).st_ino for path in (a, b, c, d)}), 1)
+        self.assertEqual(os.stat(a).st_nlink, 6)
+        self.assertEqual(linked_files, 3)
+        # The copy shared by b and c and the copy of d are freed
+        self.assertEqual(reclaimed_bytes, 2 * len(self.content))
+
+    def test_counts_shared_copy_once_when_its_last_link_is_replaced(self):
+        a = self.write("a/f")
+        os.link(a, os.path.join(self.root, "a", "g"))
+        os.link(a, os.path.join(self.root, "a", "h"))
+        b = self.write("b/f")
+        os.link(b, os.path.join(self.root, "b", "g"))
+
+        roots = [os.path.join(self.root, name) for name in "ab"]
+        linked_files, reclaimed_bytes = self.tool.deduplicate_files(roots, index_path=self.index_path, min_size=1)
+
+        self.assertEqual(os.stat(b).st_ino, os.stat(a).st_ino)
+        self.assertEqual(os.stat(a).st_nlink, 5)
+        self.assertEqual(linked_files, 2)
+        self.assertEqual(reclaimed_bytes, len(self.content))
+
+    def test_keeps_copy_with_links_outside_the_roots(self):
+        a = self.write("a/f")
+        os.link(a, os.path.join(self.root, "a", "g"))
+        os.link(a, os.path.join(self.root, "a", "h"))
+        b = self.write("b/f")
+        os.link(b, os.path.join(self.root, "outside"))
+
+        roots = [os.path.join(self.root, name) for name in "ab"]
+        linked_files, reclaimed_bytes = self.tool.deduplicate_files(roots, index_path=self.index_path, min_size=1)
+
+        self.assertEqual(os.stat(a).st_ino, os.stat(b).st_ino)
+        self.assertEqual(linked_files, 1)
+        self.assertEqual(reclaimed_bytes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+#
+# This file is part of the JetBrains Manager Tool distribution
+# (https://github.com/diogocaveiro/jetbrains-manager-tool).
+# Copyright (c) 2024 Diogo Caveiro.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import hashlib
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "benchmarks"))
+
+from benchmark_suite import publish, release  # noqa: E402
+from common import TOOL_PATH, StandInServer, generate_archive, load_tool, run_tool, sandbox_tool  # noqa: E402
+
+
+class DownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tool = load_tool()
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        self.files_path = os.path.join(self.root, "www")
+        os.makedirs(self.files_path)
+        self.download_path = os.path.join(self.root, "file.bin")
+        self.part_path = self.download_path + self.tool.DOWNLOAD_PART_SUFFIX
+        self.state_path = self.download_path + self.tool.DOWNLOAD_STATE_SUFFIX
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def publish(self, content):
+        with open(os.path.join(self.files_path, "file.bin"), 'wb') as served_file:
+            served_file.write(content)
+
+    def interrupted_download(self, server, content, completed):
+        """
+        Leave a partial file and a state file as a download of `content` interrupted after `completed` bytes of each
+        of its two ranges.
+        """
+
+        probe = self.tool.get_session().head(server.url + "/files/file.bin")
+        middle = len(content) // 2
+        segments = [[0, middle - 1, completed], [middle, len(content) - 1, completed]]
+        with open(self.part_path, 'wb') as part_file:
+            part_file.truncate(len(content))
+            for start, _, done in segments:
+                part_file.seek(start)
+                part_file.write(content[start:start + done])
+        state = {"url": probe.url, "length": len(content), "etag": probe.headers["ETag"],
+                 "last_modified": probe.headers["Last-Modified"], "complete": False, "segments": segments}
+        self.tool.write_json_file(self.state_path, state)
+        return state
+
+    def test_resumes_only_missing_bytes(self):
+        content = os.urandom(3 * 1024 * 1024)
+        self.publish(content)
+        with StandInServer(self.files_path) as server:
+            self.interrupted_download(server, content, 512 * 1024)
+            size, sha256 = self.tool.download_file(server.url + "/files/file.bin", self.download_path,
+                                                   chunk_size=64 * 1024, connections=2)
+            bytes_sent = server.bytes_sent
+
+        self.assertEqual(bytes_sent, len(content) - 2 * 512 * 1024)
+        self.assertEqual(size, len(content))
+        self.assertEqual(sha256, hashlib.sha256(content).hexdigest())
+        with open(self.download_path, 'rb') as downloaded_file:
+            self.assertEqual(downloaded_file.read(), content)
+        self.assertEqual(self.tool.download_digest(self.download_path), sha256)
+
+    def test_range_of_changed_file_is_refused(self):
+        content = os.urandom(1024 * 1024)
+        self.publish(content)
+        with StandInServer(self.files_path) as server:
+            state = self.interrupted_download(server, content, 1024)
+            self.publish(os.urandom(len(content)))
+            os.utime(os.path.join(self.files_path, "file.bin"), ns=(0, 0))
+            with self.assertRaises(self.tool.RangeNotSupportedError):
+                self.tool.download_segments(state["url"], self.part_path, state, self.state_path)
+
+    def test_changed_file_is_downloaded_again(self):
+        content = os.urandom(1024 * 1024)
+        self.publish(content)
+        with StandInServer(self.files_path) as server:
+            self.interrupted_download(server, content, 1024)
+            new_content = os.urandom(len(content))
+            self.publish(new_content)
+            os.utime(os.path.join(self.files_path, "file.bin"), ns=(0, 0))
+            _, sha256 = self.tool.download_file(server.url + "/files/file.bin", self.download_path,
+                                                chunk_size=64 * 1024, connections=2)
+            bytes_sent = server.bytes_sent
+
+        self.assertEqual(bytes_sent, len(new_content))
+        self.assertEqual(sha256, hashlib.sha256(new_content).hexdigest())
+        with open(self.download_path, 'rb') as downloaded_file:
+            self.assertEqual(downloaded_file.read(), new_content)
+
+
+class StreamDigestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tool = load_tool()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "file.bin")
+        self.content = os.urandom(300)
+        with open(self.path, 'wb') as file:
+            file.truncate(len(self.content))
+        self.fd = os.open(self.path, os.O_RDWR)
+
+    def tearDown(self):
+        os.close(self.fd)
+        self.directory.cleanup()
+
+    def write(self, digest, segment, offset, length):
+        data = self.content[offset:offset + length]
+        os.pwrite(self.fd, data, offset)
+        segment[2] += length
+        digest.update(offset, data)
+
+    def test_catches_up_with_ranges_written_ahead(self):
+        segments = [[0, 99, 0], [100, 199, 0], [200, 299, 0]]
+        digest = self.tool.StreamDigest(self.fd, segments, chunk_size=16)
+
+        self.write(digest, segments[2], 200, 100)
+        self.write(digest, segments[1], 100, 50)
+        self.assertEqual(digest.position, 0)
+        self.write(digest, segments[0], 0, 100)
+        # The first range reaches the bytes of the second one, but not the third range yet
+        self.assertEqual(digest.position, 150)
+        self.write(digest, segments[1], 150, 50)
+        self.assertEqual(digest.position, 300)
+        self.assertEqual(digest.hexdigest(), hashlib.sha256(self.content).hexdigest())
+
+    def test_catches_up_with_resumed_download(self):
+        segments = [[0, 149, 0], [150, 299, 0]]
+        os.pwrite(self.fd, self.content[:100], 0)
+        os.pwrite(self.fd, self.content[150:200], 150)
+        segments[0][2], segments[1][2] = 100, 50
+        digest = self.tool.StreamDigest(self.fd, segments, chunk_size=16)
+
+        digest.catch_up()
+        self.assertEqual(digest.position, 100)
+        self.write(digest, segments[0], 100, 50)
+        self.write(digest, segments[1], 200, 100)
+        self.assertEqual(digest.hexdigest(), hashlib.sha256(self.content).hexdigest())
+
+
+class ChecksumMismatchTest(unittest.TestCase):
+
+    def setUp(self):
+        # A separate copy of the tool, since the sandbox replaces its paths and URLs
+        spec = importlib.util.spec_from_file_location("jetbrains_manager_tool_sandbox", TOOL_PATH)
+        self.tool = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.tool)
+        self.tool.request_root_permissions = lambda *arguments: None
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        self.files_path = os.path.join(self.root, "www")
+        os.makedirs(self.files_path)
+        self.archive_path = os.path.join(self.root, "ide.tar.gz")
+        generate_archive(self.archive_path, files=20, size=1, top_level="ide", product_info=release(1)[2])
+
+    def tearDown(self):
+        self.tool.close_profiler()
+        self.directory.cleanup()
+
+    def test_install_is_aborted(self):
+        app = self.tool.APP_LIST["pycharm-professional"]
+        with StandInServer(self.files_path) as server:
+            install_path = sandbox_tool(self.tool, self.root, server.url)
+            publish(self.tool, self.files_path, ["pycharm-professional"], 1, self.archive_path, 0)
+            file_name = app["download-link"].rsplit("/", 1)[1].replace("<VERSION>", release(1)[0])
+            with open(os.path.join(self.files_path, file_name + ".sha256"), 'w') as checksum_file:
+                checksum_file.write(f"{'0' * 64} *{file_name}\n")
+
+            output = run_tool(self.tool, ["-i", app["flag"], "-y", "--cache-ttl", "0"])
+
+        self.assertIn(f"The checksum of the {app['name']} download does not match", output)
+        self.assertFalse(os.path.lexists(os.path.join(install_path, app["folder"])))
+        self.assertEqual([name for name in os.listdir(install_path) if name != self.tool.TRASH_FOLDER], [])
+        self.assertFalse(os.path.exists(f"/tmp/{app['name']}-{release(1)[0]}.tar.gz"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#
+# This file is part of the JetBrains Manager Tool distribution
+# (https://github.com/diogocaveiro/jetbrains-manager-tool).
+# Copyright (c) 2024 Diogo Caveiro.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import io
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "benchmarks"))
+
+from common import generate_archive, load_tool  # noqa: E402
+
+
+class ExtractTarStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tool = load_tool()
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        self.destination = os.path.join(self.root, "parent", "destination")
+        os.makedirs(os.path.dirname(self.destination))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def archive(self, name, data=b"", **attributes):
+        """
+        Return an archive holding a regular file, followed by the member `name` of the top-level folder.
+        """
+
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            for member_name, member_data, member_attributes in (("ide/file", b"content", {}),
+                                                                (f"ide/{name}", data, attributes)):
+                member = tarfile.TarInfo(member_name)
+                member.size = len(member_data)
+                for key, value in member_attributes.items():
+                    setattr(member, key, value)
+                tar.addfile(member, io.BytesIO(member_data) if member_data else None)
+        buffer.seek(0)
+        return buffer
+
+    def assert_rejected(self, name, data=b"", **attributes):
+        for workers in (0, 2):
+            with self.subTest(workers=workers):
+                shutil.rmtree(self.destination, ignore_errors=True)
+                with self.assertRaises(tarfile.TarError):
+                    self.tool.extract_tar_stream(self.archive(name, data, **attributes), self.destination,
+                                                 workers=workers)
+                self.assertEqual(sorted(os.listdir(self.root)), ["parent"])
+                self.assertEqual(sorted(os.listdir(os.path.dirname(self.destination))), ["destination"])
+
+    def test_extracts_application_archive(self):
+        archive_path = os.path.join(self.root, "ide.tar.gz")
+        generate_archive(archive_path, files=50, size=1, top_level="ide")
+        with open(archive_path, 'rb') as archive_file:
+            self.tool.extract_tar_stream(archive_file, self.destination, workers=2)
+
+        with open(os.path.join(self.destination, "product-info.json")) as product_info_file:
+            self.assertEqual(json.load(product_info_file)["buildNumber"], "1.0.1")
+        self.assertEqual(os.readlink(os.path.join(self.destination, "bin", "ide")), "ide.sh")
+        self.assertEqual(os.stat(os.path.join(self.destination, "bin", "ide-hardlink.sh")).st_ino,
+                         os.stat(os.path.join(self.destination, "bin", "ide.sh")).st_ino)
+
+    def test_rejects_parent_directory_path(self):
+        self.assert_rejected("../../escaped", b"content")
+
+    def test_rejects_absolute_symlink(self):
+        self.assert_rejected("link", type=tarfile.SYMTYPE, linkname="/etc/passwd")
+
+    def test_rejects_symlink_leaving_destination(self):
+        self.assert_rejected("link", type=tarfile.SYMTYPE, linkname="../../escaped")
+
+    def test_rejects_symlink_leaving_destination_through_another_link(self):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            for name, linkname in (("ide/current", "."), ("ide/link", "current/../escaped")):
+                member = tarfile.TarInfo(name)
+                member.type = tarfile.SYMTYPE
+                member.linkname = linkname
+                tar.addfile(member)
+        for workers in (0, 2):
+            with self.subTest(workers=workers):
+                shutil.rmtree(self.destination, ignore_errors=True)
+                buffer.seek(0)
+                with self.assertRaises(tarfile.TarError):
+                    self.tool.extract_tar_stream(buffer, self.destination, workers=workers)
+                self.assertFalse(os.path.lexists(os.path.join(self.destination, "link")))
+
+    def test_rejects_hardlink_leaving_destination(self):
+        outside_path = os.path.join(self.root, "parent", "outside")
+        with open(outside_path, 'w') as outside_file:
+            outside_file.write("secret")
+        with self.assertRaises(tarfile.TarError):
+            self.tool.extract_tar_stream(self.archive("link", type=tarfile.LNKTYPE, linkname="ide/../outside"),
+                                         self.destination, workers=2)
+        self.assertEqual(os.stat(outside_path).st_nlink, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+#
+# This file is part of the JetBrains Manager Tool distribution
+# (https://github.com/diogocaveiro/jetbrains-manager-tool).
+# Copyright (c) 2024 Diogo Caveiro.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "benchmarks"))
+
+from common import load_tool  # noqa: E402
+
+
+class LoadManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tool = load_tool()
+        self.directory = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.directory.name, "manifest.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self, manifest):
+        with open(self.manifest_path, 'w') as manifest_file:
+            manifest_file.write(manifest if isinstance(manifest, str) else json.dumps(manifest))
+        return self.tool.load_manifest(self.manifest_path)
+
+    def test_list_of_applications(self):
+        self.assertEqual(self.load({"apps": ["pycharm-professional", "goland"]}),
+                         {"apps": {"pycharm-professional": {"state": "present", "version": None},
+                                   "goland": {"state": "present", "version": None}},
+                          "exclusive": False})
+
+    def test_applications_with_settings(self):
+        manifest = self.load({"apps": {"pycharm-professional": None, "goland": {"version": 2024.1},
+                                       "clion": {"state": "absent"}},
+                              "exclusive": True})
+        self.assertEqual(manifest["apps"]["pycharm-professional"], {"state": "present", "version": None})
+        self.assertEqual(manifest["apps"]["goland"], {"state": "present", "version": "2024.1"})
+        self.assertEqual(manifest["apps"]["clion"], {"state": "absent", "version": None})
+        self.assertTrue(manifest["exclusive"])
+
+    def test_invalid_manifests(self):
+        for manifest in ('{"apps": ', [], {"apps": "goland"}, {"apps": ["unknown-ide"]},
+                         {"apps": {"goland": {"state": "latest"}}}, {"apps": {"goland": "2024.1"}}):
+            with self.subTest(manifest=manifest), self.assertRaises(ValueError):
+                self.load(manifest)
+
+    def test_missing_manifest(self):
+        with self.assertRaises(OSError):
+            self.tool.load_manifest(os.path.join(self.directory.name, "missing.json"))
+
+
+class VersionMatchesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tool = load_tool()
+
+    def test_version_matches(self):
+        self.assertTrue(self.tool.version_matches("2024.1.4", "2024.1.4"))
+        self.assertTrue(self.tool.version_matches("2024.1.4", "2024.1"))
+        self.assertTrue(self.tool.version_matches("2024.1.4", "2024"))
+        self.assertFalse(self.tool.version_matches("2024.10.1", "2024.1"))
+        self.assertFalse(self.tool.version_matches("2024.1", "2024.1.4"))
+        self.assertFalse(self.tool.version_matches("2024.2.1", "2024.1"))
+
+
+if __name__ == "__main__":
+    unittest.main()